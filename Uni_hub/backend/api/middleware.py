@@ -2,7 +2,7 @@ from urllib.parse import parse_qs
 from channels.middleware import BaseMiddleware
 from django.contrib.auth.models import AnonymousUser
 from rest_framework_simplejwt.tokens import AccessToken
-from users.models import User
+from users.authentication import aget_token_user
 import logging
 
 logger = logging.getLogger("channels.auth")
@@ -19,7 +19,7 @@ class JWTAuthMiddleware(BaseMiddleware):
                 validated_token = AccessToken(token)
                 user_id = validated_token.get("user_id")
                 logger.info(f"[JWTAuthMiddleware] user_id from token: {user_id}")
-                user = await User.objects.aget(id=user_id)
+                user = await aget_token_user(validated_token)
                 logger.info(f"[JWTAuthMiddleware] User found: {user}")
             except Exception as e:
                 logger.error(f"[JWTAuthMiddleware] Exception: {e}")
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Community, Membership, Post, Comment, CommunityInvitation
+from .models import Community, Membership, Post, Comment, CommunityInvitation, Tag
 
 class MembershipInline(admin.TabularInline):
     model = Membership
@@ -79,3 +79,9 @@ class CommunityInvitationAdmin(admin.ModelAdmin):
     search_fields = ('invitee_email', 'community__name', 'inviter__username')
     raw_id_fields = ('community', 'inviter')
     readonly_fields = ('created_at', 'updated_at')
+
+@admin.register(Tag)
+class TagAdmin(admin.ModelAdmin):
+    list_display = ('name', 'slug', 'created_at')
+    search_fields = ('name', 'slug')
+    readonly_fields = ('created_at',)
@@ -0,0 +1,139 @@
+import resource
+import statistics
+import tracemalloc
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Prefetch
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from communities.models import Community, Membership
+from communities.services.community_service import CommunityService
+from communities.views import CommunityViewSet
+
+User = get_user_model()
+
+
+def full_community_queryset():
+    """The list queryset used before card projection, loading every member"""
+    return Community.objects.select_related(
+        'creator'
+    ).prefetch_related(
+        'members',
+        Prefetch(
+            'membership_set',
+            queryset=Membership.objects.filter(status='approved').select_related('user'),
+            to_attr='active_memberships'
+        )
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures memory and queries per request of the community list endpoint, '
+        'comparing the lean card projection with the previous fully prefetched queryset'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20, help='Requests per mode')
+        parser.add_argument('--user', help='Email of the user to make the requests as (default: anonymous)')
+        parser.add_argument(
+            '--members', type=int, default=0,
+            help='Seed a community with this many members for the run (rolled back afterwards)'
+        )
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('--requests must be at least 1')
+
+        user = AnonymousUser()
+        if options['user']:
+            try:
+                user = User.objects.get(email=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"No user with email {options['user']}")
+
+        with transaction.atomic():
+            if options['members']:
+                self.seed_community(options['members'])
+
+            # The card mode runs first: peak RSS only ever grows, so the
+            # increase during the full mode is what its extra rows cost
+            self.run_mode('card', user, options['requests'])
+            with mock.patch.object(
+                CommunityService, 'get_community_card_queryset', staticmethod(full_community_queryset)
+            ):
+                self.run_mode('full', user, options['requests'])
+
+            transaction.set_rollback(True)
+
+        # Drop cached lists that may include the rolled back community
+        CommunityService.invalidate_community_lists()
+
+    def seed_community(self, member_count):
+        """Create a public community with member_count approved members"""
+        self.stdout.write(f'Seeding a community with {member_count} members...')
+        users = User.objects.bulk_create([
+            User(
+                email=f'benchmark-member-{index}@example.com',
+                username=f'benchmark_member_{index}',
+                first_name='Benchmark',
+                last_name=f'Member {index}',
+                password='!'
+            )
+            for index in range(member_count)
+        ], batch_size=1000)
+
+        community = Community.objects.create(
+            name='Benchmark Community',
+            description='Temporary community created by benchmark_community_list',
+            creator=users[0]
+        )
+        Membership.objects.bulk_create([
+            Membership(user=member, community=community, role='member', status='approved')
+            for member in users
+        ], batch_size=1000)
+        Community.objects.filter(pk=community.pk).update(member_count_cache=member_count)
+        CommunityService.invalidate_community_lists()
+
+    def run_mode(self, label, user, request_count):
+        view = CommunityViewSet.as_view({'get': 'list'})
+        factory = APIRequestFactory()
+
+        heap_peaks = []
+        query_counts = []
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        tracemalloc.start()
+        try:
+            for _ in range(request_count):
+                request = factory.get('/api/communities/')
+                force_authenticate(request, user=user)
+
+                tracemalloc.reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+                with CaptureQueriesContext(connection) as queries:
+                    response = view(request)
+                    response.render()
+                heap_peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+                query_counts.append(len(queries.captured_queries))
+        finally:
+            tracemalloc.stop()
+
+        if response.status_code != 200:
+            raise CommandError(f'{label}: the list endpoint returned {response.status_code}')
+
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        self.stdout.write(self.style.SUCCESS(f'{label}:'))
+        self.stdout.write(f'  queries per request:     {max(query_counts)}')
+        self.stdout.write(f'  heap peak per request:   median {self.format_kb(statistics.median(heap_peaks))}, '
+                          f'max {self.format_kb(max(heap_peaks))}')
+        self.stdout.write(f'  peak RSS:                {rss_after} KB (+{rss_after - rss_before} KB)')
+
+    @staticmethod
+    def format_kb(size):
+        return f'{size / 1024:.1f} KB'
@@ -0,0 +1,130 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Prefetch
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from communities.models import Community, Membership, Post, Comment
+from communities.services.post_service import PostService
+from communities.views import PostViewSet
+
+User = get_user_model()
+
+get_post_queryset = PostService.get_post_queryset
+
+
+def prefetched_post_queryset(*args, **kwargs):
+    """The list queryset used before the per-action prefetch plan, loading every top-level comment"""
+    return get_post_queryset(*args, **kwargs).prefetch_related(
+        'upvotes',
+        Prefetch(
+            'comments',
+            queryset=Comment.objects.filter(parent=None).select_related('author'),
+            to_attr='top_level_comments'
+        )
+    )
+
+
+def value_size(value):
+    """Approximate size in bytes of a value fetched from the database"""
+    if value is None:
+        return 0
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    return len(str(value).encode('utf-8'))
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures the queries, rows and bytes fetched per request of the post list endpoint, '
+        'comparing the current queryset with the previous one that prefetched top-level comments'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('community', nargs='?', help='Slug of the community to list (default: a seeded one)')
+        parser.add_argument('--user', help='Email of the user to make the requests as (default: anonymous)')
+        parser.add_argument('--posts', type=int, default=20, help='Posts to seed when no community is given')
+        parser.add_argument('--comments', type=int, default=100, help='Top-level comments per seeded post')
+
+    def handle(self, *args, **options):
+        user = AnonymousUser()
+        if options['user']:
+            try:
+                user = User.objects.get(email=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"No user with email {options['user']}")
+
+        with transaction.atomic():
+            slug = options['community'] or self.seed_community(options['posts'], options['comments'])
+            if not Community.objects.filter(slug=slug).exists():
+                raise CommandError(f'No community with slug {slug}')
+
+            self.run_mode('lean', user, slug)
+            with mock.patch.object(PostService, 'get_post_queryset', staticmethod(prefetched_post_queryset)):
+                self.run_mode('prefetched', user, slug)
+
+            transaction.set_rollback(True)
+
+    def seed_community(self, post_count, comment_count):
+        """Create a public community with post_count posts of comment_count comments each"""
+        self.stdout.write(f'Seeding a community with {post_count} posts of {comment_count} comments...')
+        author = User.objects.create(
+            email='benchmark-author@example.com',
+            username='benchmark_author',
+            first_name='Benchmark',
+            last_name='Author',
+            password='!'
+        )
+        community = Community.objects.create(
+            name='Benchmark Posts',
+            description='Temporary community created by benchmark_post_list',
+            creator=author
+        )
+        Membership.objects.create(user=author, community=community, role='admin', status='approved')
+        posts = Post.objects.bulk_create([
+            Post(title=f'Post {index}', content='Benchmark post ' * 20, community=community, author=author)
+            for index in range(post_count)
+        ])
+        Comment.objects.bulk_create([
+            Comment(post=post, author=author, content='Benchmark comment ' * 10)
+            for post in posts
+            for _ in range(comment_count)
+        ], batch_size=1000)
+        return community.slug
+
+    def run_mode(self, label, user, slug):
+        view = PostViewSet.as_view({'get': 'list'})
+        request = APIRequestFactory().get(f'/api/communities/{slug}/posts/')
+        force_authenticate(request, user=user)
+
+        executed = []
+
+        def record(execute, sql, params, many, context):
+            executed.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record):
+            response = view(request, community_slug=slug)
+            response.render()
+
+        if response.status_code != 200:
+            raise CommandError(f'{label}: the list endpoint returned {response.status_code}')
+
+        # Run the captured queries again to measure what each of them returned
+        rows = size = 0
+        with connection.cursor() as cursor:
+            for sql, params in executed:
+                if not sql.lstrip().upper().startswith('SELECT'):
+                    continue
+                cursor.execute(sql, params)
+                for row in cursor.fetchall():
+                    rows += 1
+                    size += sum(value_size(value) for value in row)
+
+        self.stdout.write(self.style.SUCCESS(f'{label}:'))
+        self.stdout.write(f'  queries per request:     {len(executed)}')
+        self.stdout.write(f'  rows fetched:            {rows}')
+        self.stdout.write(f'  bytes fetched (approx.): {size / 1024:.1f} KB')
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from communities.utils.counters import counter_buffer_enabled, flush_counter_buffer
+
+
+class Command(BaseCommand):
+    help = (
+        'Applies the counter deltas buffered in Redis (COMMUNITY_COUNTER_BUFFER) to the database '
+        'in batched UPDATEs, every --interval seconds. Run a single instance.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between flushes')
+        parser.add_argument('--once', action='store_true', help='Flush once and exit')
+
+    def handle(self, *args, **options):
+        if options['interval'] <= 0:
+            raise CommandError('--interval must be positive')
+        if not counter_buffer_enabled():
+            self.stdout.write(self.style.WARNING(
+                'COMMUNITY_COUNTER_BUFFER is disabled; flushing deltas left from when it was enabled'
+            ))
+
+        while True:
+            updated = flush_counter_buffer()
+            if updated or options['verbosity'] > 1:
+                self.stdout.write(f'Flushed counter deltas to {updated} rows')
+            if options['once']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from communities.services.role_map_service import RoleMapService
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares the per-user community role maps stored in Redis with the memberships '
+        'in the database and rewrites the maps that drifted'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='users',
+            help='Id of a user whose map to reconcile, can be repeated (default: every stored map)'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without writing')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        checked, drifted = RoleMapService.reconcile(options['users'], dry_run=dry_run)
+
+        summary = f'Checked {checked} role maps, {drifted} drifted'
+        if dry_run:
+            self.stdout.write(self.style.WARNING(f'{summary}; dry run, no maps were written'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{summary} and were rewritten'))
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from communities.models import CommunityDailyStats
+from communities.services.stats_service import CommunityStatsService, ROLLUP_CHUNK_DAYS, ROLLUP_DAYS
+
+
+class Command(BaseCommand):
+    help = (
+        'Updates the CommunityDailyStats rollup: applies the buffered upvotes and recomputes '
+        'the last --days days, or every day with --backfill'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=ROLLUP_DAYS, help='Days to recompute, today included')
+        parser.add_argument(
+            '--backfill', action='store_true',
+            help='Recompute every day since the first community was created and seed the upvotes '
+                 'from the post counters'
+        )
+        parser.add_argument(
+            '--if-empty', action='store_true',
+            help='With --backfill, skip the backfill if the rollup already has rows, so it runs once per deployment'
+        )
+        parser.add_argument(
+            '--chunk-days', type=int, default=ROLLUP_CHUNK_DAYS, help='Days recomputed per batch of a backfill'
+        )
+
+    def handle(self, *args, **options):
+        if options['days'] < 1 or options['chunk_days'] < 1:
+            raise CommandError('--days and --chunk-days must be positive')
+        if options['if_empty'] and not options['backfill']:
+            raise CommandError('--if-empty only applies to --backfill')
+
+        if options['if_empty'] and CommunityDailyStats.objects.exists():
+            self.stdout.write('Community daily stats already rolled up, skipping the backfill')
+            return
+        if options['backfill']:
+            self.stdout.write('Backfilling community daily stats...')
+            written = CommunityStatsService.backfill(
+                chunk_days=options['chunk_days'], progress=self.report_progress
+            )
+        else:
+            written = CommunityStatsService.refresh(days=options['days'])
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} community daily stats rows'))
+
+    def report_progress(self, day, written):
+        self.stdout.write(f'  Rolled up to {day.isoformat()} ({written} rows)')
@@ -1,69 +1,87 @@
-from django.core.management.base import BaseCommand
-from communities.models import Community, Post, Comment, Membership
-from django.db.models import Count
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from communities.services.counter_service import CounterService, RECONCILED_COUNTERS, RECONCILE_CHUNK_SIZE
+from communities.utils.counters import counter_buffer_enabled, flush_counter_buffer
+
+
+def parse_since(value):
+    """Parse --since: an ISO date or datetime, or a number of hours like 24h"""
+    if value.endswith('h') and value[:-1].isdigit():
+        return timezone.now() - datetime.timedelta(hours=int(value[:-1]))
+    since = parse_datetime(value)
+    if since is None:
+        date = parse_date(value)
+        if date is None:
+            raise CommandError(f'Invalid --since value: {value}')
+        since = datetime.datetime.combine(date, datetime.time.min)
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
 
 
 class Command(BaseCommand):
-    help = 'Updates all cache counter fields in the communities app'
+    help = (
+        'Recounts the cache counter fields in the communities app with set-based queries, '
+        'in primary key chunks, fixing the counters that drifted'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            help='Only rows touched since this ISO date/datetime or number of hours (e.g. 24h)'
+        )
+        parser.add_argument('--chunk-size', type=int, default=RECONCILE_CHUNK_SIZE, help='Rows per chunk')
+        parser.add_argument(
+            '--model', action='append', choices=list(RECONCILED_COUNTERS),
+            help='Model to reconcile, can be repeated (default: all)'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without writing')
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Continue after the checkpoint of an interrupted run with the same absolute --since'
+        )
 
     def handle(self, *args, **options):
-        self.stdout.write(self.style.SUCCESS('Updating community member counts...'))
-        
-        # Update community member counts
-        communities = Community.objects.all()
-        count = 0
-        for community in communities:
-            member_count = Membership.objects.filter(
-                community=community,
-                status='approved'
-            ).count()
-            
-            Community.objects.filter(id=community.id).update(
-                member_count_cache=member_count
-            )
-            count += 1
-            
-            if count % 100 == 0:
-                self.stdout.write(f'  Updated {count} communities')
-                
-        self.stdout.write(self.style.SUCCESS(f'Updated {count} community member counts'))
-        
-        self.stdout.write(self.style.SUCCESS('Updating post counters...'))
-        
-        # Update post counters
-        posts = Post.objects.all()
-        count = 0
-        for post in posts:
-            comment_count = Comment.objects.filter(post=post).count()
-            upvote_count = post.upvotes.count()
-            
-            Post.objects.filter(id=post.id).update(
-                comment_count_cache=comment_count,
-                upvote_count_cache=upvote_count
-            )
-            count += 1
-            
-            if count % 100 == 0:
-                self.stdout.write(f'  Updated {count} posts')
-                
-        self.stdout.write(self.style.SUCCESS(f'Updated {count} post counters'))
-        
-        self.stdout.write(self.style.SUCCESS('Updating comment upvote counts...'))
-        
-        # Update comment upvote counts
-        comments = Comment.objects.all()
-        count = 0
-        for comment in comments:
-            upvote_count = comment.upvotes.count()
-            
-            Comment.objects.filter(id=comment.id).update(
-                upvote_count_cache=upvote_count
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+        since = parse_since(options['since']) if options['since'] else None
+        dry_run = options['dry_run']
+
+        if not dry_run and counter_buffer_enabled():
+            self.stdout.write('Flushing buffered counter deltas...')
+            flush_counter_buffer()
+
+        for name in options['model'] or RECONCILED_COUNTERS:
+            self.stdout.write(self.style.SUCCESS(f'Reconciling {name} counters...'))
+            stats = CounterService.reconcile(
+                name,
+                since=since,
+                chunk_size=options['chunk_size'],
+                dry_run=dry_run,
+                resume=options['resume'],
+                progress=self.report_progress,
             )
-            count += 1
-            
-            if count % 100 == 0:
-                self.stdout.write(f'  Updated {count} comments')
-                
-        self.stdout.write(self.style.SUCCESS(f'Updated {count} comment upvote counts'))
-        
-        self.stdout.write(self.style.SUCCESS('All cache counters updated successfully!')) 
\ No newline at end of file
+
+            for pk, field, cached, actual in stats['drift']:
+                self.stdout.write(f'  {name} {pk} {field}: cached {cached}, actual {actual}')
+            if stats['drifted'] > len(stats['drift']):
+                self.stdout.write(f'  ... and {stats["drifted"] - len(stats["drift"])} more')
+
+            summary = f'Checked {stats["checked"]} {name} rows, {stats["drifted"]} drifted counters'
+            if not dry_run:
+                summary += f', fixed {stats["fixed"]} rows'
+                if stats['skipped']:
+                    summary += f', skipped {stats["skipped"]} rows with pending buffered deltas'
+            self.stdout.write(self.style.SUCCESS(summary))
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING('Dry run: no counters were written'))
+        else:
+            self.stdout.write(self.style.SUCCESS('All cache counters updated successfully!'))
+
+    def report_progress(self, name, stats):
+        self.stdout.write(f'  Checked {stats["checked"]} {name} rows (up to id {stats["last_pk"]})')
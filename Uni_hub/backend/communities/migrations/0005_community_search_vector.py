@@ -0,0 +1,65 @@
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# The search document is maintained by a trigger so that every write path
+# (ORM saves, queryset updates, admin, raw SQL) keeps it in sync.
+# Only Postgres supports tsvector, so the trigger and GIN index are skipped
+# on other databases, where CommunitySearchService falls back to Python.
+CREATE_SEARCH_TRIGGER = """
+CREATE OR REPLACE FUNCTION communities_community_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('english', replace(coalesce(NEW.tags, ''), ',', ' ')), 'B') ||
+        setweight(to_tsvector('english', coalesce(NEW.description, '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER communities_community_search_vector_trigger
+    BEFORE INSERT OR UPDATE ON communities_community
+    FOR EACH ROW EXECUTE FUNCTION communities_community_search_vector_update();
+
+CREATE INDEX communities_community_search_vector_gin
+    ON communities_community USING gin (search_vector);
+
+UPDATE communities_community SET search_vector =
+    setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+    setweight(to_tsvector('english', replace(coalesce(tags, ''), ',', ' ')), 'B') ||
+    setweight(to_tsvector('english', coalesce(description, '')), 'C');
+"""
+
+DROP_SEARCH_TRIGGER = """
+DROP INDEX IF EXISTS communities_community_search_vector_gin;
+DROP TRIGGER IF EXISTS communities_community_search_vector_trigger ON communities_community;
+DROP FUNCTION IF EXISTS communities_community_search_vector_update();
+"""
+
+
+def create_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(CREATE_SEARCH_TRIGGER)
+
+
+def drop_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(DROP_SEARCH_TRIGGER)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communities', '0004_alter_post_event_participant_limit_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='community',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, help_text='Weighted search document of name, tags and description', null=True),
+        ),
+        migrations.RunPython(create_search_trigger, drop_search_trigger),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 5.2.18 on 2026-10-16 21:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils.text import slugify
+
+
+def backfill_tags(apps, schema_editor):
+    """Create Tag and CommunityTag rows from the existing comma-separated strings"""
+    Community = apps.get_model('communities', 'Community')
+    Tag = apps.get_model('communities', 'Tag')
+    CommunityTag = apps.get_model('communities', 'CommunityTag')
+    
+    community_tags = {}
+    tag_names = {}
+    for community_id, tags in Community.objects.exclude(tags='').values_list('id', 'tags').iterator():
+        slugs = []
+        for raw_name in tags.split(','):
+            name = raw_name.strip()[:50]
+            slug = slugify(name)
+            if slug and slug not in slugs:
+                slugs.append(slug)
+                tag_names.setdefault(slug, name)
+        community_tags[community_id] = slugs
+    
+    Tag.objects.bulk_create(
+        [Tag(slug=slug, name=name) for slug, name in tag_names.items()],
+        ignore_conflicts=True,
+        batch_size=500
+    )
+    tag_ids = dict(Tag.objects.values_list('slug', 'id'))
+    
+    CommunityTag.objects.bulk_create(
+        [
+            CommunityTag(community_id=community_id, tag_id=tag_ids[slug])
+            for community_id, slugs in community_tags.items()
+            for slug in slugs
+        ],
+        ignore_conflicts=True,
+        batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communities', '0005_community_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Display name of the tag', max_length=50)),
+                ('slug', models.SlugField(help_text='Normalized tag used for exact-match filtering', max_length=60, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Tag',
+                'verbose_name_plural': 'Tags',
+                'ordering': ['slug'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CommunityTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('community', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='community_tags', to='communities.community')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='community_tags', to='communities.tag')),
+            ],
+            options={
+                'verbose_name': 'Community Tag',
+                'verbose_name_plural': 'Community Tags',
+            },
+        ),
+        migrations.AddField(
+            model_name='community',
+            name='normalized_tags',
+            field=models.ManyToManyField(blank=True, related_name='communities', through='communities.CommunityTag', to='communities.tag'),
+        ),
+        migrations.AddIndex(
+            model_name='communitytag',
+            index=models.Index(fields=['tag', 'community'], name='communities_tag_id_fe497b_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='communitytag',
+            unique_together={('community', 'tag')},
+        ),
+        migrations.RunPython(backfill_tags, migrations.RunPython.noop),
+    ]
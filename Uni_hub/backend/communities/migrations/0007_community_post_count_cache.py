@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-16 21:02
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_post_counts(apps, schema_editor):
+    Community = apps.get_model('communities', 'Community')
+    Post = apps.get_model('communities', 'Post')
+    
+    post_counts = Post.objects.filter(
+        community_id=OuterRef('pk')
+    ).order_by().values('community_id').annotate(count=Count('id')).values('count')
+    
+    Community.objects.update(post_count_cache=Coalesce(Subquery(post_counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communities', '0006_tag_communitytag_community_normalized_tags'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='community',
+            name='post_count_cache',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Cached post count for performance'),
+        ),
+        migrations.RunPython(backfill_post_counts, migrations.RunPython.noop),
+    ]
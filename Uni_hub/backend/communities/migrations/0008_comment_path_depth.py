@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:10
+
+from django.db import migrations, models
+
+
+def backfill_comment_paths(apps, schema_editor):
+    Comment = apps.get_model('communities', 'Comment')
+
+    # Replies are always created after their parent, so in id order
+    # every parent's path is known before its replies are reached
+    paths = {}
+    batch = []
+    for comment in Comment.objects.order_by('id').only('id', 'parent_id').iterator(chunk_size=2000):
+        parent_path, parent_depth = paths.get(comment.parent_id, ('', -1))
+        comment.path = parent_path + str(comment.id).zfill(10)
+        comment.depth = parent_depth + 1
+        paths[comment.id] = (comment.path, comment.depth)
+        batch.append(comment)
+        if len(batch) >= 2000:
+            Comment.objects.bulk_update(batch, ['path', 'depth'])
+            batch = []
+    if batch:
+        Comment.objects.bulk_update(batch, ['path', 'depth'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communities', '0007_community_post_count_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(default='', editable=False, help_text='Materialized path of the comment in its thread', max_length=1000),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, help_text='Nesting level, 0 for top-level comments'),
+        ),
+        migrations.RunPython(backfill_comment_paths, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'path'], name='communities_post_id_980f23_idx'),
+        ),
+    ]
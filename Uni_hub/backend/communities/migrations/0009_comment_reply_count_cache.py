@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:30
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_reply_counts(apps, schema_editor):
+    Comment = apps.get_model('communities', 'Comment')
+    
+    reply_counts = Comment.objects.filter(
+        parent_id=OuterRef('pk')
+    ).order_by().values('parent_id').annotate(count=Count('id')).values('count')
+    
+    Comment.objects.update(reply_count_cache=Coalesce(Subquery(reply_counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communities', '0008_comment_path_depth'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='reply_count_cache',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Cached number of direct replies for performance'),
+        ),
+        migrations.RunPython(backfill_reply_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communities', '0009_comment_reply_count_cache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CommunityDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('joins', models.PositiveIntegerField(default=0, help_text='Approved memberships that joined on the day')),
+                ('posts', models.PositiveIntegerField(default=0, help_text='Posts created on the day')),
+                ('comments', models.PositiveIntegerField(default=0, help_text='Comments created on the day')),
+                ('upvotes', models.IntegerField(default=0, help_text='Post upvotes cast on the day, less the ones removed')),
+                ('active_authors', models.PositiveIntegerField(default=0, help_text='Distinct users who posted or commented on the day')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('community', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='communities.community')),
+            ],
+            options={
+                'verbose_name': 'Community Daily Stats',
+                'verbose_name_plural': 'Community Daily Stats',
+                'ordering': ['day'],
+                'unique_together': {('community', 'day')},
+            },
+        ),
+    ]
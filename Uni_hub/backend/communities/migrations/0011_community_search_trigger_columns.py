@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-17 09:00
+
+from django.db import migrations
+
+
+# Rebuild the search document only when a searched column changes, not on
+# the counter updates (member_count_cache, post_count_cache) of a community.
+# Replaces the trigger created by 0005, which fires on every update.
+NARROW_SEARCH_TRIGGER = """
+DROP TRIGGER IF EXISTS communities_community_search_vector_trigger ON communities_community;
+CREATE TRIGGER communities_community_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, description, tags ON communities_community
+    FOR EACH ROW EXECUTE FUNCTION communities_community_search_vector_update();
+"""
+
+WIDEN_SEARCH_TRIGGER = """
+DROP TRIGGER IF EXISTS communities_community_search_vector_trigger ON communities_community;
+CREATE TRIGGER communities_community_search_vector_trigger
+    BEFORE INSERT OR UPDATE ON communities_community
+    FOR EACH ROW EXECUTE FUNCTION communities_community_search_vector_update();
+"""
+
+
+def narrow_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(NARROW_SEARCH_TRIGGER)
+
+
+def widen_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(WIDEN_SEARCH_TRIGGER)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communities', '0010_communitydailystats'),
+    ]
+
+    operations = [
+        migrations.RunPython(narrow_search_trigger, widen_search_trigger),
+    ]
@@ -5,6 +5,8 @@ from .community import Community, Membership
 from .post import Post
 from .comment import Comment
 from .invitation import CommunityInvitation
+from .tag import Tag, CommunityTag
+from .stats import CommunityDailyStats
 
 # Export all models so they can be imported directly from communities.models
 __all__ = [
@@ -13,4 +15,7 @@ __all__ = [
     'Post',
     'Comment',
     'CommunityInvitation',
+    'Tag',
+    'CommunityTag',
+    'CommunityDailyStats',
 ] 
\ No newline at end of file
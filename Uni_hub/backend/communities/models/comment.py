@@ -1,8 +1,31 @@
-from django.db import models
+from django.db import connections, models, router
 from django.conf import settings
 from .post import Post
 
 
+# Each level of a comment's materialized path is its id, zero-padded to this width.
+# Paths contain only digits, so they sort the same way under any collation.
+COMMENT_PATH_STEP = 10
+
+# Deepest reply level a path can hold
+MAX_COMMENT_DEPTH = 99
+
+
+def comment_path_segment(pk):
+    """The path segment of a comment id"""
+    return str(pk).zfill(COMMENT_PATH_STEP)
+
+
+def allocate_comment_id(using):
+    """Draw the id of a new comment from its sequence, or None on databases without one"""
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT nextval(pg_get_serial_sequence(%s, 'id'))", [Comment._meta.db_table])
+        return cursor.fetchone()[0]
+
+
 class Comment(models.Model):
     """Model for comments on posts"""
     
@@ -11,6 +34,11 @@ class Comment(models.Model):
     content = models.TextField()
     parent = models.ForeignKey('self', on_delete=models.CASCADE, related_name='replies', null=True, blank=True, db_index=True)
     
+    # Thread position: the path segments of the comment's ancestors and its own,
+    # so a thread sorted by path is in depth-first order (set on first save)
+    path = models.CharField(max_length=COMMENT_PATH_STEP * (MAX_COMMENT_DEPTH + 1), default='', editable=False, help_text="Materialized path of the comment in its thread")
+    depth = models.PositiveSmallIntegerField(default=0, editable=False, help_text="Nesting level, 0 for top-level comments")
+    
     # Engagement metrics
     upvotes = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name='upvoted_comments', blank=True)
     
@@ -20,6 +48,7 @@ class Comment(models.Model):
     
     # Performance cache fields
     upvote_count_cache = models.PositiveIntegerField(default=0, editable=False, help_text="Cached upvote count for performance")
+    reply_count_cache = models.PositiveIntegerField(default=0, editable=False, help_text="Cached number of direct replies for performance")
     
     class Meta:
         ordering = ['created_at']
@@ -29,8 +58,32 @@ class Comment(models.Model):
             models.Index(fields=['post', 'created_at']),
             models.Index(fields=['post', 'parent', 'created_at']),
             models.Index(fields=['author', '-created_at']),
+            models.Index(fields=['post', 'path']),
         ]
     
+    def save(self, *args, **kwargs):
+        # The path includes the comment's own id. On Postgres the id is drawn
+        # from the sequence first, so the comment is inserted with its path
+        if self.pk is None and not self.path:
+            self.pk = allocate_comment_id(kwargs.get('using') or router.db_for_write(Comment, instance=self))
+            if self.pk is not None:
+                kwargs['force_insert'] = True
+        if self.pk is not None and not self.path:
+            self.set_path()
+        
+        super().save(*args, **kwargs)
+        
+        # Elsewhere the id is only known once the row exists
+        if not self.path:
+            self.set_path()
+            Comment.objects.filter(pk=self.pk).update(path=self.path, depth=self.depth)
+    
+    def set_path(self):
+        """Set the path and depth from the parent's and the comment's own id"""
+        parent = self.parent if self.parent_id else None
+        self.path = (parent.path if parent else '') + comment_path_segment(self.pk)
+        self.depth = parent.depth + 1 if parent else 0
+    
     def __str__(self):
         return f"Comment by {self.author.username} on {self.post.title}"
     
@@ -40,4 +93,13 @@ class Comment(models.Model):
     
     @property
     def is_reply(self):
-        return self.parent is not None 
\ No newline at end of file
+        return self.parent is not None
+    
+    def get_subtree_bounds(self):
+        """
+        Bounds [lower, upper) of the paths of this comment and its descendants.
+        Every descendant path starts with this path, so it sorts between the
+        path and the path incremented by one.
+        """
+        upper = str(int(self.path) + 1).zfill(len(self.path))
+        return self.path, upper 
\ No newline at end of file
@@ -1,5 +1,6 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
 from django.utils.text import slugify
 
 
@@ -28,6 +29,7 @@ class Community(models.Model):
     # Categorization
     category = models.CharField(max_length=20, choices=CATEGORY_CHOICES, default='other', help_text="Category of the community", db_index=True)
     tags = models.CharField(max_length=255, blank=True, help_text="Comma-separated tags")
+    normalized_tags = models.ManyToManyField('Tag', through='CommunityTag', related_name='communities', blank=True)
     
     # Media
     image = models.ImageField(upload_to='communities/images/', blank=True, null=True, help_text="Community profile image")
@@ -48,6 +50,10 @@ class Community(models.Model):
     
     # Performance cache fields
     member_count_cache = models.PositiveIntegerField(default=0, editable=False, help_text="Cached member count for performance")
+    post_count_cache = models.PositiveIntegerField(default=0, editable=False, help_text="Cached post count for performance")
+    
+    # Full-text search (maintained by a database trigger, see migration 0005)
+    search_vector = SearchVectorField(null=True, editable=False, help_text="Weighted search document of name, tags and description")
     
     class Meta:
         verbose_name = "Community"
@@ -58,9 +64,21 @@ class Community(models.Model):
             models.Index(fields=['-created_at']),
         ]
     
+    # Fields the tag rows and facet counts are derived from
+    FACET_FIELDS = ('tags', 'category', 'is_private')
+    
     def __str__(self):
         return self.name
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Facet fields as stored, so that a save can tell whether the tags or facets change
+        instance._stored_facets = {
+            field: instance.__dict__[field] for field in cls.FACET_FIELDS if field in instance.__dict__
+        }
+        return instance
+    
     def save(self, *args, **kwargs):
         # Auto-generate slug if not provided
         if not self.slug:
@@ -74,8 +92,13 @@ class Community(models.Model):
     
     @property
     def member_count(self):
-        """Get the number of members in this community"""
-        return self.member_count_cache if self.member_count_cache > 0 else self.members.count()
+        """Get the number of approved members in this community"""
+        return self.member_count_cache
+    
+    @property
+    def post_count(self):
+        """Get the number of posts in this community"""
+        return self.post_count_cache
 
 
 class Membership(models.Model):
@@ -111,4 +134,23 @@ class Membership(models.Model):
         ]
     
     def __str__(self):
-        return f"{self.user.username} - {self.community.name} ({self.role})" 
\ No newline at end of file
+        return f"{self.user.username} - {self.community.name} ({self.role})"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Status as stored, so that a save can tell whether the member count changes
+        instance._stored_status = instance.__dict__.get('status')
+        return instance
+    
+    def save(self, *args, **kwargs):
+        # Read the stored status under a row lock, in the transaction of the
+        # write, so that concurrent saves of a membership see each other's
+        # status and the member count moves once (see the signals)
+        using = kwargs.get('using')
+        with transaction.atomic(using=using):
+            if self.pk is not None:
+                self._stored_status = Membership.objects.using(using).select_for_update().filter(
+                    pk=self.pk
+                ).values_list('status', flat=True).first()
+            super().save(*args, **kwargs) 
\ No newline at end of file
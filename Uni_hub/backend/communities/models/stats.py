@@ -0,0 +1,24 @@
+from django.db import models
+from .community import Community
+
+
+class CommunityDailyStats(models.Model):
+    """Activity of a community on one day, rolled up by CommunityStatsService"""
+    
+    community = models.ForeignKey(Community, on_delete=models.CASCADE, related_name='daily_stats')
+    day = models.DateField()
+    joins = models.PositiveIntegerField(default=0, help_text="Approved memberships that joined on the day")
+    posts = models.PositiveIntegerField(default=0, help_text="Posts created on the day")
+    comments = models.PositiveIntegerField(default=0, help_text="Comments created on the day")
+    upvotes = models.IntegerField(default=0, help_text="Post upvotes cast on the day, less the ones removed")
+    active_authors = models.PositiveIntegerField(default=0, help_text="Distinct users who posted or commented on the day")
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ('community', 'day')
+        ordering = ['day']
+        verbose_name = "Community Daily Stats"
+        verbose_name_plural = "Community Daily Stats"
+    
+    def __str__(self):
+        return f"{self.community.name} - {self.day}"
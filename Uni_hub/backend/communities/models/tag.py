@@ -0,0 +1,52 @@
+from django.db import models
+from django.utils.text import slugify
+from .community import Community
+
+
+def parse_tags(value):
+    """
+    Parse a comma-separated tag string into an ordered {slug: name} dict.
+    Empty entries are dropped and tags that normalize to the same slug are merged.
+    """
+    tags = {}
+    for raw_name in (value or '').split(','):
+        name = raw_name.strip()[:50]
+        slug = slugify(name)
+        if slug and slug not in tags:
+            tags[slug] = name
+    return tags
+
+
+class Tag(models.Model):
+    """Model for a normalized community tag"""
+    
+    name = models.CharField(max_length=50, help_text="Display name of the tag")
+    slug = models.SlugField(max_length=60, unique=True, help_text="Normalized tag used for exact-match filtering")
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['slug']
+        verbose_name = "Tag"
+        verbose_name_plural = "Tags"
+    
+    def __str__(self):
+        return self.name
+
+
+class CommunityTag(models.Model):
+    """Through model linking communities to their tags"""
+    
+    community = models.ForeignKey(Community, on_delete=models.CASCADE, related_name='community_tags')
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name='community_tags')
+    
+    class Meta:
+        unique_together = ('community', 'tag')
+        verbose_name = "Community Tag"
+        verbose_name_plural = "Community Tags"
+        indexes = [
+            # Tag filtering and facet counts go from tag to community
+            models.Index(fields=['tag', 'community']),
+        ]
+    
+    def __str__(self):
+        return f"{self.community.name} - {self.tag.name}"
@@ -0,0 +1,351 @@
+"""
+Pagination classes for the communities app
+"""
+import base64
+import binascii
+import datetime
+import decimal
+import json
+import uuid
+
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured, ValidationError
+from django.db import connections
+from django.db.models import BooleanField, Q
+from django.db.models.expressions import RawSQL
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+from .services.feed_service import feed_score
+
+
+class KeysetPagination(BasePagination):
+    """
+    Opaque-cursor (keyset) pagination.
+
+    Instead of an OFFSET, every page continues from the ordering values of
+    the last row of the previous page:
+
+        WHERE (is_pinned, created_at, id) < (%s, %s, %s) ORDER BY ... LIMIT n
+
+    The ordering is taken from the queryset with the primary key appended as
+    a tiebreaker, so pages follow the same composite indexes as the regular
+    listing and page N costs the same as page 1. No COUNT query is run.
+    Ordering fields must not be nullable.
+    """
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.model = queryset.model
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset)
+        self.annotations = set(queryset.query.annotations)
+
+        cursor = self.decode_cursor(request)
+        values, reverse = cursor if cursor is not None else (None, False)
+
+        queryset = queryset.order_by(*[
+            f"{'-' if descending != reverse else ''}{name}"
+            for name, descending in self.ordering
+        ])
+        if values is not None:
+            queryset = queryset.filter(self.get_keyset_filter(queryset, values, reverse))
+
+        # Fetch one extra row to find out whether there is a further page
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_ordering(self, queryset):
+        """
+        Get the ordering as a list of (name, descending) pairs.
+        The primary key is appended so that the ordering is total.
+        """
+        pk_name = queryset.model._meta.pk.attname
+
+        ordering = []
+        for item in queryset.query.order_by or queryset.model._meta.ordering:
+            if not isinstance(item, str) or '__' in item or item == '?':
+                raise ImproperlyConfigured(
+                    f"Keyset pagination cannot order by {item!r}; "
+                    "use a field or annotation of the model."
+                )
+            name = item.lstrip('-')
+            ordering.append((pk_name if name == 'pk' else name, item.startswith('-')))
+
+        if pk_name not in [name for name, _ in ordering]:
+            ordering.append((pk_name, ordering[-1][1] if ordering else False))
+        return ordering
+
+    def get_keyset_filter(self, queryset, values, reverse):
+        """
+        Build the condition selecting the rows after (or, in reverse, before) the cursor.
+        When every ordering column is a model column sorted in the same direction
+        a row-value comparison is used, which the database can use as an index bound.
+        Otherwise the comparison is expanded into (a < x) OR (a = x AND b < y) ...
+        """
+        fields = [self.get_column_field(name) for name, _ in self.ordering]
+        directions = {descending != reverse for _, descending in self.ordering}
+
+        if len(directions) == 1 and all(fields):
+            connection = connections[queryset.db]
+            quote_name = connection.ops.quote_name
+            table = quote_name(self.model._meta.db_table)
+            columns = ', '.join(f'{table}.{quote_name(field.column)}' for field in fields)
+            placeholders = ', '.join(['%s'] * len(fields))
+            operator = '<' if directions.pop() else '>'
+            params = [
+                field.get_db_prep_value(value, connection)
+                for field, value in zip(fields, values)
+            ]
+            return RawSQL(f'({columns}) {operator} ({placeholders})', params, output_field=BooleanField())
+
+        condition = Q()
+        for index, (name, descending) in enumerate(self.ordering):
+            lookup = 'lt' if descending != reverse else 'gt'
+            term = Q(**{f'{name}__{lookup}': values[index]})
+            for previous_index, (previous_name, _) in enumerate(self.ordering[:index]):
+                term &= Q(**{previous_name: values[previous_index]})
+            condition |= term
+        return condition
+
+    def get_column_field(self, name):
+        """Get the concrete model field for an ordering name, or None for annotations"""
+        if name in self.annotations:
+            return None
+        try:
+            field = self.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        return field if getattr(field, 'concrete', False) and field.column else None
+
+    def encode_cursor(self, obj, reverse):
+        data = {
+            'o': [f"{'-' if descending else ''}{name}" for name, descending in self.ordering],
+            'v': [self.serialize_value(getattr(obj, name)) for name, _ in self.ordering],
+            'r': int(reverse),
+        }
+        encoded = base64.urlsafe_b64encode(
+            json.dumps(data, separators=(',', ':')).encode('utf-8')
+        ).decode('ascii')
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        """
+        Decode the cursor of the request into (values, reverse).
+        Returns None on the first page and raises NotFound for malformed cursors
+        or cursors that were issued for a different ordering.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        ordering = [f"{'-' if descending else ''}{name}" for name, descending in self.ordering]
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            if data['o'] != ordering or len(data['v']) != len(self.ordering):
+                raise ValueError('Cursor does not match the ordering')
+            values = [
+                self.deserialize_value(name, value)
+                for (name, _), value in zip(self.ordering, data['v'])
+            ]
+            return values, bool(data['r'])
+        except (TypeError, ValueError, KeyError, ValidationError, binascii.Error, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def serialize_value(value):
+        if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+            return value.isoformat()
+        if isinstance(value, (decimal.Decimal, uuid.UUID)):
+            return str(value)
+        return value
+
+    def deserialize_value(self, name, value):
+        field = self.get_column_field(name)
+        if field is None or value is None:
+            return value
+        return field.to_python(value)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'The pagination cursor value.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Number of results to return per page.',
+                'schema': {'type': 'integer'},
+            },
+        ]
+
+
+class CommentWindowPagination(KeysetPagination):
+    """
+    Keyset pagination of the comments embedded in a post detail response.
+    Uses its own query parameters so that they do not clash with those of
+    the page the post is shown on.
+    """
+    cursor_query_param = 'comments_cursor'
+    page_size_query_param = 'comments_page_size'
+    page_size = 20
+
+
+class OptionalCursorPagination(PageNumberPagination):
+    """
+    Page-number pagination that switches to keyset pagination on request.
+
+    Clients opt in with `?pagination=cursor` on the first page and then
+    follow the `next`/`previous` links, which carry an opaque `cursor`.
+    Cursor pages have no `count` and do not slow down as the client scrolls.
+    """
+    mode_query_param = 'pagination'
+    cursor_mode = 'cursor'
+    keyset_class = KeysetPagination
+    keyset = None
+
+    def use_cursor(self, request):
+        """Whether the request asked for keyset pagination"""
+        return (
+            request.query_params.get(self.mode_query_param) == self.cursor_mode
+            or self.keyset_class.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_cursor(request):
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        self.keyset = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + [
+            {
+                'name': self.mode_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Set to "cursor" to use cursor pagination instead of page numbers.',
+                'schema': {'type': 'string', 'enum': [self.cursor_mode]},
+            },
+        ] + self.keyset_class().get_schema_operation_parameters(view)
+
+
+class FeedPagination(KeysetPagination):
+    """
+    Cursor pagination over a user's home feed (see FeedService).
+
+    The paginated object is a UserFeed rather than a queryset. Cursors carry
+    the (score, post id) position of the last post of the page and only go
+    forward. The first page starts with the pinned posts of the user's
+    communities; later pages contain unpinned posts only.
+    """
+
+    def paginate_queryset(self, feed, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+
+        # Fetch one extra post to find out whether there is a further page
+        posts, _ = feed.get_page(position, self.page_size + 1)
+        self.has_next = len(posts) > self.page_size
+        posts = posts[:self.page_size]
+        self.position = (feed_score(posts[-1].created_at), posts[-1].pk) if posts else None
+
+        if position is None:
+            posts = feed.get_pinned_posts() + posts
+        self.page = posts
+        return self.page
+
+    def encode_cursor(self, position):
+        encoded = base64.urlsafe_b64encode(
+            json.dumps({'p': list(position)}, separators=(',', ':')).encode('utf-8')
+        ).decode('ascii')
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        """Decode the cursor of the request into a (score, post id) position, or None"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            score, pk = data['p']
+            if not isinstance(score, int) or not isinstance(pk, int):
+                raise ValueError('Cursor values must be integers')
+            return score, pk
+        except (TypeError, ValueError, KeyError, binascii.Error, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.has_next or self.position is None:
+            return None
+        return self.encode_cursor(self.position)
+
+    def get_previous_link(self):
+        return None
@@ -19,7 +19,7 @@ class IsCommentAuthorOrCommunityAdminOrReadOnly(BaseCommunityPermission):
             return False
         
         # Comment author can edit
-        if obj.author == request.user:
+        if obj.author_id == request.user.id:
             return True
         
         # Get the community from the comment's post
@@ -19,7 +19,7 @@ class IsPostAuthorOrCommunityAdminOrReadOnly(BaseCommunityPermission):
             return False
         
         # Post author can edit
-        if obj.author == request.user:
+        if obj.author_id == request.user.id:
             return True
         
         # Community admins/moderators can edit
@@ -9,7 +9,7 @@ from .community_serializers import (
     UserMembershipStatusSerializer
 )
 from .post_serializers import PostSerializer, PostDetailSerializer
-from .comment_serializers import CommentSerializer
+from .comment_serializers import CommentSerializer, CommentTreeSerializer
 from .membership_serializers import MembershipSerializer
 from .invitation_serializers import CommunityInvitationSerializer
 
@@ -23,6 +23,7 @@ __all__ = [
     'PostSerializer',
     'PostDetailSerializer',
     'CommentSerializer',
+    'CommentTreeSerializer',
     'MembershipSerializer',
     'CommunityInvitationSerializer',
 ] 
\ No newline at end of file
@@ -25,15 +25,44 @@ class CommentSerializer(serializers.ModelSerializer):
     
     @extend_schema_field(OpenApiTypes.INT)
     def get_reply_count(self, obj):
-        return obj.replies.count()
+        # Use the replies prefetched by CommentService.get_comment_queryset when present,
+        # otherwise the counter cache kept up to date by signals
+        nested_replies = getattr(obj, 'nested_replies', None)
+        if nested_replies is not None:
+            return len(nested_replies)
+        return obj.reply_count_cache
     
     @extend_schema_field(OpenApiTypes.INT)
     def get_upvote_count(self, obj):
-        return obj.upvote_count
+        # Counter caches are kept up to date by signals
+        return obj.upvote_count_cache
     
     @extend_schema_field(OpenApiTypes.BOOL)
     def get_has_upvoted(self, obj):
+        """
+        Views pass the upvoted comments of the whole page in the context as
+        `upvoted_comment_ids` (see CommentService.get_comment_state_map).
+        """
+        upvoted_comment_ids = self.context.get('upvoted_comment_ids')
+        if upvoted_comment_ids is not None:
+            return obj.id in upvoted_comment_ids
         user = self.context.get('request').user
         if user.is_authenticated:
             return obj.upvotes.filter(id=user.id).exists()
-        return False 
\ No newline at end of file
+        return False
+
+
+class CommentTreeSerializer(CommentSerializer):
+    """
+    Serializer for a comment with its loaded replies, nested.
+    Expects comments assembled by CommentService.get_comment_tree.
+    """
+    replies = serializers.SerializerMethodField()
+    
+    class Meta(CommentSerializer.Meta):
+        fields = CommentSerializer.Meta.fields + ['depth', 'replies']
+    
+    @extend_schema_field(serializers.ListField(child=serializers.DictField()))
+    def get_replies(self, obj):
+        replies = getattr(obj, 'tree_replies', [])
+        return CommentTreeSerializer(replies, many=True, context=self.context).data
@@ -7,6 +7,8 @@ from drf_spectacular.types import OpenApiTypes
 from ..models import Community, Membership, CommunityInvitation, Post
 from .user_serializers import UserBasicSerializer
 from .post_serializers import PostSerializer
+from ..services.post_service import PostService
+from ..utils.memberships import get_membership_resolver
 
 
 class UserMembershipStatusSerializer(serializers.ModelSerializer):
@@ -45,20 +47,37 @@ class CommunitySerializer(serializers.ModelSerializer):
     
     @extend_schema_field(OpenApiTypes.INT)
     def get_member_count(self, obj):
-        return obj.member_count
+        # Views pass counter deltas that are buffered but not yet flushed as `pending_community_counters`
+        pending = self.context.get('pending_community_counters', {}).get(obj.id, {})
+        return max(obj.member_count + pending.get('member_count_cache', 0), 0)
     
     @extend_schema_field(OpenApiTypes.INT)
     def get_post_count(self, obj):
-        return obj.posts.count()
+        return obj.post_count
+    
+    def _is_creator(self, obj, user):
+        return obj.creator_id is not None and obj.creator_id == user.id
+    
+    def _get_membership(self, obj, user):
+        """
+        Get the requesting user's membership for a community.
+        Views pass the memberships of the whole page in the context as `membership_map`;
+        without it the membership comes from the request's membership resolver.
+        """
+        membership_map = self.context.get('membership_map')
+        if membership_map is not None:
+            return membership_map.get(obj.id)
+        
+        return get_membership_resolver(user).get_membership(obj)
     
     @extend_schema_field(OpenApiTypes.BOOL)
     def get_is_member(self, obj):
         user = self.context.get('request').user
         if user.is_authenticated:
             # Creator is always considered a member
-            if obj.creator and obj.creator.id == user.id:
+            if self._is_creator(obj, user):
                 return True
-            return obj.members.filter(id=user.id).exists()
+            return self._get_membership(obj, user) is not None
         return False
     
     @extend_schema_field(OpenApiTypes.STR)
@@ -66,13 +85,11 @@ class CommunitySerializer(serializers.ModelSerializer):
         user = self.context.get('request').user
         if user.is_authenticated:
             # Creator is always considered approved
-            if obj.creator and obj.creator.id == user.id:
+            if self._is_creator(obj, user):
                 return 'approved'
-            try:
-                membership = Membership.objects.get(user=user, community=obj)
+            membership = self._get_membership(obj, user)
+            if membership:
                 return membership.status
-            except Membership.DoesNotExist:
-                pass
         return None
     
     @extend_schema_field(OpenApiTypes.STR)
@@ -80,13 +97,11 @@ class CommunitySerializer(serializers.ModelSerializer):
         user = self.context.get('request').user
         if user.is_authenticated:
             # Creator is always considered admin
-            if obj.creator and obj.creator.id == user.id:
+            if self._is_creator(obj, user):
                 return 'admin'
-            try:
-                membership = Membership.objects.get(user=user, community=obj)
+            membership = self._get_membership(obj, user)
+            if membership:
                 return membership.role
-            except Membership.DoesNotExist:
-                pass
         return None
 
 
@@ -100,13 +115,20 @@ class CommunityDetailSerializer(CommunitySerializer):
     
     @extend_schema_field(serializers.ListField(child=serializers.DictField()))
     def get_recent_posts(self, obj):
-        posts = obj.posts.order_by('-is_pinned', '-created_at')[:5]
-        serializer = PostSerializer(posts, many=True, context=self.context)
+        posts = list(obj.posts.select_related('author').order_by('-is_pinned', '-created_at')[:5])
+        request = self.context.get('request')
+        context = {
+            **self.context,
+            **PostService.get_post_state_map(request.user if request else None, posts),
+        }
+        serializer = PostSerializer(posts, many=True, context=context)
         return serializer.data
     
     @extend_schema_field(serializers.ListField(child=serializers.DictField()))
     def get_admins(self, obj):
-        admin_memberships = obj.membership_set.filter(role__in=['admin', 'moderator'])
+        admin_memberships = getattr(obj, 'admin_memberships', None)
+        if admin_memberships is None:
+            admin_memberships = obj.membership_set.filter(role__in=['admin', 'moderator']).select_related('user')
         admins = [membership.user for membership in admin_memberships]
         serializer = UserBasicSerializer(admins, many=True)
         return serializer.data
@@ -6,6 +6,10 @@ from ..models import Post, Community
 from .user_serializers import UserBasicSerializer
 
 
+# Number of comments shown on a post detail page without a comment window
+POST_DETAIL_COMMENT_LIMIT = 20
+
+
 class PostSerializer(serializers.ModelSerializer):
     """Serializer for community posts"""
     author = UserBasicSerializer(read_only=True)
@@ -41,61 +45,102 @@ class PostSerializer(serializers.ModelSerializer):
                 if field not in ['title', 'content', 'post_type'] and not self.fields[field].read_only:
                     self.fields[field].required = False
     
+    def _get_counter(self, obj, field):
+        """
+        Read a counter cache, adding the deltas that are buffered but not yet
+        flushed (see PostService.get_post_state_map)
+        """
+        pending = self.context.get('pending_post_counters', {}).get(obj.id, {})
+        return max(getattr(obj, field) + pending.get(field, 0), 0)
+    
     @extend_schema_field(OpenApiTypes.INT)
     def get_comment_count(self, obj):
-        return getattr(obj, 'comment_count', 0)
+        # Counter caches are kept up to date by signals
+        return self._get_counter(obj, 'comment_count_cache')
     
     @extend_schema_field(OpenApiTypes.INT)
     def get_upvote_count(self, obj):
-        return getattr(obj, 'upvote_count', 0)
+        return self._get_counter(obj, 'upvote_count_cache')
     
-    @extend_schema_field(OpenApiTypes.BOOL)
-    def get_has_upvoted(self, obj):
+    def _get_user(self):
         request = self.context.get('request')
         if request and hasattr(request, 'user') and request.user.is_authenticated:
-            return obj.upvotes.filter(id=request.user.id).exists()
+            return request.user
+        return None
+    
+    @extend_schema_field(OpenApiTypes.BOOL)
+    def get_has_upvoted(self, obj):
+        """
+        Check if the current user has upvoted this post.
+        Views pass the upvoted posts of the whole page in the context as
+        `upvoted_post_ids` (see PostService.get_post_state_map).
+        """
+        upvoted_post_ids = self.context.get('upvoted_post_ids')
+        if upvoted_post_ids is not None:
+            return obj.id in upvoted_post_ids
+        user = self._get_user()
+        if user:
+            return obj.upvotes.filter(id=user.id).exists()
         return False
     
+    def _get_participant_count(self, obj):
+        participant_counts = self.context.get('participant_counts')
+        if participant_counts is not None:
+            return participant_counts.get(obj.id, 0)
+        return obj.event_participants.count()
+    
     @extend_schema_field(OpenApiTypes.INT)
     def get_participant_count(self, obj):
         """Get number of participants for event posts"""
-        if hasattr(obj, 'event_participants') and obj.post_type == 'event':
-            return obj.event_participants.count()
+        if obj.post_type == 'event':
+            return self._get_participant_count(obj)
         return 0
     
     @extend_schema_field(OpenApiTypes.BOOL)
     def get_has_joined(self, obj):
         """Check if the current user has joined this event"""
-        request = self.context.get('request')
-        if (request and hasattr(request, 'user') and 
-            request.user.is_authenticated and 
-            obj.post_type == 'event' and
-            hasattr(obj, 'event_participants')):
-            return obj.event_participants.filter(id=request.user.id).exists()
+        if obj.post_type != 'event':
+            return False
+        joined_post_ids = self.context.get('joined_post_ids')
+        if joined_post_ids is not None:
+            return obj.id in joined_post_ids
+        user = self._get_user()
+        if user:
+            return obj.event_participants.filter(id=user.id).exists()
         return False
     
     @extend_schema_field(OpenApiTypes.BOOL)
     def get_is_full(self, obj):
         """Check if the event has reached its participant limit"""
-        if (obj.post_type == 'event' and 
-            hasattr(obj, 'event_participant_limit') and 
-            hasattr(obj, 'event_participants') and
-            obj.event_participant_limit is not None):
-            return obj.event_participants.count() >= obj.event_participant_limit
+        if obj.post_type == 'event' and obj.event_participant_limit is not None:
+            return self._get_participant_count(obj) >= obj.event_participant_limit
         return False
 
 
 class PostDetailSerializer(PostSerializer):
-    """Detailed serializer for a single post with comments"""
+    """
+    Detailed serializer for a single post with a window of its top-level comments.
+    Views pass the window in the context as `comment_window`, with the link
+    to the next one as `comments_next`; without them the first
+    POST_DETAIL_COMMENT_LIMIT comments are shown.
+    """
     comments = serializers.SerializerMethodField()
+    comments_next = serializers.SerializerMethodField()
     
     class Meta(PostSerializer.Meta):
-        fields = PostSerializer.Meta.fields + ['comments']
+        fields = PostSerializer.Meta.fields + ['comments', 'comments_next']
     
     @extend_schema_field(serializers.ListField(child=serializers.DictField()))
     def get_comments(self, obj):
         from .comment_serializers import CommentSerializer
-        # Get top-level comments only
-        comments = obj.comments.filter(parent=None)
+        comments = self.context.get('comment_window')
+        if comments is None:
+            # Get top-level comments only
+            comments = obj.comments.filter(parent=None).select_related('author')[:POST_DETAIL_COMMENT_LIMIT]
         serializer = CommentSerializer(comments, many=True, context=self.context)
-        return serializer.data
\ No newline at end of file
+        return serializer.data
+    
+    @extend_schema_field(OpenApiTypes.URI)
+    def get_comments_next(self, obj):
+        """Link to the next window of comments, if any"""
+        return self.context.get('comments_next')
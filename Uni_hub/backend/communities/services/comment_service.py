@@ -1,8 +1,13 @@
 from django.shortcuts import get_object_or_404
 from django.db.models import Q, Prefetch
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import PermissionDenied, ValidationError
 
 from ..models import Post, Comment, Membership
+from ..models.comment import MAX_COMMENT_DEPTH
+from ..utils.cache import bump_cache_version
+from ..utils.etags import post_version
+from ..utils.memberships import get_membership_resolver
+from ..utils.votes import toggle_vote
 
 
 class CommentService:
@@ -50,6 +55,59 @@ class CommentService:
         
         return queryset
     
+    @staticmethod
+    def get_comment_tree(user, post, root=None, max_depth=None):
+        """
+        Load a comment thread in one range query on the materialized paths.
+        With `root`, only that comment and its replies are loaded; `max_depth`
+        limits the reply levels loaded below the root (or below the top-level
+        comments without one).
+        Returns (roots, context): the top comments of the tree, each with its
+        loaded replies in `tree_replies`, and the serializer context entries
+        of every loaded comment (see get_comment_state_map). Reply counts
+        come from the counter cache, so they include replies below the depth limit.
+        """
+        queryset = Comment.objects.filter(post_id=post.id).select_related('author')
+        base_depth = 0
+        if root is not None:
+            lower, upper = root.get_subtree_bounds()
+            queryset = queryset.filter(path__gte=lower, path__lt=upper)
+            base_depth = root.depth
+        if max_depth is not None:
+            queryset = queryset.filter(depth__lte=base_depth + max_depth)
+        
+        # Sorting by path puts every comment right after its parent
+        comments = list(queryset.order_by('path'))
+        
+        by_id = {}
+        roots = []
+        for comment in comments:
+            comment.tree_replies = []
+            by_id[comment.id] = comment
+            parent = by_id.get(comment.parent_id)
+            if parent is not None:
+                parent.tree_replies.append(comment)
+            else:
+                roots.append(comment)
+        
+        return roots, CommentService.get_comment_state_map(user, comments)
+    
+    @staticmethod
+    def get_comment_state_map(user, comments):
+        """
+        Resolve the per-user fields of a set of comments in one query.
+        Returns the serializer context entry `upvoted_comment_ids`, a set of comment ids.
+        """
+        comment_ids = [comment.id for comment in comments]
+        upvoted_comment_ids = set()
+        if user is not None and user.is_authenticated and comment_ids:
+            upvoted_comment_ids = set(
+                Comment.upvotes.through.objects.filter(
+                    user_id=user.id, comment_id__in=comment_ids
+                ).values_list('comment_id', flat=True)
+            )
+        return {'upvoted_comment_ids': upvoted_comment_ids}
+    
     @staticmethod
     def validate_comment_creation(user, post, parent_id=None):
         """
@@ -58,21 +116,15 @@ class CommentService:
         Raises PermissionDenied if validation fails.
         """
         # Check if user is a member of the community OR is the creator
-        is_member = Membership.objects.filter(
-            user=user, 
-            community=post.community,
-            status='approved'
-        ).exists()
-        
-        is_creator = post.community.creator == user
-        
-        if not (is_member or is_creator):
+        if not get_membership_resolver(user).is_member(post.community):
             raise PermissionDenied("You must be a member of this community to comment.")
         
         # Process parent comment if provided
         parent = None
         if parent_id:
             parent = get_object_or_404(Comment, id=parent_id, post=post)
+            if parent.depth >= MAX_COMMENT_DEPTH:
+                raise ValidationError({'parent': f"Replies cannot be nested more than {MAX_COMMENT_DEPTH} levels deep."})
         
         return parent
     
@@ -82,22 +134,15 @@ class CommentService:
         Toggle upvote on a comment.
         Returns (upvoted, message)
         """
-        # Check if user is a member of the community OR is the creator
-        is_member = Membership.objects.filter(
-            user=user, 
-            community=comment.post.community,
-            status='approved'
-        ).exists()
-        
-        is_creator = comment.post.community.creator == user
-        
-        if not (is_member or is_creator):
+        # Check if user is the creator OR a member of the community
+        if not get_membership_resolver(user).is_member(comment.post.community):
             return False, "You must be a member of this community to upvote comments."
         
-        # Toggle upvote
-        if comment.upvotes.filter(id=user.id).exists():
-            comment.upvotes.remove(user)
-            return False, "Upvote removed."
-        else:
-            comment.upvotes.add(user)
-            return True, "Comment upvoted." 
\ No newline at end of file
+        # Toggle upvote and adjust the counter cache in one transaction
+        upvoted, changed = toggle_vote(Comment.upvotes, comment.id, user.id)
+        if changed:
+            bump_cache_version(post_version(comment.post_id))
+        
+        if upvoted:
+            return True, "Comment upvoted."
+        return False, "Upvote removed."
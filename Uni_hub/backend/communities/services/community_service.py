@@ -2,55 +2,105 @@ from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django.core.mail import send_mail
 from django.conf import settings
-from django.db.models import Q, Count, Prefetch
-from django.db.models.functions import TruncMonth, TruncDay
+from django.core.cache import cache
+from django.db.models import Q, Prefetch, prefetch_related_objects
 
 from ..models import Community, Membership, CommunityInvitation
-from ..utils.cache import cache_queryset, cached_method
+from ..utils.cache import (
+    generate_cache_key, get_cache_version, bump_cache_version, get_or_compute, CachedIdList
+)
+from ..utils.memberships import get_membership_resolver
+from .search_service import CommunitySearchService
+from .tag_service import TagService
+
+
+# Version counter of the cached community id lists, bumped on any community or membership change
+COMMUNITY_LIST_VERSION = 'community_list'
+COMMUNITY_LIST_CACHE_TIMEOUT = 60
+
+# Columns loaded for community list cards (everything CommunitySerializer renders)
+COMMUNITY_CARD_FIELDS = [
+    'id', 'name', 'slug', 'description', 'short_description', 'category', 'tags',
+    'image', 'banner', 'rules', 'is_private', 'requires_approval',
+    'member_count_cache', 'post_count_cache', 'created_at', 'updated_at',
+    'creator', 'creator__id', 'creator__username', 'creator__email',
+    'creator__first_name', 'creator__last_name',
+]
 
 
 class CommunityService:
     """Service class for community operations"""
     
     @staticmethod
-    @cache_queryset(timeout=60)  # Cache for 1 minute
-    def get_community_queryset(user, category=None, search=None, tag=None, member_of=None, order_by='created_at'):
+    def get_community_queryset(user, category=None, search=None, tag=None, member_of=None, order_by=None, tag_match='all'):
         """
-        Get a filtered queryset of communities based on parameters.
+        Get the filtered communities as a lazily hydrated list.
+        Only the ordered ids are cached; see build_community_queryset for the parameters.
         """
-        # Convert user to user.id if authenticated to avoid serialization issues
-        user_id = user.id if user and hasattr(user, 'id') else None
-        
-        queryset = Community.objects.all()
+        user_id = user.id if user and user.is_authenticated else None
+        key = generate_cache_key(
+            f"community_ids:{get_cache_version(COMMUNITY_LIST_VERSION)}",
+            user_id=user_id, category=category, search=search, tag=tag,
+            member_of=member_of, order_by=order_by, tag_match=tag_match
+        )
         
-        # Add select_related for foreign keys
-        queryset = queryset.select_related('creator')
+        # Computed by one request at a time when the list expires or is invalidated
+        ids = get_or_compute(key, lambda: list(CommunityService.build_community_queryset(
+            user, category=category, search=search, tag=tag,
+            member_of=member_of, order_by=order_by, tag_match=tag_match
+        ).values_list('pk', flat=True)), COMMUNITY_LIST_CACHE_TIMEOUT)
         
-        # Add prefetch_related for reverse relations and many-to-many
-        queryset = queryset.prefetch_related(
-            'members',
+        return CachedIdList(ids, CommunityService.get_community_card_queryset())
+    
+    @staticmethod
+    def invalidate_community_lists():
+        """Invalidate every cached community id list"""
+        bump_cache_version(COMMUNITY_LIST_VERSION)
+    
+    @staticmethod
+    def get_community_card_queryset():
+        """
+        Communities with only the columns a list card needs and the creator joined.
+        Members and memberships are not loaded; see get_community_detail_queryset.
+        """
+        return Community.objects.select_related('creator').only(*COMMUNITY_CARD_FIELDS)
+    
+    @staticmethod
+    def get_community_detail_queryset():
+        """Communities for the detail page; see prefetch_community_details for the relations"""
+        return Community.objects.select_related('creator')
+    
+    @staticmethod
+    def prefetch_community_details(communities):
+        """Load the admins and moderators shown on the detail page"""
+        prefetch_related_objects(
+            communities,
             Prefetch(
-                'membership_set', 
-                queryset=Membership.objects.filter(status='approved').select_related('user'),
-                to_attr='active_memberships'
+                'membership_set',
+                queryset=Membership.objects.filter(role__in=['admin', 'moderator']).select_related('user'),
+                to_attr='admin_memberships'
             )
         )
+    
+    @staticmethod
+    def build_community_queryset(user, category=None, search=None, tag=None, member_of=None, order_by=None, tag_match='all'):
+        """
+        Get a filtered queryset of communities based on parameters.
+        `tag` may be a single tag or a list of tags, matched exactly against normalized tags.
+        Search results are ordered by relevance unless an explicit order_by is given.
+        """
+        # Convert user to user.id if authenticated to avoid serialization issues
+        user_id = user.id if user and hasattr(user, 'id') else None
+        
+        queryset = CommunityService.get_community_card_queryset()
         
         # Filter by category
         if category:
             queryset = queryset.filter(category=category)
         
-        # Filter by search term
-        if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) | 
-                Q(description__icontains=search) |
-                Q(tags__icontains=search)
-            )
-        
         # Filter by tag
         if tag:
-            queryset = queryset.filter(tags__icontains=tag)
+            queryset = TagService.filter_by_tags(queryset, tag, match=tag_match)
         
         # Only show communities the user is a member of
         if member_of and user_id:
@@ -65,25 +115,46 @@ class CommunityService:
                 Q(members__id=user_id)
             ).distinct()
         
+        # Filter by search term, ranked by relevance (name > tags > description)
+        if search:
+            queryset = CommunitySearchService.search(queryset, search)
+            if order_by in (None, 'relevance'):
+                return queryset
+        
         # Apply ordering
         if order_by == 'name':
             queryset = queryset.order_by('name')
         elif order_by == 'member_count':
             # Use cached member count if available, otherwise fallback to annotation
             queryset = queryset.order_by('-member_count_cache')
+        elif order_by == 'post_count':
+            queryset = queryset.order_by('-post_count_cache')
         else:  # Default to most recent
             queryset = queryset.order_by('-created_at')
             
         return queryset
     
+    @staticmethod
+    def get_membership_map(user, community_ids):
+        """
+        Load the user's memberships for a set of communities in a single query.
+        Returns a dict of community_id -> Membership.
+        """
+        if not user or not user.is_authenticated or not community_ids:
+            return {}
+        
+        return get_membership_resolver(user).get_membership_map(community_ids)
+    
     @staticmethod
     def join_community(user, community):
         """
         Handle joining a community with appropriate status based on community settings.
         Returns (created_membership, message)
         """
+        resolver = get_membership_resolver(user)
+        
         # Check if user is already a member
-        if Membership.objects.filter(user=user, community=community).exists():
+        if resolver.get_membership(community) is not None:
             return None, "You are already a member of this community."
         
         # Check if community requires approval
@@ -95,6 +166,7 @@ class CommunityService:
                 role='member',
                 status='pending'
             )
+            resolver.remember(membership)
             return membership, "Join request submitted. An admin will review your request."
         else:
             # Direct join
@@ -104,6 +176,7 @@ class CommunityService:
                 role='member',
                 status='approved'
             )
+            resolver.remember(membership)
             return membership, "You have successfully joined this community."
     
     @staticmethod
@@ -112,9 +185,8 @@ class CommunityService:
         Handle leaving a community.
         Returns (success, message)
         """
-        try:
-            membership = Membership.objects.get(user=user, community=community)
-        except Membership.DoesNotExist:
+        membership = get_membership_resolver(user).get_membership(community)
+        if membership is None:
             return False, "You are not a member of this community."
         
         # Check if user is the only admin
@@ -252,39 +324,3 @@ class CommunityService:
             membership.status = 'rejected'
             membership.save()
             return True, "Membership request rejected."
-    
-    @staticmethod
-    @cached_method(timeout=300)  # Cache for 5 minutes
-    def get_community_analytics(community_id):
-        """
-        Get analytics data for a community.
-        This is a computationally expensive operation, so we cache it.
-        """
-        community = Community.objects.get(id=community_id)
-        
-        # Member growth analytics
-        member_growth = Membership.objects.filter(
-            community=community, 
-            status='approved'
-        ).annotate(
-            month=TruncMonth('joined_at')
-        ).values('month').annotate(count=Count('id')).order_by('month')
-        
-        # Post activity analytics
-        post_activity = community.posts.annotate(
-            day=TruncDay('created_at')
-        ).values('day').annotate(count=Count('id')).order_by('day')
-        
-        # Top contributors (users with most posts)
-        top_contributors = community.posts.values(
-            'author__id', 'author__username', 'author__first_name', 'author__last_name'
-        ).annotate(post_count=Count('id')).order_by('-post_count')[:10]
-        
-        return {
-            'member_growth': list(member_growth),
-            'post_activity': list(post_activity),
-            'top_contributors': list(top_contributors),
-            'total_members': community.members.filter(membership__status='approved').count(),
-            'total_posts': community.posts.count(),
-            'total_comments': sum(post.comments.count() for post in community.posts.all()),
-        }
\ No newline at end of file
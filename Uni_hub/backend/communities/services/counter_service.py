@@ -0,0 +1,184 @@
+from django.core.cache import cache
+from django.db.models import Count, Exists, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from ..models import Community, Membership, Post, Comment
+from ..utils.cache import bump_cache_version
+from ..utils.counters import counter_buffer_enabled, flush_counter_buffer, get_pending_counters
+from ..utils.etags import community_version, post_version
+
+
+# Source rows of each counter column: (model, foreign key to the counted row,
+# filters, timestamp used by --since or None when the rows have none)
+RECONCILED_COUNTERS = {
+    'community': (Community, {
+        'member_count_cache': (Membership, 'community', {'status': 'approved'}, 'updated_at'),
+        'post_count_cache': (Post, 'community', {}, 'created_at'),
+    }),
+    'post': (Post, {
+        'upvote_count_cache': (Post.upvotes.through, 'post', {}, None),
+        'comment_count_cache': (Comment, 'post', {}, 'created_at'),
+    }),
+    'comment': (Comment, {
+        'upvote_count_cache': (Comment.upvotes.through, 'comment', {}, None),
+        'reply_count_cache': (Comment, 'parent', {}, 'created_at'),
+    }),
+}
+
+RECONCILE_CHUNK_SIZE = 1000
+
+# Drifted counters kept in the stats of a run for reporting
+RECONCILE_DRIFT_SAMPLES = 20
+
+# Checkpoints outlive a run so that an interrupted one can be resumed
+RECONCILE_CHECKPOINT_TIMEOUT = 60 * 60 * 24 * 7
+
+
+def count_of(source, fk, filters):
+    """Correlated subquery counting the source rows of the outer row, 0 when there are none"""
+    rows = source.objects.filter(
+        **{fk: OuterRef('pk')}, **filters
+    ).order_by().values(fk).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(rows, output_field=IntegerField()), 0)
+
+
+def checkpoint_key(name, since):
+    """Cache key of the last reconciled primary key of a model"""
+    return f"reconcile_counters:{name}:{since.isoformat() if since else 'all'}"
+
+
+class CounterService:
+    """Service class for recounting the cached counter columns"""
+
+    @staticmethod
+    def get_reconcile_queryset(name, since=None):
+        """
+        Rows of a model to reconcile. With `since`, only rows updated since
+        then or with counted rows created or updated since then. Removed
+        rows and votes leave no timestamp, so their drift needs a full run.
+        """
+        model, counters = RECONCILED_COUNTERS[name]
+        queryset = model.objects.all()
+        if since is None:
+            return queryset
+
+        touched = Q(updated_at__gte=since)
+        for source, fk, filters, timestamp in counters.values():
+            if timestamp is not None:
+                touched |= Q(Exists(source.objects.filter(
+                    **{fk: OuterRef('pk'), f'{timestamp}__gte': since}
+                )))
+        return queryset.filter(touched)
+
+    @staticmethod
+    def reconcile_chunk(name, pks, dry_run=False):
+        """
+        Recount the counters of a chunk of rows in set-based queries: one
+        SELECT of the drifted rows with aggregate subqueries, and one UPDATE
+        recomputing them. Rows with buffered deltas not yet flushed are
+        skipped rather than overwritten.
+        Returns (drift, fixed_pks): a list of (pk, field, cached, actual)
+        and the primary keys that were updated.
+        """
+        model, counters = RECONCILED_COUNTERS[name]
+        actual = {
+            field: count_of(source, fk, filters)
+            for field, (source, fk, filters, timestamp) in counters.items()
+        }
+
+        drifted = Q()
+        for field in counters:
+            drifted |= ~Q(**{field: F(f'actual_{field}')})
+        rows = model.objects.filter(pk__in=pks).annotate(
+            **{f'actual_{field}': expression for field, expression in actual.items()}
+        ).filter(drifted).values('pk', *counters, *[f'actual_{field}' for field in counters])
+        rows = list(rows)
+
+        pending = get_pending_counters(model, [row['pk'] for row in rows])
+        drift = []
+        fix_pks = []
+        for row in rows:
+            row_pending = pending.get(row['pk'], {})
+            row_drift = [
+                (row['pk'], field, row[field] + row_pending.get(field, 0), row[f'actual_{field}'])
+                for field in counters
+                if row[field] + row_pending.get(field, 0) != row[f'actual_{field}']
+            ]
+            drift.extend(row_drift)
+            if row_drift and not row_pending:
+                fix_pks.append(row['pk'])
+
+        if dry_run or not fix_pks:
+            return drift, []
+
+        model.objects.filter(pk__in=fix_pks).update(**actual)
+        CounterService.invalidate_reconciled(name, fix_pks)
+        return drift, fix_pks
+
+    @staticmethod
+    def invalidate_reconciled(name, pks):
+        """Bump the ETag versions of the representations that show the fixed counters"""
+        if name == 'community':
+            versions = [community_version(pk) for pk in pks]
+        elif name == 'post':
+            versions = [post_version(pk) for pk in pks]
+        else:
+            post_ids = Comment.objects.filter(pk__in=pks).values_list('post_id', flat=True).distinct()
+            versions = [post_version(post_id) for post_id in post_ids]
+        for version in versions:
+            bump_cache_version(version)
+
+    @staticmethod
+    def reconcile(name, since=None, chunk_size=RECONCILE_CHUNK_SIZE, dry_run=False, resume=False, progress=None):
+        """
+        Reconcile the counters of one model in primary key chunks.
+        After each chunk the last primary key is checkpointed; with `resume`
+        the run continues after the checkpoint of an interrupted run with the
+        same `since`. `progress` is called with the running stats after each chunk.
+        Returns the stats: rows checked, drifted counters, rows fixed and
+        drifted rows skipped for pending buffered deltas, with the first
+        RECONCILE_DRIFT_SAMPLES drifted counters in `drift`.
+        """
+        key = checkpoint_key(name, since)
+        last_pk = (cache.get(key) or 0) if resume else 0
+        stats = {'checked': 0, 'drifted': 0, 'fixed': 0, 'skipped': 0, 'last_pk': last_pk, 'drift': []}
+        queryset = CounterService.get_reconcile_queryset(name, since).order_by('pk')
+
+        while True:
+            pks = list(queryset.filter(pk__gt=last_pk).values_list('pk', flat=True)[:chunk_size])
+            if not pks:
+                break
+
+            drift, fixed_pks = CounterService.reconcile_chunk(name, pks, dry_run=dry_run)
+            drifted_pks = {pk for pk, field, cached, actual in drift}
+            last_pk = pks[-1]
+            stats['checked'] += len(pks)
+            stats['drifted'] += len(drift)
+            stats['fixed'] += len(fixed_pks)
+            stats['last_pk'] = last_pk
+            stats['drift'].extend(drift[:RECONCILE_DRIFT_SAMPLES - len(stats['drift'])])
+            if not dry_run:
+                stats['skipped'] += len(drifted_pks) - len(fixed_pks)
+                cache.set(key, last_pk, RECONCILE_CHECKPOINT_TIMEOUT)
+            if progress is not None:
+                progress(name, stats)
+
+        if not dry_run:
+            cache.delete(key)
+        return stats
+
+    @staticmethod
+    def reconcile_all(since=None, chunk_size=RECONCILE_CHUNK_SIZE, dry_run=False, resume=False, progress=None):
+        """
+        Reconcile the counters of every model. Buffered deltas are flushed
+        first, as rows with pending deltas are skipped.
+        Returns a dict of model name -> stats.
+        """
+        if not dry_run and counter_buffer_enabled():
+            flush_counter_buffer()
+        return {
+            name: CounterService.reconcile(
+                name, since=since, chunk_size=chunk_size, dry_run=dry_run, resume=resume, progress=progress
+            )
+            for name in RECONCILED_COUNTERS
+        }
@@ -0,0 +1,275 @@
+import datetime
+
+from django.db.models import Q
+from django_redis import get_redis_connection
+
+from ..models import Community, Membership, Post
+
+
+# Communities with more approved members than this are not fanned out on
+# write; their posts are merged into feeds when they are read
+FEED_FANOUT_LIMIT = 1000
+
+# Number of entries kept in each user's feed and how long an unread feed lives
+FEED_MAX_LENGTH = 500
+FEED_TIMEOUT = 60 * 60 * 24 * 7
+
+# Maximum number of pinned posts shown above the first page
+FEED_PINNED_LIMIT = 10
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def feed_key(user_id):
+    """Redis key of a user's feed sorted set"""
+    return f"feed:user:{user_id}"
+
+
+def feed_score(created_at):
+    """Feed score of a post: its creation time in integer microseconds, exact in a double"""
+    return (created_at - EPOCH) // datetime.timedelta(microseconds=1)
+
+
+def score_to_datetime(score):
+    """The creation time a feed score was computed from"""
+    return EPOCH + datetime.timedelta(microseconds=score)
+
+
+def feed_scores(rows):
+    """Map (post id, created_at) rows to sorted set members and scores"""
+    return {str(pk): feed_score(created_at) for pk, created_at in rows}
+
+
+class UserFeed:
+    """
+    The home feed of one user, read in (score, post id) order, newest first.
+
+    Entries come from the user's Redis sorted set (posts of communities that
+    are fanned out on write) merged with the recent posts of large joined
+    communities, read from the database. Posts are loaded from the database
+    when a page is read, so deletions, unpinning and membership changes are
+    reflected immediately; stale entries are removed from the set as they
+    are encountered.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.key = feed_key(user.id)
+        self.redis = get_redis_connection('default')
+
+        joined = Community.objects.filter(
+            membership__user=user, membership__status='approved'
+        ).values_list('id', 'member_count_cache')
+        self.community_ids = set()
+        self.large_community_ids = set()
+        for community_id, member_count in joined:
+            self.community_ids.add(community_id)
+            if member_count > FEED_FANOUT_LIMIT:
+                self.large_community_ids.add(community_id)
+
+    def get_pinned_posts(self):
+        """Pinned posts of the joined communities, shown above the first page"""
+        return list(
+            FeedService.get_feed_post_queryset()
+            .filter(community_id__in=self.community_ids, is_pinned=True)
+            .order_by('-created_at', '-id')[:FEED_PINNED_LIMIT]
+        )
+
+    def get_page(self, position, limit):
+        """
+        Get up to `limit` unpinned posts after `position`, a (score, post id)
+        pair or None for the start of the feed.
+        Returns the posts and the position of the last one.
+        """
+        if not self.community_ids:
+            return [], None
+        if position is None:
+            FeedService.ensure_feed(self.user, self)
+
+        posts = []
+        while len(posts) < limit:
+            wanted = limit - len(posts)
+            entries = self.get_entries(position, wanted)
+            if not entries:
+                break
+
+            instances = FeedService.get_feed_post_queryset().in_bulk([pk for _, pk in entries])
+            stale = []
+            for score, pk in entries:
+                post = instances.get(pk)
+                if post is None or post.community_id not in self.community_ids:
+                    stale.append(pk)
+                elif not post.is_pinned:
+                    posts.append(post)
+                position = (score, pk)
+
+            if stale:
+                self.redis.zrem(self.key, *stale)
+            if len(entries) < wanted:
+                break
+        return posts, position
+
+    def get_entries(self, position, count):
+        """The next `count` (score, post id) entries after position, from both sources"""
+        entries = dict(self.get_stored_entries(position, count))
+        if self.large_community_ids:
+            entries.update(self.get_large_community_entries(position, count))
+        ordered = sorted(((score, pk) for pk, score in entries.items()), reverse=True)
+        return ordered[:count]
+
+    def get_stored_entries(self, position, count):
+        """Entries of the Redis sorted set, as (post id, score) pairs"""
+        if position is None:
+            max_score, ties = '+inf', 0
+        else:
+            # Entries sharing the cursor's score are fetched again and skipped below
+            max_score = position[0]
+            ties = self.redis.zcount(self.key, max_score, max_score)
+        raw = self.redis.zrevrangebyscore(
+            self.key, max_score, '-inf', start=0, num=count + ties, withscores=True
+        )
+        entries = []
+        for member, score in raw:
+            pk, score = int(member), int(score)
+            if position is None or (score, pk) < position:
+                entries.append((pk, score))
+        return entries
+
+    def get_large_community_entries(self, position, count):
+        """Recent unpinned posts of large communities, as (post id, score) pairs"""
+        queryset = Post.objects.filter(
+            community_id__in=self.large_community_ids, is_pinned=False
+        )
+        if position is not None:
+            score, pk = position
+            created_at = score_to_datetime(score)
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+            )
+        rows = queryset.order_by('-created_at', '-id').values_list('id', 'created_at')[:count]
+        return [(pk, feed_score(created_at)) for pk, created_at in rows]
+
+
+class FeedService:
+    """Service class for the personalized home feed"""
+
+    @staticmethod
+    def get_feed(user):
+        """Get the feed of a user"""
+        return UserFeed(user)
+
+    @staticmethod
+    def get_feed_post_queryset():
+        """Posts with the relations the feed serializer shows"""
+        return Post.objects.select_related('community', 'author')
+
+    @staticmethod
+    def ensure_feed(user, feed=None):
+        """
+        Build the feed of a user from the database if it is not stored,
+        e.g. for a new user or after the feed expired. Only this user's
+        feed is built; other feeds are maintained incrementally.
+        """
+        feed = feed or UserFeed(user)
+        redis = feed.redis
+        # Reading a stored feed extends its lifetime
+        if redis.expire(feed.key, FEED_TIMEOUT):
+            return
+        small_ids = feed.community_ids - feed.large_community_ids
+        if not small_ids:
+            return
+        rows = (
+            Post.objects.filter(community_id__in=small_ids)
+            .order_by('-created_at', '-id')
+            .values_list('id', 'created_at')[:FEED_MAX_LENGTH]
+        )
+        mapping = feed_scores(rows)
+        if mapping:
+            pipe = redis.pipeline()
+            pipe.zadd(feed.key, mapping)
+            pipe.expire(feed.key, FEED_TIMEOUT)
+            pipe.execute()
+
+    @staticmethod
+    def is_fanned_out(community_id):
+        """Whether posts of a community are pushed to member feeds on write"""
+        member_count = Community.objects.filter(pk=community_id).values_list(
+            'member_count_cache', flat=True
+        ).first()
+        return member_count is not None and member_count <= FEED_FANOUT_LIMIT
+
+    @staticmethod
+    def add_post(post):
+        """
+        Push a new post onto the stored feeds of its community's members.
+        Feeds that are not stored are left alone; they are built in full,
+        including this post, when they are next read.
+        """
+        keys = [
+            feed_key(user_id) for user_id in Membership.objects.filter(
+                community_id=post.community_id, status='approved'
+            ).values_list('user_id', flat=True)
+        ]
+        if not keys:
+            return
+        redis = get_redis_connection('default')
+        pipe = redis.pipeline(transaction=False)
+        for key in keys:
+            pipe.exists(key)
+        stored = [key for key, exists in zip(keys, pipe.execute()) if exists]
+
+        score = feed_score(post.created_at)
+        pipe = redis.pipeline(transaction=False)
+        for key in stored:
+            pipe.zadd(key, {str(post.pk): score})
+            # Keep only the newest entries
+            pipe.zremrangebyrank(key, 0, -FEED_MAX_LENGTH - 1)
+            pipe.expire(key, FEED_TIMEOUT)
+        pipe.execute()
+
+    @staticmethod
+    def remove_post(post):
+        """Remove a deleted post from the stored feeds of its community's members"""
+        user_ids = Membership.objects.filter(
+            community_id=post.community_id, status='approved'
+        ).values_list('user_id', flat=True)
+        redis = get_redis_connection('default')
+        pipe = redis.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.zrem(feed_key(user_id), str(post.pk))
+        pipe.execute()
+
+    @staticmethod
+    def add_community(user_id, community_id):
+        """Merge the recent posts of a joined community into a user's stored feed"""
+        redis = get_redis_connection('default')
+        key = feed_key(user_id)
+        # Feeds that are not stored are built in full when they are next read
+        if not redis.exists(key) or not FeedService.is_fanned_out(community_id):
+            return
+        rows = (
+            Post.objects.filter(community_id=community_id)
+            .order_by('-created_at', '-id')
+            .values_list('id', 'created_at')[:FEED_MAX_LENGTH]
+        )
+        mapping = feed_scores(rows)
+        if mapping:
+            pipe = redis.pipeline()
+            pipe.zadd(key, mapping)
+            pipe.zremrangebyrank(key, 0, -FEED_MAX_LENGTH - 1)
+            pipe.execute()
+
+    @staticmethod
+    def remove_community(user_id, community_id):
+        """Remove the posts of a community a user left from their stored feed"""
+        redis = get_redis_connection('default')
+        key = feed_key(user_id)
+        members = redis.zrange(key, 0, -1)
+        if not members:
+            return
+        post_ids = Post.objects.filter(
+            community_id=community_id, id__in=[int(member) for member in members]
+        ).values_list('id', flat=True)
+        stale = [str(pk) for pk in post_ids]
+        if stale:
+            redis.zrem(key, *stale)
@@ -1,8 +1,14 @@
 from django.shortcuts import get_object_or_404
-from django.db.models import Q, Prefetch
+from django.db.models import Q, Count
 from rest_framework.exceptions import PermissionDenied
 
 from ..models import Community, Membership, Post, Comment
+from ..utils.cache import bump_cache_version
+from ..utils.counters import get_pending_counters
+from ..utils.etags import post_version, community_version
+from ..utils.memberships import get_membership_resolver
+from ..utils.votes import toggle_vote
+from .stats_service import record_upvotes
 
 
 class PostService:
@@ -12,22 +18,15 @@ class PostService:
     def get_post_queryset(user, community_slug=None, post_type=None, search=None):
         """
         Get a filtered queryset of posts based on parameters.
+        Nothing is prefetched: list fields come from the counter caches and
+        get_post_state_map, and the detail view loads its comment window
+        with get_comment_window_queryset.
         """
         queryset = Post.objects.all()
         
         # Add select_related for foreign keys
         queryset = queryset.select_related('community', 'author')
         
-        # Add prefetch_related for reverse relations and many-to-many
-        queryset = queryset.prefetch_related(
-            'upvotes',
-            Prefetch(
-                'comments',
-                queryset=Comment.objects.filter(parent=None).select_related('author'),
-                to_attr='top_level_comments'
-            )
-        )
-        
         # Filter by community
         if community_slug:
             queryset = queryset.filter(community__slug=community_slug)
@@ -55,6 +54,51 @@ class PostService:
         # Default ordering
         return queryset.order_by('-is_pinned', '-created_at')
     
+    @staticmethod
+    def get_comment_window_queryset(post):
+        """Top-level comments of a post, for the paginated window on the detail page"""
+        return Comment.objects.filter(post=post, parent=None).select_related('author').order_by('created_at')
+    
+    @staticmethod
+    def get_post_state_map(user, posts):
+        """
+        Resolve the per-user and event fields of a page of posts in two queries.
+        Returns the serializer context entries `upvoted_post_ids` and
+        `joined_post_ids` (sets of post ids), `participant_counts`
+        (a dict of post_id -> number of participants of event posts) and
+        `pending_post_counters` (counter deltas not yet flushed to the database).
+        """
+        post_ids = [post.id for post in posts]
+        event_ids = [post.id for post in posts if post.post_type == 'event']
+        authenticated = user is not None and user.is_authenticated
+        state = {
+            'upvoted_post_ids': set(),
+            'joined_post_ids': set(),
+            'participant_counts': {},
+            'pending_post_counters': get_pending_counters(Post, post_ids),
+        }
+        
+        if authenticated and post_ids:
+            state['upvoted_post_ids'] = set(
+                Post.upvotes.through.objects.filter(
+                    user_id=user.id, post_id__in=post_ids
+                ).values_list('post_id', flat=True)
+            )
+        
+        if event_ids:
+            counts = {'participants': Count('id')}
+            if authenticated:
+                counts['joined'] = Count('id', filter=Q(user_id=user.id))
+            rows = Post.event_participants.through.objects.filter(
+                post_id__in=event_ids
+            ).values('post_id').annotate(**counts)
+            for row in rows:
+                state['participant_counts'][row['post_id']] = row['participants']
+                if row.get('joined'):
+                    state['joined_post_ids'].add(row['post_id'])
+        
+        return state
+    
     @staticmethod
     def validate_post_creation(user, community):
         """
@@ -62,26 +106,25 @@ class PostService:
         Raises PermissionDenied if validation fails.
         Returns (validated, membership) tuple otherwise.
         """
+        resolver = get_membership_resolver(user)
+        membership = resolver.get_membership(community)
+        
         # If user is the creator
-        if community.creator == user or community.creator_id == user.id:
+        if resolver.is_creator(community):
             # Ensure creator has admin membership
-            membership, created = Membership.objects.get_or_create(
-                user=user,
-                community=community,
-                defaults={'role': 'admin', 'status': 'approved'}
-            )
+            if membership is None:
+                membership, created = Membership.objects.get_or_create(
+                    user=user,
+                    community=community,
+                    defaults={'role': 'admin', 'status': 'approved'}
+                )
+                resolver.remember(membership)
             return True, membership
         
         # If user is a member
-        try:
-            membership = Membership.objects.get(
-                user=user, 
-                community=community,
-                status='approved'
-            )
+        if membership is not None and membership.status == 'approved':
             return True, membership
-        except Membership.DoesNotExist:
-            raise PermissionDenied("You must be a member of this community to post.")
+        raise PermissionDenied("You must be a member of this community to post.")
     
     @staticmethod
     def toggle_post_upvote(post, user):
@@ -89,25 +132,20 @@ class PostService:
         Toggle upvote on a post.
         Returns (upvoted, message)
         """
-        # Check if user is a member of the community OR is the creator
-        is_member = Membership.objects.filter(
-            user=user, 
-            community=post.community,
-            status='approved'
-        ).exists()
-        
-        is_creator = post.community.creator == user
-        
-        if not (is_member or is_creator):
+        # Check if user is the creator OR a member of the community
+        if not get_membership_resolver(user).is_member(post.community):
             return False, "You must be a member of this community to upvote posts."
         
-        # Toggle upvote
-        if post.upvotes.filter(id=user.id).exists():
-            post.upvotes.remove(user)
-            return False, "Upvote removed."
-        else:
-            post.upvotes.add(user)
+        # Toggle upvote and adjust the counter cache in one transaction
+        upvoted, changed = toggle_vote(Post.upvotes, post.id, user.id)
+        if changed:
+            record_upvotes(post.community_id, 1 if upvoted else -1)
+            bump_cache_version(post_version(post.id))
+            bump_cache_version(community_version(post.community_id))
+        
+        if upvoted:
             return True, "Post upvoted."
+        return False, "Upvote removed."
     
     @staticmethod
     def toggle_post_pin(post):
@@ -0,0 +1,263 @@
+import logging
+import uuid
+
+from django.db import transaction
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+from ..models import Membership
+
+
+logger = logging.getLogger(__name__)
+
+# How long a stored role map lives before it is built again
+ROLE_MAP_TIMEOUT = 60 * 60 * 24
+
+# Field present in every stored map, so a user without memberships has one too
+ROLE_MAP_SENTINEL = '_'
+
+# Users reconciled per query
+ROLE_MAP_RECONCILE_BATCH_SIZE = 500
+
+# Seconds a build marker lives; a build slower than this does not store its map
+ROLE_MAP_BUILD_LEASE = 10
+
+# Set a field only in a map that is already stored, never creating a partial
+# map, and cancel any build in progress, which may have read the old rows
+SET_IF_STORED = """
+redis.call('del', KEYS[2])
+if redis.call('exists', KEYS[1]) == 1 then
+    return redis.call('hset', KEYS[1], ARGV[1], ARGV[2])
+end
+return -1
+"""
+
+# Remove a field and cancel any build in progress
+REMOVE_FIELD = """
+redis.call('del', KEYS[2])
+return redis.call('hdel', KEYS[1], ARGV[1])
+"""
+
+# Replace a map built from the database, unless a membership write since the
+# build started cancelled it. ARGV: build token, timeout, then field/value pairs
+STORE_IF_UNCHANGED = """
+if redis.call('get', KEYS[2]) ~= ARGV[1] then
+    return 0
+end
+redis.call('del', KEYS[2], KEYS[1])
+redis.call('hset', KEYS[1], unpack(ARGV, 3))
+redis.call('expire', KEYS[1], ARGV[2])
+return 1
+"""
+
+
+def role_map_key(user_id):
+    """Redis key of a user's hash of community id -> "role:status" """
+    return f"roles:user:{user_id}"
+
+
+def role_map_build_key(user_id):
+    """Redis key holding the token of the build of a user's map in progress"""
+    return f"roles:build:{user_id}"
+
+
+def encode_entry(role, status):
+    return f"{role}:{status}"
+
+
+def decode_map(raw):
+    """Decode a stored hash into a dict of community_id -> (role, status)"""
+    roles = {}
+    for field, value in raw.items():
+        field = field.decode('utf-8') if isinstance(field, bytes) else field
+        if field == ROLE_MAP_SENTINEL:
+            continue
+        value = value.decode('utf-8') if isinstance(value, bytes) else value
+        role, _, status = value.partition(':')
+        roles[int(field)] = (role, status)
+    return roles
+
+
+class RoleMapWrite:
+    """
+    on_commit callback applying a membership change to one user's map.
+    Until it runs, the user's map is pending (see pending_role_maps).
+    """
+
+    def __init__(self, user_id, apply):
+        self.user_id = user_id
+        self.apply = apply
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        self.apply()
+
+
+def pending_role_maps():
+    """
+    Ids of the users with membership writes in the open transaction, whose
+    stored maps are only updated once it commits. Read from the transaction's
+    on_commit callbacks, which Django drops when the transaction or the
+    savepoint that registered them is rolled back.
+    """
+    connection = transaction.get_connection()
+    return {
+        callback.user_id
+        for _, callback, *_ in connection.run_on_commit
+        if isinstance(callback, RoleMapWrite) and not callback.done
+    }
+
+
+class RoleMapService:
+    """
+    Per-user maps of community id -> (role, status) kept in Redis, so
+    membership checks need no database query.
+
+    A map is built from the database on its first read, and membership saves
+    and deletes are written to it once their transaction commits. A build
+    first sets a marker that every write deletes, and only stores its map if
+    the marker is still there, so it never overwrites a newer write with the
+    rows it read before. Until its transaction commits, a user with pending
+    membership writes is answered from the database. Redis errors are logged
+    and fall back to the database; reconcile() rewrites the maps they left
+    stale.
+    """
+
+    @staticmethod
+    def get_role_map(user_id):
+        """
+        The user's role map, from Redis or built from the database.
+        None while the user has membership writes waiting for the open
+        transaction to commit; check the membership rows instead.
+        """
+        if user_id in pending_role_maps():
+            return None
+        try:
+            raw = get_redis_connection('default').hgetall(role_map_key(user_id))
+        except RedisError:
+            logger.exception('Could not read the role map of user %s', user_id)
+            return RoleMapService.load_role_maps([user_id])[user_id]
+        if raw:
+            return decode_map(raw)
+        return RoleMapService.rebuild(user_id)
+
+    @staticmethod
+    def load_role_maps(user_ids):
+        """Role maps of several users from the database, as dicts of community_id -> (role, status)"""
+        roles = {user_id: {} for user_id in user_ids}
+        rows = Membership.objects.filter(user_id__in=user_ids).values_list('user_id', 'community_id', 'role', 'status')
+        for user_id, community_id, role, status in rows:
+            roles[user_id][community_id] = (role, status)
+        return roles
+
+    @staticmethod
+    def store(redis, user_id, token, roles):
+        """Store a map built since `token` was set, unless a membership write cancelled the build"""
+        mapping = [ROLE_MAP_SENTINEL, '']
+        for community_id, entry in roles.items():
+            mapping.extend([str(community_id), encode_entry(*entry)])
+        return redis.eval(
+            STORE_IF_UNCHANGED, 2, role_map_key(user_id), role_map_build_key(user_id),
+            token, ROLE_MAP_TIMEOUT, *mapping
+        )
+
+    @staticmethod
+    def rebuild(user_id):
+        """Build a user's map from the database and store it, if no write raced the build"""
+        redis = get_redis_connection('default')
+        token = uuid.uuid4().hex
+        try:
+            redis.set(role_map_build_key(user_id), token, ex=ROLE_MAP_BUILD_LEASE)
+        except RedisError:
+            logger.exception('Could not start building the role map of user %s', user_id)
+            return RoleMapService.load_role_maps([user_id])[user_id]
+
+        roles = RoleMapService.load_role_maps([user_id])[user_id]
+        try:
+            RoleMapService.store(redis, user_id, token, roles)
+        except RedisError:
+            logger.exception('Could not store the role map of user %s', user_id)
+        return roles
+
+    @staticmethod
+    def write_membership(membership):
+        """Write a saved membership into its user's map once the transaction commits"""
+        user_id = membership.user_id
+        community_id = membership.community_id
+        entry = encode_entry(membership.role, membership.status)
+
+        def write():
+            try:
+                get_redis_connection('default').eval(
+                    SET_IF_STORED, 2, role_map_key(user_id), role_map_build_key(user_id),
+                    str(community_id), entry
+                )
+            except RedisError:
+                logger.exception('Could not write membership %s:%s to its role map', user_id, community_id)
+        transaction.on_commit(RoleMapWrite(user_id, write))
+
+    @staticmethod
+    def remove_membership(user_id, community_id):
+        """Remove a deleted membership from its user's map once the transaction commits"""
+        def remove():
+            try:
+                get_redis_connection('default').eval(
+                    REMOVE_FIELD, 2, role_map_key(user_id), role_map_build_key(user_id), str(community_id)
+                )
+            except RedisError:
+                logger.exception('Could not remove membership %s:%s from its role map', user_id, community_id)
+        transaction.on_commit(RoleMapWrite(user_id, remove))
+
+    @staticmethod
+    def reconcile(user_ids=None, dry_run=False):
+        """
+        Compare stored maps with the database and rewrite the ones that differ.
+        Without user_ids every stored map is checked.
+        Returns (checked, fixed).
+        """
+        redis = get_redis_connection('default')
+        if user_ids is None:
+            user_ids = (
+                int(key.decode('utf-8').rsplit(':', 1)[1])
+                for key in redis.scan_iter(match=role_map_key('*'), count=ROLE_MAP_RECONCILE_BATCH_SIZE)
+            )
+
+        checked = fixed = 0
+        batch = []
+        for user_id in user_ids:
+            batch.append(user_id)
+            if len(batch) >= ROLE_MAP_RECONCILE_BATCH_SIZE:
+                batch_fixed = RoleMapService.reconcile_batch(redis, batch, dry_run)
+                checked, fixed = checked + len(batch), fixed + batch_fixed
+                batch = []
+        if batch:
+            batch_fixed = RoleMapService.reconcile_batch(redis, batch, dry_run)
+            checked, fixed = checked + len(batch), fixed + batch_fixed
+        return checked, fixed
+
+    @staticmethod
+    def reconcile_batch(redis, user_ids, dry_run):
+        # Mark the builds before reading, so writes committed meanwhile win
+        token = uuid.uuid4().hex
+        pipe = redis.pipeline(transaction=False)
+        for user_id in user_ids:
+            if not dry_run:
+                pipe.set(role_map_build_key(user_id), token, ex=ROLE_MAP_BUILD_LEASE)
+            pipe.hgetall(role_map_key(user_id))
+        results = pipe.execute()
+        stored = dict(zip(user_ids, results if dry_run else results[1::2]))
+        expected = RoleMapService.load_role_maps(user_ids)
+
+        fixed = 0
+        unchanged = []
+        for user_id in user_ids:
+            if stored[user_id] and decode_map(stored[user_id]) == expected[user_id]:
+                unchanged.append(user_id)
+                continue
+            fixed += 1
+            if not dry_run:
+                RoleMapService.store(redis, user_id, token, expected[user_id])
+        if unchanged and not dry_run:
+            redis.delete(*[role_map_build_key(user_id) for user_id in unchanged])
+        return fixed
@@ -0,0 +1,128 @@
+import re
+
+from django.db import connection
+from django.db.models import Case, When, Value, FloatField, F
+from django.db.models.functions import Cast
+from django.contrib.postgres.search import SearchQuery, SearchRank
+
+
+# Text search configuration used by the tsvector trigger and the queries
+SEARCH_CONFIG = 'english'
+
+# Maximum number of terms taken from a search string
+MAX_SEARCH_TERMS = 8
+
+# Weight given to each field (mirrors setweight() in the database trigger)
+FIELD_WEIGHTS = {
+    'name': 'A',
+    'tags': 'B',
+    'description': 'C',
+}
+
+# Postgres' default ts_rank weights for the A, B, C and D labels
+RANK_WEIGHTS = {'A': 1.0, 'B': 0.4, 'C': 0.2, 'D': 0.1}
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    """Split text into lowercase search terms"""
+    return [term.lower() for term in _TERM_RE.findall(text or '')]
+
+
+class CommunitySearchService:
+    """Service class for full-text community search"""
+
+    @staticmethod
+    def get_search_terms(search):
+        """
+        Extract the terms used for a search string.
+        Duplicates are dropped and the number of terms is bounded.
+        """
+        terms = []
+        for term in tokenize(search):
+            if term not in terms:
+                terms.append(term)
+        return terms[:MAX_SEARCH_TERMS]
+
+    @staticmethod
+    def build_search_query(terms):
+        """
+        Build a prefix tsquery that matches every term, e.g. "robo:* & club:*".
+        Prefix matching lets the search work while the user is still typing.
+        """
+        raw_query = ' & '.join(f"{term}:*" for term in terms)
+        return SearchQuery(raw_query, search_type='raw', config=SEARCH_CONFIG)
+
+    @classmethod
+    def search(cls, queryset, search):
+        """
+        Filter a Community queryset by a search string.
+        The result is annotated with `search_rank` and ordered by it.
+        """
+        terms = cls.get_search_terms(search)
+        if not terms:
+            return queryset
+
+        if connection.vendor == 'postgresql':
+            return cls._search_postgres(queryset, terms)
+        return cls._search_python(queryset, terms)
+
+    @classmethod
+    def _search_postgres(cls, queryset, terms):
+        """Use the GIN-indexed search_vector column"""
+        query = cls.build_search_query(terms)
+        # ts_rank() returns a real; casting it to double precision makes the value
+        # round-trip exactly, so it can be compared against in pagination cursors
+        return queryset.filter(
+            search_vector=query
+        ).annotate(
+            search_rank=Cast(SearchRank(F('search_vector'), query), FloatField())
+        ).order_by('-search_rank', '-created_at')
+
+    @classmethod
+    def _search_python(cls, queryset, terms):
+        """
+        Pure-Python fallback for databases without full-text search (e.g. SQLite in tests).
+        Applies the same AND/prefix semantics and field weights as the Postgres path.
+        """
+        rows = queryset.values_list('pk', 'name', 'tags', 'description', 'created_at')
+
+        ranked = []
+        for pk, name, tags, description, created_at in rows:
+            rank = cls.rank_document({'name': name, 'tags': tags, 'description': description}, terms)
+            if rank > 0:
+                ranked.append((rank, created_at, pk))
+
+        ranked.sort(key=lambda item: (item[0], item[1]), reverse=True)
+        if not ranked:
+            return queryset.none()
+
+        return queryset.filter(
+            pk__in=[pk for _, _, pk in ranked]
+        ).annotate(
+            search_rank=Case(
+                *[When(pk=pk, then=Value(rank)) for rank, _, pk in ranked],
+                output_field=FloatField()
+            )
+        ).order_by('-search_rank', '-created_at')
+
+    @staticmethod
+    def rank_document(fields, terms):
+        """
+        Score a document against the search terms.
+        Every term must prefix-match a word in at least one field, otherwise the score is 0.
+        """
+        words = {field: tokenize(value) for field, value in fields.items()}
+
+        rank = 0.0
+        for term in terms:
+            term_rank = 0.0
+            for field, field_words in words.items():
+                matches = sum(1 for word in field_words if word.startswith(term))
+                if matches:
+                    term_rank += RANK_WEIGHTS[FIELD_WEIGHTS[field]] * matches
+            if not term_rank:
+                return 0.0
+            rank += term_rank
+        return rank
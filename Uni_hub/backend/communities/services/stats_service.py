@@ -0,0 +1,347 @@
+import datetime
+from collections import defaultdict
+
+from django.db import connections, transaction
+from django.db.models import Count, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django_redis import get_redis_connection
+from redis.exceptions import ResponseError
+
+from ..models import Community, CommunityDailyStats, Membership, Post, Comment
+from ..utils.counters import counter_buffer_enabled, flush_counter_buffer
+
+
+# Redis hash of the post upvote deltas not yet rolled up, keyed by "<community_id>:<day>"
+UPVOTE_BUFFER_KEY = 'community_stats:upvotes'
+UPVOTE_BUFFER_FLUSHING_KEY = 'community_stats:upvotes:flushing'
+
+# Days recomputed by a periodic run, today included
+ROLLUP_DAYS = 2
+
+# Days recomputed per batch of a backfill
+ROLLUP_CHUNK_DAYS = 31
+
+# Rows written per INSERT statement
+ROLLUP_BATCH_SIZE = 500
+
+# Columns recomputed from the raw tables; votes have no timestamp, so
+# upvotes are only recorded as they are cast
+ROLLUP_FIELDS = ('joins', 'posts', 'comments', 'active_authors')
+
+# Days of daily series in the analytics
+ANALYTICS_DAYS = 14
+
+
+def record_upvotes(community_id, delta):
+    """Buffer a change of today's post upvotes of a community, once the transaction commits"""
+    if not delta:
+        return
+    field = f"{community_id}:{timezone.localdate().isoformat()}"
+    transaction.on_commit(
+        lambda: get_redis_connection('default').hincrby(UPVOTE_BUFFER_KEY, field, delta)
+    )
+
+
+def day_bounds(start, end):
+    """Aware datetimes from the start of the `start` day to the end of the `end` day"""
+    return (
+        timezone.make_aware(datetime.datetime.combine(start, datetime.time.min)),
+        timezone.make_aware(datetime.datetime.combine(end + datetime.timedelta(days=1), datetime.time.min)),
+    )
+
+
+def start_of_day(day):
+    """ISO timestamp of the start of a day, the format the analytics have always used"""
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min)).isoformat()
+
+
+def empty_stats():
+    return dict.fromkeys(ROLLUP_FIELDS, 0)
+
+
+class CommunityStatsService:
+    """
+    Service class for the CommunityDailyStats rollup.
+
+    The rollup_community_stats command runs refresh() periodically: it
+    recomputes the recent days from the raw tables and applies the buffered
+    upvotes. Older days only change when memberships are approved late, which
+    refresh() picks up, or when rows are deleted, which a backfill() fixes.
+    The analytics read the rollup rows instead of scanning the history.
+    """
+
+    @staticmethod
+    def compute_days(start, end, community_ids=None):
+        """Recount the rolled up columns of the days from start to end, as (community_id, day) -> counts"""
+        start_at, end_at = day_bounds(start, end)
+        stats = defaultdict(empty_stats)
+
+        memberships = Membership.objects.filter(status='approved', joined_at__gte=start_at, joined_at__lt=end_at)
+        posts = Post.objects.filter(created_at__gte=start_at, created_at__lt=end_at)
+        comments = Comment.objects.filter(created_at__gte=start_at, created_at__lt=end_at)
+        if community_ids is not None:
+            memberships = memberships.filter(community_id__in=community_ids)
+            posts = posts.filter(community_id__in=community_ids)
+            comments = comments.filter(post__community_id__in=community_ids)
+
+        memberships = memberships.annotate(day=TruncDate('joined_at')).order_by()
+        posts = posts.annotate(day=TruncDate('created_at')).order_by()
+        comments = comments.annotate(day=TruncDate('created_at')).order_by()
+
+        for community_id, day, count in memberships.values('community_id', 'day').annotate(
+            count=Count('id')
+        ).values_list('community_id', 'day', 'count'):
+            stats[(community_id, day)]['joins'] = count
+        for community_id, day, count in posts.values('community_id', 'day').annotate(
+            count=Count('id')
+        ).values_list('community_id', 'day', 'count'):
+            stats[(community_id, day)]['posts'] = count
+        for community_id, day, count in comments.values('post__community_id', 'day').annotate(
+            count=Count('id')
+        ).values_list('post__community_id', 'day', 'count'):
+            stats[(community_id, day)]['comments'] = count
+
+        # Distinct authors over posts and comments together
+        authors = defaultdict(set)
+        for community_id, day, author_id in posts.values_list('community_id', 'day', 'author_id').distinct():
+            authors[(community_id, day)].add(author_id)
+        for community_id, day, author_id in comments.values_list('post__community_id', 'day', 'author_id').distinct():
+            authors[(community_id, day)].add(author_id)
+        for key, author_ids in authors.items():
+            stats[key]['active_authors'] = len(author_ids)
+        return stats
+
+    @staticmethod
+    def rollup(start, end, community_ids=None):
+        """
+        Recompute the rows of the days from start to end with an upsert,
+        keeping their upvotes. Returns the number of rows written.
+        """
+        stats = CommunityStatsService.compute_days(start, end, community_ids)
+
+        # Days whose activity was deleted still need their counts zeroed
+        existing = CommunityDailyStats.objects.filter(day__gte=start, day__lte=end)
+        if community_ids is not None:
+            existing = existing.filter(community_id__in=community_ids)
+        for key in existing.values_list('community_id', 'day'):
+            stats.setdefault(key, empty_stats())
+
+        CommunityDailyStats.objects.bulk_create(
+            [
+                CommunityDailyStats(community_id=community_id, day=day, **counts)
+                for (community_id, day), counts in stats.items()
+            ],
+            batch_size=ROLLUP_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['community', 'day'],
+            update_fields=[*ROLLUP_FIELDS, 'updated_at'],
+        )
+        return len(stats)
+
+    @staticmethod
+    def flush_upvotes():
+        """
+        Add the buffered upvote deltas to the rollup rows with an
+        INSERT ... ON CONFLICT DO UPDATE. The buffer is renamed before it is
+        read, and an interrupted flush is completed by the next call. Only one
+        process should flush at a time.
+
+        As in flush_counter_buffer(), the renamed buffer is deleted inside the
+        transaction that applies it, just before the commit, so its deltas are
+        never added twice. If the flush dies between the delete and the commit
+        they are lost until a backfill seeds the upvotes again.
+        Returns the number of rows updated.
+        """
+        redis = get_redis_connection('default')
+        if not redis.exists(UPVOTE_BUFFER_FLUSHING_KEY):
+            try:
+                redis.rename(UPVOTE_BUFFER_KEY, UPVOTE_BUFFER_FLUSHING_KEY)
+            except ResponseError:
+                # No upvotes were buffered
+                return 0
+
+        deltas = []
+        for member, value in redis.hgetall(UPVOTE_BUFFER_FLUSHING_KEY).items():
+            community_id, day = member.decode('utf-8').split(':')
+            if int(value):
+                deltas.append((int(community_id), datetime.date.fromisoformat(day), int(value)))
+
+        # Communities deleted since the votes were cast have no rows to update
+        community_ids = set(Community.objects.filter(
+            pk__in={community_id for community_id, day, delta in deltas}
+        ).values_list('pk', flat=True))
+        now = timezone.now()
+        params = [
+            (community_id, day, delta, now)
+            for community_id, day, delta in deltas
+            if community_id in community_ids
+        ]
+
+        connection = connections[CommunityDailyStats.objects.db]
+        with transaction.atomic(using=CommunityDailyStats.objects.db):
+            if params:
+                quote_name = connection.ops.quote_name
+                table = quote_name(CommunityDailyStats._meta.db_table)
+                sql = (
+                    f'INSERT INTO {table} (community_id, day, joins, posts, comments, upvotes, active_authors, updated_at) '
+                    f'VALUES (%s, %s, 0, 0, 0, %s, 0, %s) '
+                    f'ON CONFLICT (community_id, day) DO UPDATE SET '
+                    f'upvotes = {table}.upvotes + EXCLUDED.upvotes, updated_at = EXCLUDED.updated_at'
+                )
+                with connection.cursor() as cursor:
+                    cursor.executemany(sql, params)
+            redis.delete(UPVOTE_BUFFER_FLUSHING_KEY)
+        return len(params)
+
+    @staticmethod
+    def seed_upvotes():
+        """
+        Replace the recorded upvotes with the posts' current upvote counters,
+        attributed to the day each post was created. Votes cast before the
+        rollup existed are only known from the counters.
+        """
+        if counter_buffer_enabled():
+            flush_counter_buffer()
+        CommunityStatsService.flush_upvotes()
+
+        rows = Post.objects.annotate(day=TruncDate('created_at')).order_by().values(
+            'community_id', 'day'
+        ).annotate(upvotes=Sum('upvote_count_cache')).values_list('community_id', 'day', 'upvotes')
+
+        with transaction.atomic():
+            CommunityDailyStats.objects.update(upvotes=0)
+            CommunityDailyStats.objects.bulk_create(
+                [
+                    CommunityDailyStats(community_id=community_id, day=day, upvotes=upvotes or 0)
+                    for community_id, day, upvotes in rows
+                ],
+                batch_size=ROLLUP_BATCH_SIZE,
+                update_conflicts=True,
+                unique_fields=['community', 'day'],
+                update_fields=['upvotes', 'updated_at'],
+            )
+
+    @staticmethod
+    def refresh(days=ROLLUP_DAYS):
+        """
+        The periodic run: apply the buffered upvotes, recompute the last
+        `days` days, and the older days of memberships changed since.
+        Returns the number of rows written.
+        """
+        CommunityStatsService.flush_upvotes()
+        end = timezone.localdate()
+        start = end - datetime.timedelta(days=days - 1)
+        written = CommunityStatsService.rollup(start, end)
+
+        start_at = day_bounds(start, end)[0]
+        touched = defaultdict(set)
+        for community_id, day in Membership.objects.filter(
+            updated_at__gte=start_at, joined_at__lt=start_at
+        ).annotate(day=TruncDate('joined_at')).order_by().values_list('community_id', 'day').distinct():
+            touched[day].add(community_id)
+        for day, community_ids in touched.items():
+            written += CommunityStatsService.rollup(day, day, community_ids)
+        return written
+
+    @staticmethod
+    def backfill(chunk_days=ROLLUP_CHUNK_DAYS, progress=None):
+        """
+        Recompute every day since the first community was created, in chunks
+        of `chunk_days` days, then seed the upvotes. `progress` is called with
+        the last day and the rows written so far after each chunk.
+        Returns the number of rows written.
+        """
+        first = Community.objects.aggregate(first=Min('created_at'))['first']
+        written = 0
+        if first is not None:
+            start, today = timezone.localdate(first), timezone.localdate()
+            while start <= today:
+                end = min(start + datetime.timedelta(days=chunk_days - 1), today)
+                written += CommunityStatsService.rollup(start, end)
+                if progress is not None:
+                    progress(end, written)
+                start = end + datetime.timedelta(days=1)
+        CommunityStatsService.seed_upvotes()
+        return written
+
+    @staticmethod
+    def get_analytics(community, days=ANALYTICS_DAYS):
+        """
+        The analytics of a community from its rollup rows: daily series of
+        the last `days` days, monthly series, totals and top contributors.
+        Member and post totals come from the community's counters; the rest
+        is as fresh as the last rollup_community_stats run.
+        """
+        rows = list(community.daily_stats.values_list('day', 'joins', 'posts', 'comments', 'upvotes'))
+        since = timezone.localdate() - datetime.timedelta(days=days)
+
+        monthly_joins = defaultdict(int)
+        monthly_posts = defaultdict(int)
+        daily_growth = []
+        daily_activity = []
+        total_comments = total_upvotes = 0
+        for day, joins, posts, comments, upvotes in rows:
+            month = day.replace(day=1)
+            monthly_joins[month] += joins
+            monthly_posts[month] += posts
+            total_comments += comments
+            total_upvotes += upvotes
+            if day >= since:
+                if joins:
+                    daily_growth.append({'day': start_of_day(day), 'count': joins})
+                if posts:
+                    daily_activity.append({'day': start_of_day(day), 'count': posts})
+
+        total_members = community.member_count_cache
+        total_posts = community.post_count_cache
+        total_upvotes = max(total_upvotes, 0)
+
+        # Top contributors (members with most posts)
+        top_contributors = Post.objects.filter(
+            community=community
+        ).values(
+            'author_id',
+            'author__username',
+            'author__first_name',
+            'author__last_name'
+        ).annotate(
+            post_count=Count('id')
+        ).order_by('-post_count')[:10]
+
+        return {
+            'member_growth': {
+                'daily': daily_growth,
+                'monthly': [
+                    {'month': start_of_day(month), 'count': count}
+                    for month, count in sorted(monthly_joins.items()) if count
+                ],
+            },
+            'post_activity': {
+                'daily': daily_activity,
+                'monthly': [
+                    {'month': start_of_day(month), 'count': count}
+                    for month, count in sorted(monthly_posts.items()) if count
+                ],
+            },
+            'engagement_stats': {
+                'total_members': total_members,
+                'total_posts': total_posts,
+                'total_comments': total_comments,
+                'total_upvotes': total_upvotes,
+                'posts_per_member': round(total_posts / total_members, 2) if total_members > 0 else 0,
+                'comments_per_post': round(total_comments / total_posts, 2) if total_posts > 0 else 0,
+                'upvotes_per_post': round(total_upvotes / total_posts, 2) if total_posts > 0 else 0,
+                'avg_upvotes_per_post': round(total_upvotes / total_posts, 2) if total_posts > 0 else 0,
+                'avg_comments_per_post': round(total_comments / total_posts, 2) if total_posts > 0 else 0,
+            },
+            'top_contributors': [
+                {
+                    'author_id': item['author_id'],
+                    'username': item['author__username'],
+                    'full_name': f"{item['author__first_name']} {item['author__last_name']}".strip(),
+                    'post_count': item['post_count']
+                }
+                for item in top_contributors
+            ],
+        }
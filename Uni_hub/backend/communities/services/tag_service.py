@@ -0,0 +1,131 @@
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils.text import slugify
+
+from ..models import Community, Tag, CommunityTag
+from ..models.tag import parse_tags
+
+
+# Cache key and lifetime of the facet counts
+FACETS_CACHE_KEY = 'community_facets'
+FACETS_CACHE_TIMEOUT = 600
+
+# Maximum number of tags returned by the facet endpoint
+MAX_TAG_FACETS = 50
+
+
+class TagService:
+    """Service class for community tag operations"""
+
+    @staticmethod
+    def normalize_tag_filter(tags):
+        """
+        Normalize `?tag=` values into a list of tag slugs.
+        Accepts a single string, a comma-separated string or a list of either.
+        """
+        if not tags:
+            return []
+        if isinstance(tags, str):
+            tags = [tags]
+
+        slugs = []
+        for value in tags:
+            for name in value.split(','):
+                slug = slugify(name.strip())
+                if slug and slug not in slugs:
+                    slugs.append(slug)
+        return slugs
+
+    @staticmethod
+    def filter_by_tags(queryset, tags, match='all'):
+        """
+        Filter a Community queryset by exact tag match.
+        With match='all' a community must have every tag, with match='any' at least one.
+        """
+        slugs = TagService.normalize_tag_filter(tags)
+        if not slugs:
+            return queryset
+
+        matching = CommunityTag.objects.filter(tag__slug__in=slugs)
+        if match == 'any' or len(slugs) == 1:
+            return queryset.filter(pk__in=matching.values('community_id'))
+
+        matching_all = matching.values('community_id').annotate(
+            matched=Count('tag_id')
+        ).filter(matched=len(slugs)).values('community_id')
+        return queryset.filter(pk__in=matching_all)
+
+    @staticmethod
+    def sync_community_tags(community):
+        """
+        Bring the community's CommunityTag rows in line with its `tags` string.
+        Returns True if any tag was added or removed.
+        """
+        wanted = parse_tags(community.tags)
+        current = dict(
+            CommunityTag.objects.filter(community=community).values_list('tag__slug', 'tag_id')
+        )
+
+        removed = [tag_id for slug, tag_id in current.items() if slug not in wanted]
+        added = [slug for slug in wanted if slug not in current]
+
+        if removed:
+            CommunityTag.objects.filter(community=community, tag_id__in=removed).delete()
+
+        if added:
+            Tag.objects.bulk_create(
+                [Tag(slug=slug, name=wanted[slug]) for slug in added],
+                ignore_conflicts=True
+            )
+            CommunityTag.objects.bulk_create(
+                [
+                    CommunityTag(community=community, tag_id=tag_id)
+                    for tag_id in Tag.objects.filter(slug__in=added).values_list('id', flat=True)
+                ],
+                ignore_conflicts=True
+            )
+
+        return bool(removed or added)
+
+    @staticmethod
+    def get_facets():
+        """
+        Get per-tag and per-category counts of public communities.
+        The result is cached until a community's tags or category change.
+        """
+        facets = cache.get(FACETS_CACHE_KEY)
+        if facets is not None:
+            return facets
+
+        tag_counts = CommunityTag.objects.filter(
+            community__is_private=False
+        ).values(
+            'tag__slug', 'tag__name'
+        ).annotate(
+            count=Count('community_id')
+        ).order_by('-count', 'tag__slug')[:MAX_TAG_FACETS]
+
+        category_counts = dict(
+            Community.objects.filter(
+                is_private=False
+            ).values_list('category').annotate(count=Count('id')).order_by()
+        )
+
+        facets = {
+            'tags': [
+                {'slug': item['tag__slug'], 'name': item['tag__name'], 'count': item['count']}
+                for item in tag_counts
+            ],
+            'categories': [
+                {'category': value, 'label': label, 'count': category_counts[value]}
+                for value, label in Community.CATEGORY_CHOICES
+                if category_counts.get(value)
+            ],
+        }
+        cache.set(FACETS_CACHE_KEY, facets, FACETS_CACHE_TIMEOUT)
+        return facets
+
+    @staticmethod
+    def invalidate_facets():
+        """Drop the cached facet counts"""
+        cache.delete(FACETS_CACHE_KEY)
@@ -1,36 +1,120 @@
 from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.dispatch import receiver
-from django.db import models
+from django.db import models, transaction
 from django.db.models import Count
 from django.core.mail import send_mail
 from django.conf import settings
 
 from .models import Community, Membership, Post, Comment
+from .services.community_service import CommunityService
+from .services.counter_service import CounterService
+from .services.feed_service import FeedService
+from .services.role_map_service import RoleMapService
+from .services.stats_service import record_upvotes
+from .services.tag_service import TagService
+from .utils.cache import bump_cache_version
+from .utils.counters import adjust_counter
+from .utils.etags import community_version, post_version, membership_version
+from .utils.memberships import forget_membership
 
 
+@receiver(post_save, sender=Community)
+def sync_community_tags(sender, instance, raw=False, **kwargs):
+    """Keep the normalized tag rows in sync with the community's tag string"""
+    if raw:
+        return
+    stored = getattr(instance, '_stored_facets', {})
+    changed = {
+        field for field in Community.FACET_FIELDS
+        if field not in stored or stored[field] != getattr(instance, field)
+    }
+    instance._stored_facets = {field: getattr(instance, field) for field in Community.FACET_FIELDS}
+    if 'tags' in changed:
+        TagService.sync_community_tags(instance)
+    # Category and privacy changes also affect the facet counts
+    if changed:
+        TagService.invalidate_facets()
+
+
+@receiver(post_delete, sender=Community)
+def invalidate_community_facets(sender, instance, **kwargs):
+    """Drop cached facet counts when a community is deleted"""
+    TagService.invalidate_facets()
+
+
+@receiver(post_save, sender=Community)
+@receiver(post_delete, sender=Community)
 @receiver(post_save, sender=Membership)
 @receiver(post_delete, sender=Membership)
-def update_community_member_count(sender, instance, **kwargs):
-    """Update the member count cache when a membership is created, updated or deleted"""
-    community = instance.community
-    # Use update to avoid triggering other signals
-    Community.objects.filter(id=community.id).update(
-        member_count_cache=Membership.objects.filter(
-            community=community,
-            status='approved'
-        ).count()
-    )
+def invalidate_community_lists(sender, instance, raw=False, **kwargs):
+    """Invalidate cached community listings when a community or membership changes"""
+    if raw:
+        return
+    CommunityService.invalidate_community_lists()
+
+
+@receiver(post_save, sender=Membership)
+def update_community_member_count(sender, instance, created, raw=False, **kwargs):
+    """
+    Adjust the member count cache when a membership becomes or stops being
+    approved. Membership.save() reads the stored status under a row lock.
+    """
+    if raw:
+        return
+    was_approved = not created and getattr(instance, '_stored_status', None) == 'approved'
+    is_approved = instance.status == 'approved'
+    instance._stored_status = instance.status
+    # Read by the receivers registered after this one, such as update_member_feed
+    instance._approval_changed = is_approved != was_approved
+    if is_approved != was_approved:
+        adjust_counter(Community, instance.community_id, 'member_count_cache', 1 if is_approved else -1)
+
+
+@receiver(post_delete, sender=Membership)
+def decrement_community_member_count(sender, instance, **kwargs):
+    """Decrement the member count cache when an approved membership is deleted"""
+    if getattr(instance, '_stored_status', instance.status) == 'approved':
+        adjust_counter(Community, instance.community_id, 'member_count_cache', -1)
+
+
+@receiver(post_save, sender=Post)
+def increment_community_post_count(sender, instance, created, raw=False, **kwargs):
+    """Increment the post count cache when a post is created"""
+    if created and not raw:
+        adjust_counter(Community, instance.community_id, 'post_count_cache', 1)
+
+
+@receiver(post_delete, sender=Post)
+def decrement_community_post_count(sender, instance, **kwargs):
+    """Decrement the post count cache when a post is deleted"""
+    adjust_counter(Community, instance.community_id, 'post_count_cache', -1)
 
 
 @receiver(post_save, sender=Comment)
+def increment_post_comment_count(sender, instance, created, raw=False, **kwargs):
+    """Increment the comment count cache when a comment is created"""
+    if created and not raw:
+        adjust_counter(Post, instance.post_id, 'comment_count_cache', 1)
+
+
 @receiver(post_delete, sender=Comment)
-def update_post_comment_count(sender, instance, **kwargs):
-    """Update the comment count cache when a comment is created, updated or deleted"""
-    post = instance.post
-    # Use update to avoid triggering other signals
-    Post.objects.filter(id=post.id).update(
-        comment_count_cache=Comment.objects.filter(post=post).count()
-    )
+def decrement_post_comment_count(sender, instance, **kwargs):
+    """Decrement the comment count cache when a comment is deleted"""
+    adjust_counter(Post, instance.post_id, 'comment_count_cache', -1)
+
+
+@receiver(post_save, sender=Comment)
+def increment_parent_reply_count(sender, instance, created, raw=False, **kwargs):
+    """Increment the reply count cache of the parent when a reply is created"""
+    if created and not raw and instance.parent_id:
+        adjust_counter(Comment, instance.parent_id, 'reply_count_cache', 1)
+
+
+@receiver(post_delete, sender=Comment)
+def decrement_parent_reply_count(sender, instance, **kwargs):
+    """Decrement the reply count cache of the parent when a reply is deleted"""
+    if instance.parent_id:
+        adjust_counter(Comment, instance.parent_id, 'reply_count_cache', -1)
 
 
 @receiver(m2m_changed, sender=Post.upvotes.through)
@@ -43,6 +127,18 @@ def update_post_upvote_count(sender, instance, action, **kwargs):
         )
 
 
+@receiver(m2m_changed, sender=Post.upvotes.through)
+def record_post_upvotes(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Buffer the upvotes added or removed with post.upvotes.add() and remove()
+    for the daily stats. toggle_post_upvote() writes the through table
+    directly and records its vote itself.
+    """
+    if reverse or action not in ('post_add', 'post_remove'):
+        return
+    record_upvotes(instance.community_id, len(pk_set) if action == 'post_add' else -len(pk_set))
+
+
 @receiver(m2m_changed, sender=Comment.upvotes.through)
 def update_comment_upvote_count(sender, instance, action, **kwargs):
     """Update the upvote count cache when the comment upvotes M2M is changed"""
@@ -53,6 +149,137 @@ def update_comment_upvote_count(sender, instance, action, **kwargs):
         )
 
 
+@receiver(post_save, sender=Membership)
+@receiver(post_delete, sender=Membership)
+def forget_resolved_membership(sender, instance, raw=False, **kwargs):
+    """Drop a changed membership from the current request's membership resolver"""
+    if raw:
+        return
+    forget_membership(instance.user_id, instance.community_id)
+
+
+@receiver(post_save, sender=Membership)
+def write_role_map(sender, instance, raw=False, **kwargs):
+    """Write a saved membership through to its user's role map"""
+    if raw:
+        return
+    RoleMapService.write_membership(instance)
+
+
+@receiver(post_delete, sender=Membership)
+def remove_from_role_map(sender, instance, **kwargs):
+    """Remove a deleted membership from its user's role map"""
+    RoleMapService.remove_membership(instance.user_id, instance.community_id)
+
+
+@receiver(post_save, sender=Membership)
+@receiver(post_delete, sender=Membership)
+def bump_membership_versions(sender, instance, raw=False, **kwargs):
+    """Invalidate the detail validators that depend on a membership"""
+    if raw:
+        return
+    bump_cache_version(community_version(instance.community_id))
+    bump_cache_version(membership_version(instance.user_id))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def bump_post_community_version(sender, instance, raw=False, **kwargs):
+    """Invalidate the community detail validator, which covers its recent posts"""
+    if raw:
+        return
+    bump_cache_version(community_version(instance.community_id))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def bump_comment_post_version(sender, instance, raw=False, **kwargs):
+    """
+    Invalidate the post detail validator, which covers its comments, and the
+    community detail validator, which covers its recent posts' comment counts
+    """
+    if raw:
+        return
+    bump_cache_version(post_version(instance.post_id))
+    bump_cache_version(community_version(instance.post.community_id))
+
+
+@receiver(m2m_changed, sender=Post.upvotes.through)
+@receiver(m2m_changed, sender=Post.event_participants.through)
+def bump_post_relation_versions(sender, instance, action, reverse, pk_set, **kwargs):
+    """Invalidate post and community detail validators when upvotes or event participants change"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        posts = [(instance.pk, instance.community_id)]
+    elif pk_set:
+        posts = Post.objects.filter(pk__in=pk_set).values_list('pk', 'community_id')
+    else:
+        return
+    for post_id, community_id in posts:
+        bump_cache_version(post_version(post_id))
+        bump_cache_version(community_version(community_id))
+
+
+@receiver(m2m_changed, sender=Comment.upvotes.through)
+def bump_comment_upvote_version(sender, instance, action, reverse, pk_set, **kwargs):
+    """Invalidate the post detail validator when a comment's upvotes change"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        post_ids = [instance.post_id]
+    elif pk_set:
+        post_ids = set(Comment.objects.filter(pk__in=pk_set).values_list('post_id', flat=True))
+    else:
+        return
+    for post_id in post_ids:
+        bump_cache_version(post_version(post_id))
+
+
+def fan_out_committed_post(post):
+    if FeedService.is_fanned_out(post.community_id):
+        FeedService.add_post(post)
+
+
+def remove_committed_post(post):
+    if FeedService.is_fanned_out(post.community_id):
+        FeedService.remove_post(post)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, raw=False, **kwargs):
+    """Push a new post onto the feeds of its community's members once it is committed"""
+    if created and not raw:
+        transaction.on_commit(lambda: fan_out_committed_post(instance))
+
+
+@receiver(post_delete, sender=Post)
+def remove_post_from_feeds(sender, instance, **kwargs):
+    """Remove a deleted post from the feeds it was pushed to once the delete is committed"""
+    transaction.on_commit(lambda: remove_committed_post(instance))
+
+
+@receiver(post_save, sender=Membership)
+def update_member_feed(sender, instance, raw=False, **kwargs):
+    """Add or remove a community's posts in a member's feed when their membership is approved or revoked"""
+    if raw or not getattr(instance, '_approval_changed', True):
+        return
+    user_id, community_id = instance.user_id, instance.community_id
+    if instance.status == 'approved':
+        transaction.on_commit(lambda: FeedService.add_community(user_id, community_id))
+    else:
+        transaction.on_commit(lambda: FeedService.remove_community(user_id, community_id))
+
+
+@receiver(post_delete, sender=Membership)
+def remove_member_feed(sender, instance, **kwargs):
+    """Remove a community's posts from the feed of a member who left"""
+    if getattr(instance, '_stored_status', instance.status) != 'approved':
+        return
+    user_id, community_id = instance.user_id, instance.community_id
+    transaction.on_commit(lambda: FeedService.remove_community(user_id, community_id))
+
+
 @receiver(m2m_changed, sender=Post.event_participants.through)
 def send_event_join_confirmation_email(sender, instance, action, pk_set, **kwargs):
     """
@@ -125,28 +352,4 @@ UniHub Team
 # Batch update function for maintenance or migrations
 def update_all_cache_counts():
     """Update all cache counters in the database"""
-    
-    # Update community member counts
-    communities = Community.objects.all()
-    for community in communities:
-        Community.objects.filter(id=community.id).update(
-            member_count_cache=Membership.objects.filter(
-                community=community,
-                status='approved'
-            ).count()
-        )
-    
-    # Update post comment counts
-    posts = Post.objects.all()
-    for post in posts:
-        Post.objects.filter(id=post.id).update(
-            comment_count_cache=Comment.objects.filter(post=post).count(),
-            upvote_count_cache=post.upvotes.count()
-        )
-    
-    # Update comment upvote counts
-    comments = Comment.objects.all()
-    for comment in comments:
-        Comment.objects.filter(id=comment.id).update(
-            upvote_count_cache=comment.upvotes.count()
-        )
\ No newline at end of file
+    return CounterService.reconcile_all()
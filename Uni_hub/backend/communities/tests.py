@@ -1,10 +1,16 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext
+from unittest import mock
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase, APIClient
 
-from .models import Community, Membership, Post, Comment
+from .models import Community, Membership, Post, Comment, Tag
+from .services.community_service import COMMUNITY_LIST_VERSION, CommunityService
+from .utils.cache import get_cache_version
 
 
 User = get_user_model()
@@ -344,3 +350,1806 @@ class CommentTests(APITestCase):
         self.assertEqual(Comment.objects.count(), 2)
         self.assertEqual(self.comment.replies.count(), 1)
         self.assertEqual(self.comment.replies.first().content, 'This is a reply to the test comment')
+
+
+class CommunitySearchTests(APITestCase):
+    """Test full-text community search"""
+    
+    def setUp(self):
+        cache.clear()
+        
+        self.user = User.objects.create_user(
+            email='search@example.com',
+            username='searchuser',
+            first_name='Search',
+            last_name='User',
+            password='testpass123'
+        )
+        
+        # Same term in different fields to check the weighting
+        self.by_description = Community.objects.create(
+            name='Makers Guild',
+            description='We build robotics kits on weekends',
+            creator=self.user
+        )
+        self.by_tags = Community.objects.create(
+            name='Engineering Society',
+            description='Engineering students',
+            tags='robotics,hardware',
+            creator=self.user
+        )
+        self.by_name = Community.objects.create(
+            name='Robotics Club',
+            description='A club for students',
+            creator=self.user
+        )
+        Community.objects.create(
+            name='Chess Club',
+            description='Play chess with us',
+            creator=self.user
+        )
+        
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('communities:community-list')
+    
+    def test_search_ranks_name_over_tags_over_description(self):
+        """Search results are ordered by field weight"""
+        response = self.client.get(self.url, {'search': 'robotics'})
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        names = [item['name'] for item in response.data['results']]
+        self.assertEqual(names, ['Robotics Club', 'Engineering Society', 'Makers Guild'])
+    
+    def test_search_prefix_and_all_terms(self):
+        """Partial terms match as prefixes and every term must match"""
+        response = self.client.get(self.url, {'search': 'robo clu'})
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        names = [item['name'] for item in response.data['results']]
+        self.assertEqual(names, ['Robotics Club'])
+
+
+class CommunityTagTests(APITestCase):
+    """Test normalized tag filtering and facets"""
+    
+    def setUp(self):
+        cache.clear()
+        
+        self.user = User.objects.create_user(
+            email='tags@example.com',
+            username='taguser',
+            first_name='Tag',
+            last_name='User',
+            password='testpass123'
+        )
+        self.ai = Community.objects.create(
+            name='AI Society',
+            description='Machine learning and AI',
+            category='technology',
+            tags='AI, Machine Learning',
+            creator=self.user
+        )
+        self.design = Community.objects.create(
+            name='Design Club',
+            description='Chairs, tables and more',
+            category='arts',
+            tags='chair,design',
+            creator=self.user
+        )
+        self.robotics = Community.objects.create(
+            name='Robotics',
+            description='Robots',
+            category='technology',
+            tags='ai,robotics',
+            creator=self.user
+        )
+        
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('communities:community-list')
+    
+    def test_tags_are_normalized(self):
+        """Tag strings are split into normalized Tag rows"""
+        self.assertEqual(
+            sorted(self.ai.normalized_tags.values_list('slug', flat=True)),
+            ['ai', 'machine-learning']
+        )
+        self.assertEqual(Tag.objects.filter(slug='ai').count(), 1)
+    
+    def test_tag_filter_is_exact(self):
+        """Filtering by "ai" does not match "chair" """
+        response = self.client.get(self.url, {'tag': 'ai'})
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        names = {item['name'] for item in response.data['results']}
+        self.assertEqual(names, {'AI Society', 'Robotics'})
+    
+    def test_filter_by_several_tags(self):
+        """Several tags match all of them by default, or any with tag_match=any"""
+        response = self.client.get(self.url, {'tag': 'ai,robotics'})
+        self.assertEqual([item['name'] for item in response.data['results']], ['Robotics'])
+        
+        response = self.client.get(self.url, {'tag': ['robotics', 'design'], 'tag_match': 'any'})
+        names = {item['name'] for item in response.data['results']}
+        self.assertEqual(names, {'Robotics', 'Design Club'})
+    
+    def test_facets_are_invalidated_on_tag_change(self):
+        """Facet counts reflect tag changes"""
+        url = reverse('communities:community-facets')
+        response = self.client.get(url)
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        tag_counts = {item['slug']: item['count'] for item in response.data['tags']}
+        category_counts = {item['category']: item['count'] for item in response.data['categories']}
+        self.assertEqual(tag_counts['ai'], 2)
+        self.assertEqual(category_counts, {'technology': 2, 'arts': 1})
+        
+        self.design.tags = 'design,ai'
+        self.design.save()
+        
+        response = self.client.get(url)
+        tag_counts = {item['slug']: item['count'] for item in response.data['tags']}
+        self.assertEqual(tag_counts['ai'], 3)
+        self.assertNotIn('chair', tag_counts)
+    
+    def test_saves_without_tag_changes_skip_the_sync(self):
+        """Saving other fields neither re-syncs the tags nor drops the facets"""
+        from .services.tag_service import TagService
+        
+        self.client.get(reverse('communities:community-facets'))
+        community = Community.objects.get(pk=self.ai.pk)
+        community.description = 'Deep learning'
+        with mock.patch.object(TagService, 'sync_community_tags') as sync, \
+                mock.patch.object(TagService, 'invalidate_facets') as invalidate:
+            community.save()
+        sync.assert_not_called()
+        invalidate.assert_not_called()
+        
+        community.category = 'academic'
+        with mock.patch.object(TagService, 'sync_community_tags') as sync, \
+                mock.patch.object(TagService, 'invalidate_facets') as invalidate:
+            community.save()
+        sync.assert_not_called()
+        invalidate.assert_called_once()
+
+
+class CommunityListQueryCountTests(APITestCase):
+    """Test that the community list does not issue queries per community"""
+    
+    # Queries for one page on a cold cache: the ordered community ids,
+    # the page's community cards (with creator) and the user's memberships
+    LIST_QUERY_COUNT = 3
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='lister@example.com',
+            username='lister',
+            first_name='List',
+            last_name='User',
+            password='testpass123'
+        )
+        self.owner = User.objects.create_user(
+            email='owner@example.com',
+            username='owner',
+            first_name='Owner',
+            last_name='User',
+            password='testpass123'
+        )
+        
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('communities:community-list')
+    
+    def create_communities(self, count):
+        start = Community.objects.count()
+        for index in range(start, start + count):
+            community = Community.objects.create(
+                name=f'Community {index}',
+                description='A test community',
+                creator=self.owner
+            )
+            Membership.objects.create(user=self.owner, community=community, role='admin', status='approved')
+            Membership.objects.create(user=self.user, community=community, role='member', status='approved')
+            Post.objects.create(title='Post', content='Content', community=community, author=self.owner)
+    
+    def assert_list_query_count(self, expected_results):
+        cache.clear()
+        with self.assertNumQueries(self.LIST_QUERY_COUNT):
+            response = self.client.get(self.url)
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), expected_results)
+        return response
+    
+    def test_query_count_does_not_grow_with_page_size(self):
+        """Listing 2 or 20 communities costs the same number of queries"""
+        self.create_communities(2)
+        self.assert_list_query_count(2)
+        
+        self.create_communities(18)
+        response = self.assert_list_query_count(20)
+        
+        item = response.data['results'][0]
+        self.assertTrue(item['is_member'])
+        self.assertEqual(item['membership_status'], 'approved')
+        self.assertEqual(item['membership_role'], 'member')
+        self.assertEqual(item['post_count'], 1)
+    
+    def test_detail_loads_admins(self):
+        """The detail page lists the admins from its own prefetch"""
+        self.create_communities(1)
+        community = Community.objects.get()
+        
+        response = self.client.get(reverse('communities:community-detail', kwargs={'slug': community.slug}))
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([admin['username'] for admin in response.data['admins']], ['owner'])
+        self.assertEqual(response.data['member_count'], 2)
+
+
+class CommunityListCacheTests(APITestCase):
+    """Test the versioned id-list cache of the community list"""
+    
+    def setUp(self):
+        cache.clear()
+        
+        self.user = User.objects.create_user(
+            email='cached@example.com',
+            username='cached',
+            first_name='Cach',
+            last_name='Ed',
+            password='testpass123'
+        )
+        for index in range(25):
+            Community.objects.create(name=f'Community {index}', description='Club', creator=self.user)
+        
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('communities:community-list')
+    
+    def test_cache_stores_ids_and_hydrates_one_page(self):
+        """Warm requests skip the id query and only load the requested page"""
+        self.client.get(self.url)
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'page': 2})
+        
+        self.assertEqual(response.data['count'], 25)
+        self.assertEqual(len(response.data['results']), 5)
+        community_queries = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('SELECT') and 'FROM "communities_community"' in query['sql']
+        ]
+        # Only the in_bulk() hydration of the page, no id query
+        self.assertEqual(len(community_queries), 1)
+        self.assertIn('IN (', community_queries[0])
+    
+    def test_changes_invalidate_the_list(self):
+        """Creating a community or membership bumps the list version"""
+        self.assertEqual(self.client.get(self.url).data['count'], 25)
+        
+        Community.objects.create(name='Newest', description='Club', creator=self.user)
+        response = self.client.get(self.url)
+        
+        self.assertEqual(response.data['count'], 26)
+        self.assertEqual(response.data['results'][0]['name'], 'Newest')
+        
+        version = get_cache_version(COMMUNITY_LIST_VERSION)
+        Membership.objects.create(
+            user=self.user, community=Community.objects.get(name='Newest'), role='admin', status='approved'
+        )
+        self.assertGreater(get_cache_version(COMMUNITY_LIST_VERSION), version)
+
+
+class CommunityPostCountTests(APITestCase):
+    """Test the denormalized community post counter"""
+    
+    def setUp(self):
+        cache.clear()
+        
+        self.user = User.objects.create_user(
+            email='poster@example.com',
+            username='poster',
+            first_name='Post',
+            last_name='Er',
+            password='testpass123'
+        )
+        self.quiet = Community.objects.create(name='Quiet', description='Few posts', creator=self.user)
+        self.busy = Community.objects.create(name='Busy', description='Many posts', creator=self.user)
+        
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+    
+    def test_post_count_is_maintained_and_orderable(self):
+        """Creating and deleting posts updates the counter used for ordering"""
+        posts = [
+            Post.objects.create(title=f'Post {index}', content='Content', community=self.busy, author=self.user)
+            for index in range(3)
+        ]
+        Post.objects.create(title='Only post', content='Content', community=self.quiet, author=self.user)
+        posts[0].delete()
+        
+        self.busy.refresh_from_db()
+        self.quiet.refresh_from_db()
+        self.assertEqual(self.busy.post_count_cache, 2)
+        self.assertEqual(self.quiet.post_count_cache, 1)
+        
+        response = self.client.get(reverse('communities:community-list'), {'order_by': 'post_count'})
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(item['name'], item['post_count']) for item in response.data['results']],
+            [('Busy', 2), ('Quiet', 1)]
+        )
+
+
+class CursorPaginationTests(APITestCase):
+    """Test the opt-in keyset pagination of list endpoints"""
+    
+    def setUp(self):
+        cache.clear()
+        
+        self.user = User.objects.create_user(
+            email='scroller@example.com',
+            username='scroller',
+            first_name='Scroll',
+            last_name='Er',
+            password='testpass123'
+        )
+        self.community = Community.objects.create(name='Scrolling', description='Lots of posts', creator=self.user)
+        Membership.objects.create(user=self.user, community=self.community, role='admin', status='approved')
+        
+        self.posts = [
+            Post.objects.create(title=f'Post {index}', content='Content', community=self.community, author=self.user)
+            for index in range(7)
+        ]
+        # Pin one post and give three posts the same timestamp to exercise the tiebreaker
+        Post.objects.filter(pk=self.posts[1].pk).update(is_pinned=True)
+        Post.objects.filter(pk__in=[post.pk for post in self.posts[3:6]]).update(
+            created_at=self.posts[3].created_at
+        )
+        
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+    
+    def walk(self, url, params):
+        """Follow `next` links from the first page, returning the pages"""
+        pages = [self.client.get(url, params)]
+        while pages[-1].data['next']:
+            pages.append(self.client.get(pages[-1].data['next']))
+        return pages
+    
+    def test_posts_pages_follow_list_ordering(self):
+        """Cursor pages cover every post once, in the same order as the regular listing"""
+        url = reverse('communities:community-posts-list', kwargs={'community_slug': self.community.slug})
+        expected = [
+            post.pk for post in Post.objects.filter(community=self.community).order_by('-is_pinned', '-created_at', '-pk')
+        ]
+        
+        pages = self.walk(url, {'pagination': 'cursor', 'page_size': 2})
+        
+        for page in pages:
+            self.assertEqual(page.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', page.data)
+        self.assertEqual([len(page.data['results']) for page in pages], [2, 2, 2, 1])
+        self.assertEqual([item['id'] for page in pages for item in page.data['results']], expected)
+        self.assertEqual(expected[0], self.posts[1].pk)
+        
+        # Going back from the last page returns the page before it
+        previous = self.client.get(pages[-1].data['previous'])
+        self.assertEqual(previous.data['results'], pages[-2].data['results'])
+    
+    def test_communities_cursor_with_ordering(self):
+        """Communities can be paged by cursor under a non-default ordering"""
+        for name in ['Delta', 'Alpha', 'Echo', 'Charlie', 'Bravo']:
+            Community.objects.create(name=name, description='Club', creator=self.user)
+        url = reverse('communities:community-list')
+        
+        pages = self.walk(url, {'pagination': 'cursor', 'page_size': 2, 'order_by': 'name'})
+        
+        self.assertEqual(
+            [item['name'] for page in pages for item in page.data['results']],
+            ['Alpha', 'Bravo', 'Charlie', 'Delta', 'Echo', 'Scrolling']
+        )
+    
+    def test_search_results_cursor(self):
+        """Relevance-ordered search results can be paged by cursor"""
+        Community.objects.create(name='Robotics', description='Robots', creator=self.user)
+        Community.objects.create(name='Makers', description='Robotics and electronics', creator=self.user)
+        Community.objects.create(name='Robot Wars', description='Robot fights', creator=self.user)
+        url = reverse('communities:community-list')
+        
+        first_page = self.client.get(url, {'search': 'robot'})
+        pages = self.walk(url, {'search': 'robot', 'pagination': 'cursor', 'page_size': 1})
+        
+        self.assertEqual(
+            [item['name'] for page in pages for item in page.data['results']],
+            [item['name'] for item in first_page.data['results']]
+        )
+        self.assertEqual(len(pages), 3)
+    
+    def test_page_numbers_remain_the_default(self):
+        """Without opting in the response keeps its page-number shape"""
+        url = reverse('communities:community-posts-list', kwargs={'community_slug': self.community.slug})
+        
+        response = self.client.get(url)
+        
+        self.assertEqual(response.data['count'], 7)
+    
+    def test_invalid_cursor(self):
+        """Malformed cursors are rejected"""
+        url = reverse('communities:community-posts-list', kwargs={'community_slug': self.community.slug})
+        
+        response = self.client.get(url, {'cursor': 'not-a-cursor'})
+        
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ConditionalGetTests(APITestCase):
+    """Test ETag validation of community and post detail responses"""
+    
+    def setUp(self):
+        cache.clear()
+        
+        self.user = User.objects.create_user(
+            email='poller@example.com',
+            username='poller',
+            first_name='Pol',
+            last_name='Ler',
+            password='testpass123'
+        )
+        self.other = User.objects.create_user(
+            email='other@example.com',
+            username='other',
+            first_name='Oth',
+            last_name='Er',
+            password='testpass123'
+        )
+        self.community = Community.objects.create(name='Polled', description='Polled often', creator=self.user)
+        Membership.objects.create(user=self.user, community=self.community, role='admin', status='approved')
+        self.post = Post.objects.create(title='Polled post', content='Content', community=self.community, author=self.user)
+        
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.community_url = reverse('communities:community-detail', kwargs={'slug': self.community.slug})
+        self.post_url = reverse(
+            'communities:community-posts-detail',
+            kwargs={'community_slug': self.community.slug, 'pk': self.post.pk}
+        )
+    
+    def test_community_not_modified_until_posts_or_memberships_change(self):
+        """A matching If-None-Match skips the serializer, changes produce a new ETag"""
+        response = self.client.get(self.community_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.community_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(len(queries.captured_queries), 1)
+        
+        Post.objects.create(title='New post', content='Content', community=self.community, author=self.user)
+        response = self.client.get(self.community_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        
+        Membership.objects.create(user=self.other, community=self.community, role='member', status='approved')
+        response = self.client.get(self.community_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['member_count'], 2)
+    
+    def test_community_not_modified_until_comments_change(self):
+        """The community validator follows the comment counts of its recent posts"""
+        etag = self.client.get(self.community_url)['ETag']
+        
+        comment = Comment.objects.create(post=self.post, author=self.user, content='First!')
+        response = self.client.get(self.community_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['recent_posts'][0]['comment_count'], 1)
+        etag = response['ETag']
+        
+        comment.delete()
+        response = self.client.get(self.community_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['recent_posts'][0]['comment_count'], 0)
+    
+    def test_post_not_modified_until_comments_or_upvotes_change(self):
+        """Post validators follow comments and upvotes"""
+        etag = self.client.get(self.post_url)['ETag']
+        self.assertEqual(self.client.get(self.post_url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        
+        Comment.objects.create(post=self.post, author=self.user, content='First!')
+        response = self.client.get(self.post_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        
+        self.post.upvotes.add(self.other)
+        self.assertEqual(self.client.get(self.post_url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+    
+    def test_validators_are_per_user(self):
+        """Another user's ETag does not match"""
+        etag = self.client.get(self.community_url)['ETag']
+        
+        self.client.force_authenticate(user=self.other)
+        response = self.client.get(self.community_url, HTTP_IF_NONE_MATCH=etag)
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+
+class FeedTests(APITestCase):
+    """Test the personalized home feed"""
+    
+    def setUp(self):
+        cache.clear()
+        
+        self.user = User.objects.create_user(
+            email='reader@example.com',
+            username='reader',
+            first_name='Rea',
+            last_name='Der',
+            password='testpass123'
+        )
+        self.author = User.objects.create_user(
+            email='writer@example.com',
+            username='writer',
+            first_name='Wri',
+            last_name='Ter',
+            password='testpass123'
+        )
+        self.joined = Community.objects.create(name='Joined', description='Joined', creator=self.author)
+        self.other = Community.objects.create(name='Other', description='Not joined', creator=self.author)
+        for community in (self.joined, self.other):
+            Membership.objects.create(user=self.author, community=community, role='admin', status='approved')
+        Membership.objects.create(user=self.user, community=self.joined, role='member', status='approved')
+        
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('communities:feed')
+    
+    def create_post(self, community, title, **kwargs):
+        return Post.objects.create(title=title, content='Content', community=community, author=self.author, **kwargs)
+    
+    def get_titles(self, url=None, **params):
+        response = self.client.get(url or self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [post['title'] for post in response.data['results']], response.data['next']
+    
+    def test_feed_lists_joined_communities_newest_first(self):
+        """Posts of joined communities only, pinned first, then paged by cursor"""
+        for index in range(3):
+            self.create_post(self.joined, f'Post {index}')
+        self.create_post(self.joined, 'Pinned', is_pinned=True)
+        self.create_post(self.other, 'Elsewhere')
+        
+        titles, next_url = self.get_titles(page_size=2)
+        self.assertEqual(titles, ['Pinned', 'Post 2', 'Post 1'])
+        
+        titles, next_url = self.get_titles(next_url)
+        self.assertEqual(titles, ['Post 0'])
+        self.assertIsNone(next_url)
+    
+    def test_new_posts_are_fanned_out_to_stored_feeds(self):
+        """Posts created after the feed was built appear without a rebuild"""
+        self.create_post(self.joined, 'Old')
+        self.get_titles()
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_post(self.joined, 'New')
+        
+        titles, _ = self.get_titles()
+        self.assertEqual(titles, ['New', 'Old'])
+    
+    def test_feed_reflects_deletes_pins_and_membership_changes(self):
+        """Deleted, pinned and left posts leave the stream, joined ones enter it"""
+        kept = self.create_post(self.joined, 'Kept')
+        deleted = self.create_post(self.joined, 'Deleted')
+        self.create_post(self.other, 'Joined later')
+        self.get_titles()
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            deleted.delete()
+            kept.is_pinned = True
+            kept.save()
+        titles, _ = self.get_titles()
+        self.assertEqual(titles, ['Kept'])
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            Membership.objects.create(user=self.user, community=self.other, role='member', status='approved')
+        titles, _ = self.get_titles()
+        self.assertEqual(titles, ['Kept', 'Joined later'])
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            Membership.objects.filter(user=self.user, community=self.joined).delete()
+        titles, _ = self.get_titles()
+        self.assertEqual(titles, ['Joined later'])
+    
+    def test_large_communities_are_merged_on_read(self):
+        """Communities above the fan-out limit are read from the database"""
+        self.create_post(self.joined, 'Stored')
+        with mock.patch('communities.services.feed_service.FEED_FANOUT_LIMIT', 2):
+            third = User.objects.create_user(
+                email='third@example.com',
+                username='third',
+                first_name='Thi',
+                last_name='Rd',
+                password='testpass123'
+            )
+            with self.captureOnCommitCallbacks(execute=True):
+                Membership.objects.create(user=third, community=self.joined, role='member', status='approved')
+                Membership.objects.create(user=self.user, community=self.other, role='member', status='approved')
+                self.create_post(self.joined, 'Merged')
+                self.create_post(self.other, 'Small')
+            
+            titles, next_url = self.get_titles(page_size=2)
+            self.assertEqual(titles, ['Small', 'Merged'])
+            titles, _ = self.get_titles(next_url)
+            self.assertEqual(titles, ['Stored'])
+    
+    def test_role_changes_leave_the_feed_alone(self):
+        """Only approval changes touch the member's stored feed"""
+        from .services.feed_service import FeedService
+        
+        self.create_post(self.joined, 'Post')
+        self.get_titles()
+        
+        membership = Membership.objects.get(user=self.user, community=self.joined)
+        membership.role = 'moderator'
+        with mock.patch.object(FeedService, 'add_community') as add, \
+                mock.patch.object(FeedService, 'remove_community') as remove, \
+                self.captureOnCommitCallbacks(execute=True):
+            membership.save()
+        add.assert_not_called()
+        remove.assert_not_called()
+        
+        membership.status = 'rejected'
+        with self.captureOnCommitCallbacks(execute=True):
+            membership.save()
+        titles, _ = self.get_titles()
+        self.assertEqual(titles, [])
+    
+    def test_invalid_cursor_returns_404(self):
+        """Malformed feed cursors are rejected"""
+        response = self.client.get(self.url, {'cursor': 'not-a-cursor'})
+        
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class PostListQueryCountTests(APITestCase):
+    """Test that the post list does not issue queries per post"""
+    
+    # Queries for one page: the count, the page's posts (with community and author),
+    # the user's upvotes and the participant counts of the event posts
+    LIST_QUERY_COUNT = 4
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='voter@example.com',
+            username='voter',
+            first_name='Vot',
+            last_name='Er',
+            password='testpass123'
+        )
+        self.other = User.objects.create_user(
+            email='attendee@example.com',
+            username='attendee',
+            first_name='Atten',
+            last_name='Dee',
+            password='testpass123'
+        )
+        self.community = Community.objects.create(name='Busy', description='Many posts', creator=self.user)
+        Membership.objects.create(user=self.user, community=self.community, role='admin', status='approved')
+        
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('communities:community-posts-list', kwargs={'community_slug': self.community.slug})
+    
+    def create_posts(self, count):
+        for index in range(count):
+            post = Post.objects.create(
+                title=f'Post {index}', content='Content', community=self.community, author=self.user
+            )
+            post.upvotes.add(self.user, self.other)
+            event = Post.objects.create(
+                title=f'Event {index}', content='Content', community=self.community, author=self.user,
+                post_type='event', event_participant_limit=2
+            )
+            event.event_participants.add(self.user, self.other)
+    
+    def assert_list_query_count(self, expected_results):
+        with self.assertNumQueries(self.LIST_QUERY_COUNT):
+            response = self.client.get(self.url)
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), expected_results)
+        return response
+    
+    def test_query_count_does_not_grow_with_page_size(self):
+        """Listing 2 or 20 posts costs the same number of queries"""
+        self.create_posts(1)
+        self.assert_list_query_count(2)
+        
+        self.create_posts(9)
+        response = self.assert_list_query_count(20)
+        
+        posts = {post['post_type']: post for post in response.data['results']}
+        self.assertTrue(posts['discussion']['has_upvoted'])
+        self.assertEqual(posts['discussion']['upvote_count'], 2)
+        self.assertTrue(posts['event']['has_joined'])
+        self.assertEqual(posts['event']['participant_count'], 2)
+        self.assertTrue(posts['event']['is_full'])
+    
+    def test_detail_pages_top_level_comments(self):
+        """The detail page embeds a bounded window of comments with a link to the next one"""
+        post = Post.objects.create(title='Discussed', content='Content', community=self.community, author=self.user)
+        comments = [Comment.objects.create(post=post, author=self.other, content=f'Comment {index}') for index in range(3)]
+        Comment.objects.create(post=post, author=self.user, content='Reply', parent=comments[0])
+        url = reverse(
+            'communities:community-posts-detail',
+            kwargs={'community_slug': self.community.slug, 'pk': post.pk}
+        )
+        
+        response = self.client.get(url, {'comments_page_size': 2})
+        self.assertEqual([comment['content'] for comment in response.data['comments']], ['Comment 0', 'Comment 1'])
+        self.assertIsNotNone(response.data['comments_next'])
+        
+        response = self.client.get(response.data['comments_next'])
+        self.assertEqual([comment['content'] for comment in response.data['comments']], ['Comment 2'])
+        self.assertIsNone(response.data['comments_next'])
+
+
+class CommentTreeTests(APITestCase):
+    """Test loading comment threads by materialized path"""
+    
+    # Queries for a thread: the post, the comments and the user's upvotes
+    THREAD_QUERY_COUNT = 3
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='threader@example.com',
+            username='threader',
+            first_name='Thread',
+            last_name='Er',
+            password='testpass123'
+        )
+        self.community = Community.objects.create(name='Threads', description='Deep threads', creator=self.user)
+        Membership.objects.create(user=self.user, community=self.community, role='admin', status='approved')
+        self.post = Post.objects.create(title='Thread', content='Content', community=self.community, author=self.user)
+        
+        # first -> reply -> nested, first -> second reply, other
+        self.first = self.comment('First')
+        self.reply = self.comment('Reply', parent=self.first)
+        self.nested = self.comment('Nested', parent=self.reply)
+        self.second_reply = self.comment('Second reply', parent=self.first)
+        self.other = self.comment('Other')
+        self.nested.upvotes.add(self.user)
+        
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        kwargs = {'community_slug': self.community.slug, 'post_pk': self.post.pk}
+        self.thread_url = reverse('communities:post-comments-thread', kwargs=kwargs)
+        self.tree_url = reverse('communities:post-comments-tree', kwargs={**kwargs, 'pk': self.first.pk})
+    
+    def comment(self, content, parent=None):
+        return Comment.objects.create(post=self.post, author=self.user, content=content, parent=parent)
+    
+    def test_paths_follow_the_thread(self):
+        """Paths nest under their parent's path and record the depth"""
+        self.nested.refresh_from_db()
+        
+        self.assertTrue(self.nested.path.startswith(self.reply.path))
+        self.assertTrue(self.reply.path.startswith(self.first.path))
+        self.assertEqual([self.first.depth, self.reply.depth, self.nested.depth], [0, 1, 2])
+        lower, upper = self.first.get_subtree_bounds()
+        self.assertTrue(lower <= self.nested.path < upper)
+        self.assertFalse(lower <= self.other.path < upper)
+    
+    def test_new_comment_is_inserted_with_its_path(self):
+        """Creating a comment writes the row once, path included"""
+        from .models.comment import comment_path_segment
+        
+        with CaptureQueriesContext(connection) as queries:
+            reply = self.comment('Late reply', parent=self.reply)
+        
+        comment_writes = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith(('INSERT INTO "communities_comment"', 'UPDATE "communities_comment"'))
+            # The parent's reply counter is updated separately
+            and 'reply_count_cache' not in query['sql']
+        ]
+        self.assertEqual(len(comment_writes), 1)
+        self.assertTrue(comment_writes[0].startswith('INSERT'))
+        reply.refresh_from_db()
+        self.assertEqual(reply.path, self.reply.path + comment_path_segment(reply.pk))
+        self.assertEqual(reply.depth, 2)
+    
+    def test_thread_loads_nested_tree_in_constant_queries(self):
+        """The whole thread comes back nested, with counts and upvote state batched"""
+        with self.assertNumQueries(self.THREAD_QUERY_COUNT):
+            response = self.client.get(self.thread_url)
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        first, other = response.data
+        self.assertEqual([first['content'], other['content']], ['First', 'Other'])
+        self.assertEqual(first['reply_count'], 2)
+        self.assertEqual([reply['content'] for reply in first['replies']], ['Reply', 'Second reply'])
+        nested = first['replies'][0]['replies'][0]
+        self.assertEqual(nested['content'], 'Nested')
+        self.assertEqual(nested['depth'], 2)
+        self.assertTrue(nested['has_upvoted'])
+        self.assertEqual(nested['upvote_count'], 1)
+    
+    def test_depth_limited_subtree(self):
+        """A subtree stops at the requested depth but still counts the replies below it"""
+        response = self.client.get(self.tree_url, {'depth': 1})
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        [first] = response.data
+        reply, second_reply = first['replies']
+        self.assertEqual(reply['replies'], [])
+        self.assertEqual(reply['reply_count'], 1)
+        self.assertEqual(second_reply['reply_count'], 0)
+    
+    def test_reply_count_cache_follows_replies(self):
+        """Creating and deleting replies adjusts the parent's cached reply count"""
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.reply_count_cache, 2)
+        
+        self.second_reply.delete()
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.reply_count_cache, 1)
+        
+        self.comment('Third reply', parent=self.first)
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.reply_count_cache, 2)
+
+
+class UpvoteToggleTests(APITestCase):
+    """Test the atomic upvote toggles"""
+    
+    def setUp(self):
+        cache.clear()
+        
+        self.user = User.objects.create_user(
+            email='clicker@example.com',
+            username='clicker',
+            first_name='Click',
+            last_name='Er',
+            password='testpass123'
+        )
+        self.community = Community.objects.create(name='Votes', description='Hot posts', creator=self.user)
+        Membership.objects.create(user=self.user, community=self.community, role='admin', status='approved')
+        self.post = Post.objects.create(title='Hot', content='Content', community=self.community, author=self.user)
+        self.comment = Comment.objects.create(post=self.post, author=self.user, content='Hot take')
+        
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        kwargs = {'community_slug': self.community.slug}
+        self.post_url = reverse('communities:community-posts-upvote', kwargs={**kwargs, 'pk': self.post.pk})
+        self.comment_url = reverse(
+            'communities:post-comments-upvote', kwargs={**kwargs, 'post_pk': self.post.pk, 'pk': self.comment.pk}
+        )
+    
+    def test_post_upvote_toggles_counter_without_recounting(self):
+        """Each toggle moves the counter by one and never counts the upvotes"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.post_url)
+        self.assertEqual(response.data['detail'], 'Post upvoted.')
+        self.assertFalse(any('COUNT(' in query['sql'].upper() for query in queries.captured_queries))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.upvote_count_cache, 1)
+        
+        response = self.client.post(self.post_url)
+        self.assertEqual(response.data['detail'], 'Upvote removed.')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.upvote_count_cache, 0)
+        self.assertFalse(self.post.upvotes.exists())
+    
+    def test_comment_upvote_toggles_counter(self):
+        """Comment upvotes use the same toggle"""
+        self.client.post(self.comment_url)
+        self.comment.refresh_from_db()
+        self.assertEqual(self.comment.upvote_count_cache, 1)
+        
+        self.client.post(self.comment_url)
+        self.comment.refresh_from_db()
+        self.assertEqual(self.comment.upvote_count_cache, 0)
+    
+    def test_insert_ignores_existing_vote(self):
+        """Inserting a vote that already exists changes nothing"""
+        from .utils.votes import insert_vote
+        
+        self.post.upvotes.add(self.user)
+        
+        inserted = insert_vote(Post.upvotes.through, 'post_id', 'user_id', self.post.pk, self.user.pk)
+        
+        self.assertFalse(inserted)
+        self.assertEqual(self.post.upvotes.count(), 1)
+    
+    def test_lost_insert_race_counts_nothing(self):
+        """A toggle whose insert was beaten by a concurrent toggle reports the vote without counting it"""
+        from .models import CommunityDailyStats
+        from .services.post_service import PostService
+        from .services.stats_service import CommunityStatsService
+        from .utils.votes import toggle_vote
+        
+        with mock.patch('communities.utils.votes.insert_vote', return_value=False):
+            self.assertEqual(toggle_vote(Comment.upvotes, self.comment.pk, self.user.pk), (True, False))
+            with self.captureOnCommitCallbacks(execute=True):
+                upvoted, message = PostService.toggle_post_upvote(self.post, self.user)
+        self.assertTrue(upvoted)
+        
+        self.post.refresh_from_db()
+        self.comment.refresh_from_db()
+        self.assertEqual((self.post.upvote_count_cache, self.comment.upvote_count_cache), (0, 0))
+        CommunityStatsService.flush_upvotes()
+        self.assertFalse(CommunityDailyStats.objects.filter(community=self.community, upvotes__gt=0).exists())
+
+
+@override_settings(COMMUNITY_COUNTER_BUFFER=True)
+class CounterBufferTests(APITestCase):
+    """Test the write-behind buffer of the hot counters"""
+    
+    def setUp(self):
+        cache.clear()
+        
+        self.user = User.objects.create_user(
+            email='buffered@example.com',
+            username='buffered',
+            first_name='Buff',
+            last_name='Ered',
+            password='testpass123'
+        )
+        self.community = Community.objects.create(name='Buffered', description='Hot counters', creator=self.user)
+        Membership.objects.create(user=self.user, community=self.community, role='admin', status='approved')
+        self.post = Post.objects.create(title='Hot', content='Content', community=self.community, author=self.user)
+        
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        kwargs = {'community_slug': self.community.slug, 'pk': self.post.pk}
+        self.upvote_url = reverse('communities:community-posts-upvote', kwargs=kwargs)
+        self.detail_url = reverse('communities:community-posts-detail', kwargs=kwargs)
+    
+    def test_pending_deltas_are_read_before_flush(self):
+        """Buffered upvotes show in the API right away and reach the row on flush"""
+        from .utils.counters import flush_counter_buffer
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.upvote_url)
+        
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.upvote_count_cache, 0)
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response.data['upvote_count'], 1)
+        
+        flush_counter_buffer()
+        
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.upvote_count_cache, 1)
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response.data['upvote_count'], 1)
+    
+    def test_comment_count_is_buffered(self):
+        """New comments adjust the buffered comment counter"""
+        from .utils.counters import flush_counter_buffer
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(post=self.post, author=self.user, content='First')
+            Comment.objects.create(post=self.post, author=self.user, content='Second')
+        
+        flush_counter_buffer()
+        
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count_cache, 2)
+    
+    def test_failed_flush_is_retried_once(self):
+        """A flush that fails keeps its batch, and an applied batch is not applied again"""
+        from .utils.counters import flush_counter_buffer
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.upvote_url)
+        
+        with mock.patch('communities.utils.counters.apply_counter_deltas', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                flush_counter_buffer()
+        
+        flush_counter_buffer()
+        flush_counter_buffer()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.upvote_count_cache, 1)
+
+
+class CounterReconcileTests(APITestCase):
+    """Test the set-based counter reconciliation"""
+    
+    def setUp(self):
+        cache.clear()
+        
+        self.user = User.objects.create_user(
+            email='counter@example.com',
+            username='counter',
+            first_name='Count',
+            last_name='Er',
+            password='testpass123'
+        )
+        self.community = Community.objects.create(name='Counted', description='Drifting counters', creator=self.user)
+        Membership.objects.create(user=self.user, community=self.community, role='admin', status='approved')
+        self.posts = [
+            Post.objects.create(title=f'Post {index}', content='Content', community=self.community, author=self.user)
+            for index in range(3)
+        ]
+        for post in self.posts:
+            Comment.objects.create(post=post, author=self.user, content='Comment')
+        Post.objects.update(comment_count_cache=7, upvote_count_cache=3)
+    
+    def test_dry_run_reports_drift_without_writing(self):
+        """A dry run lists the drifted counters and leaves them"""
+        from .services.counter_service import CounterService
+        
+        stats = CounterService.reconcile('post', chunk_size=2, dry_run=True)
+        
+        self.assertEqual(stats['checked'], 3)
+        self.assertEqual(stats['drifted'], 6)
+        self.assertEqual(stats['fixed'], 0)
+        self.assertIn((self.posts[0].pk, 'comment_count_cache', 7, 1), stats['drift'])
+        self.assertEqual(Post.objects.filter(comment_count_cache=7).count(), 3)
+    
+    def test_reconcile_fixes_drift_in_chunks(self):
+        """Drifted rows are recounted one chunk at a time"""
+        from .services.counter_service import CounterService
+        
+        Community.objects.update(member_count_cache=0, post_count_cache=0)
+        
+        with CaptureQueriesContext(connection) as queries:
+            stats = CounterService.reconcile('post', chunk_size=2)
+        
+        self.assertEqual(stats['fixed'], 3)
+        # Each chunk reads its keys, selects the drifted rows and updates them
+        self.assertLessEqual(len(queries.captured_queries), 3 * 2 + 1)
+        for post in Post.objects.all():
+            self.assertEqual(post.comment_count_cache, 1)
+            self.assertEqual(post.upvote_count_cache, 0)
+        
+        CounterService.reconcile_all()
+        self.community.refresh_from_db()
+        self.assertEqual(self.community.member_count_cache, 1)
+        self.assertEqual(self.community.post_count_cache, 3)
+    
+    def test_since_and_resume(self):
+        """--since skips untouched rows and --resume continues after the checkpoint"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from .services.counter_service import CounterService, checkpoint_key
+        
+        since = timezone.now()
+        Post.objects.filter(pk=self.posts[0].pk).update(updated_at=since)
+        Post.objects.exclude(pk=self.posts[0].pk).update(updated_at=since - timedelta(days=1))
+        Comment.objects.update(created_at=since - timedelta(days=1))
+        
+        stats = CounterService.reconcile('post', since=since)
+        self.assertEqual(stats['checked'], 1)
+        
+        cache.set(checkpoint_key('post', None), self.posts[1].pk)
+        stats = CounterService.reconcile('post', resume=True)
+        self.assertEqual(stats['checked'], 1)
+        self.assertEqual(Post.objects.get(pk=self.posts[2].pk).comment_count_cache, 1)
+        self.assertEqual(Post.objects.get(pk=self.posts[1].pk).comment_count_cache, 7)
+        self.assertIsNone(cache.get(checkpoint_key('post', None)))
+
+
+class MemberCountTests(TransactionTestCase):
+    """Test the delta-maintained community member counter"""
+    
+    def setUp(self):
+        cache.clear()
+        
+        self.users = [
+            User.objects.create_user(
+                email=f'member{index}@example.com',
+                username=f'member{index}',
+                first_name='Mem',
+                last_name='Ber',
+                password='testpass123'
+            )
+            for index in range(12)
+        ]
+        self.community = Community.objects.create(name='Members', description='Coming and going', creator=self.users[0])
+        Membership.objects.create(user=self.users[0], community=self.community, role='admin', status='approved')
+    
+    def test_only_status_changes_adjust_the_count(self):
+        """Role edits leave the count alone; approvals and removals move it by one"""
+        membership = Membership.objects.create(
+            user=self.users[1], community=self.community, role='member', status='pending'
+        )
+        self.community.refresh_from_db()
+        self.assertEqual(self.community.member_count_cache, 1)
+        
+        membership.status = 'approved'
+        membership.save()
+        membership = Membership.objects.get(pk=membership.pk)
+        with CaptureQueriesContext(connection) as queries:
+            membership.role = 'moderator'
+            membership.save()
+        self.assertFalse(any('COUNT(' in query['sql'].upper() for query in queries.captured_queries))
+        self.community.refresh_from_db()
+        self.assertEqual(self.community.member_count_cache, 2)
+        
+        membership = Membership.objects.get(pk=membership.pk)
+        membership.status = 'rejected'
+        membership.save()
+        self.community.refresh_from_db()
+        self.assertEqual(self.community.member_count_cache, 1)
+        
+        Membership.objects.filter(pk=membership.pk).delete()
+        self.community.refresh_from_db()
+        self.assertEqual(self.community.member_count_cache, 1)
+    
+    def test_parallel_joins_and_leaves(self):
+        """Concurrent joins and leaves leave the counter equal to the approved memberships"""
+        from concurrent.futures import ThreadPoolExecutor
+        
+        leavers = self.users[1:6]
+        joiners = self.users[6:]
+        for user in leavers:
+            Membership.objects.create(user=user, community=self.community, role='member', status='approved')
+        
+        def run(action, user):
+            try:
+                action(user, Community.objects.get(pk=self.community.pk))
+            finally:
+                connections.close_all()
+        
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            futures = [executor.submit(run, CommunityService.join_community, user) for user in joiners]
+            futures += [executor.submit(run, CommunityService.leave_community, user) for user in leavers]
+            for future in futures:
+                future.result()
+        
+        self.community.refresh_from_db()
+        self.assertEqual(
+            self.community.member_count_cache,
+            Membership.objects.filter(community=self.community, status='approved').count()
+        )
+        self.assertEqual(self.community.member_count_cache, 1 + len(joiners))
+    
+    def test_parallel_approvals_count_once(self):
+        """Concurrent approvals of the same pending membership move the counter once"""
+        from concurrent.futures import ThreadPoolExecutor
+        
+        pending = Membership.objects.create(
+            user=self.users[1], community=self.community, role='member', status='pending'
+        )
+        # Every approval starts from the pending row it loaded
+        loaded = [Membership.objects.get(pk=pending.pk) for _ in range(4)]
+        
+        def approve(membership):
+            try:
+                membership.status = 'approved'
+                membership.save()
+            finally:
+                connections.close_all()
+        
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            for future in [executor.submit(approve, membership) for membership in loaded]:
+                future.result()
+        
+        self.community.refresh_from_db()
+        self.assertEqual(self.community.member_count_cache, 2)
+
+
+class TieredCacheTests(APITestCase):
+    """Test the local LRU tier in front of Redis"""
+    
+    def setUp(self):
+        cache.clear()
+        from .utils.tiered_cache import TieredCache
+        
+        self.tiered = TieredCache()
+        self.tiered.local.max_entries = 2
+    
+    def test_reads_are_served_locally_after_the_first(self):
+        """The first read goes to Redis, the next ones hit the local tier"""
+        cache.set('tiered:a', 'value', 60)
+        
+        self.assertEqual(self.tiered.get('tiered:a'), 'value')
+        self.assertEqual(self.tiered.get('tiered:a'), 'value')
+        self.assertIsNone(self.tiered.get('tiered:missing'))
+        
+        stats = self.tiered.stats()
+        self.assertEqual(stats['local'], {'hits': 1, 'misses': 2, 'size': 1, 'max_entries': 2})
+        self.assertEqual(stats['redis'], {'hits': 1, 'misses': 1})
+    
+    def test_local_tier_is_bounded(self):
+        """The least recently used entry is evicted first"""
+        for key in ('tiered:a', 'tiered:b'):
+            self.tiered.set(key, key, 60)
+        self.tiered.get('tiered:a')
+        self.tiered.set('tiered:c', 'tiered:c', 60)
+        
+        self.assertEqual(len(self.tiered.local), 2)
+        cache.delete('tiered:b')
+        self.assertIsNone(self.tiered.get('tiered:b'))
+        cache.delete('tiered:a')
+        self.assertEqual(self.tiered.get('tiered:a'), 'tiered:a')
+    
+    def test_broadcast_invalidation_drops_local_entries(self):
+        """Invalidations from other workers remove the local copies"""
+        self.tiered.set('cached_method:Community:1:stats:x', 1, 60)
+        self.tiered.set('tiered:a', 2, 60)
+        
+        self.tiered.handle_message('pattern:cached_*:Community:1:*')
+        self.tiered.handle_message('key:tiered:a')
+        
+        self.assertEqual(len(self.tiered.local), 0)
+    
+    def test_stats_endpoint_is_staff_only(self):
+        """The per-worker counters are only shown to staff"""
+        user = User.objects.create_user(
+            email='staff@example.com',
+            username='staff',
+            first_name='Sta',
+            last_name='Ff',
+            password='testpass123'
+        )
+        client = APIClient()
+        client.force_authenticate(user=user)
+        url = reverse('communities:cache-stats')
+        
+        self.assertEqual(client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+        
+        user.is_staff = True
+        user.save()
+        response = client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('hits', response.data['local'])
+
+
+class CacheGenerationTests(APITestCase):
+    """Test generation-based invalidation of the cache decorators"""
+    
+    def setUp(self):
+        cache.clear()
+        
+        self.user = User.objects.create_user(
+            email='generation@example.com',
+            username='generation',
+            first_name='Gene',
+            last_name='Ration',
+            password='testpass123'
+        )
+        self.community = Community.objects.create(name='Generations', description='Cached', creator=self.user)
+        self.other = Community.objects.create(name='Other', description='Cached', creator=self.user)
+    
+    def test_invalidation_bumps_the_instance_generation(self):
+        """Invalidating an instance is an INCR, not a key scan, and leaves other instances cached"""
+        from .utils.cache import cached_method, invalidate_model_cache
+        
+        calls = []
+        
+        @cached_method(timeout=60)
+        def describe(community):
+            calls.append(community.pk)
+            return community.name
+        
+        describe(self.community)
+        describe(self.other)
+        describe(self.community)
+        self.assertEqual(calls, [self.community.pk, self.other.pk])
+        
+        with mock.patch.object(cache, 'delete_pattern') as delete_pattern:
+            invalidate_model_cache(self.community)
+        delete_pattern.assert_not_called()
+        
+        describe(self.community)
+        describe(self.other)
+        self.assertEqual(calls, [self.community.pk, self.other.pk, self.community.pk])
+    
+    def test_class_generation(self):
+        """Values cached on the model class have their own generation"""
+        from .utils.cache import cached_method, invalidate_model_cache, invalidate_model_class_cache
+        
+        calls = []
+        
+        @cached_method(timeout=60)
+        def total(model):
+            calls.append(model)
+            return model.objects.count()
+        
+        self.assertEqual(total(Community), 2)
+        invalidate_model_cache(self.community)
+        self.assertEqual(total(Community), 2)
+        self.assertEqual(len(calls), 1)
+        
+        invalidate_model_class_cache(Community)
+        total(Community)
+        self.assertEqual(len(calls), 2)
+    
+    def test_generations_bypass_the_local_tier(self):
+        """A bump made elsewhere is seen at once, even without the broadcast"""
+        from .utils.cache import get_cache_generation, model_generation
+        from .utils.tiered_cache import MISSING, tiered_cache
+        
+        name = model_generation(self.community)
+        before = get_cache_generation(name)
+        # Another worker's bump, as this process sees it before any invalidation message
+        cache.incr(f"cache_generation:{name}")
+        self.assertEqual(get_cache_generation(name), before + 1)
+        self.assertIs(tiered_cache.local.get(f"cache_generation:{name}"), MISSING)
+
+
+class MemoizeTests(APITestCase):
+    """Test per-argument memoization of functions and static methods"""
+    
+    def setUp(self):
+        cache.clear()
+        
+        self.user = User.objects.create_user(
+            email='memo@example.com',
+            username='memo',
+            first_name='Me',
+            last_name='Mo',
+            password='testpass123'
+        )
+        self.first = Community.objects.create(name='First', description='Analytics', creator=self.user)
+        self.second = Community.objects.create(name='Second', description='Analytics', creator=self.user)
+        Membership.objects.create(user=self.user, community=self.first, role='admin', status='approved')
+    
+    def test_static_method_results_are_cached_per_argument(self):
+        """Each community gets its own cached value"""
+        from .utils.cache import memoize
+        
+        class Stats:
+            @staticmethod
+            @memoize(timeout=60)
+            def member_count(community_id):
+                return Membership.objects.filter(community_id=community_id, status='approved').count()
+        
+        self.assertEqual(Stats.member_count(self.first.id), 1)
+        self.assertEqual(Stats.member_count(self.second.id), 0)
+        with self.assertNumQueries(0):
+            self.assertEqual(Stats.member_count(self.first.id), 1)
+        self.assertNotEqual(
+            Stats.member_count.cache_key(self.first.id),
+            Stats.member_count.cache_key(self.second.id)
+        )
+    
+    def test_key_schema_and_invalidation_hooks(self):
+        """Ignored parameters share a value; generations and invalidate() drop it"""
+        from .utils.cache import memoize, bump_cache_generation
+        
+        calls = []
+        
+        @memoize(timeout=60, key=('community_id',), generations=lambda community_id: [f"stats:{community_id}"])
+        def stats(community_id, verbose=False):
+            calls.append(community_id)
+            return None
+        
+        with mock.patch('json.dumps') as dumps:
+            stats(1)
+            stats(1, verbose=True)
+        dumps.assert_not_called()
+        self.assertEqual(calls, [1])
+        
+        bump_cache_generation('stats:1')
+        stats(1)
+        stats.invalidate(1)
+        stats(1)
+        stats(2)
+        self.assertEqual(calls, [1, 1, 1, 2])
+    
+    def test_unsupported_arguments_are_rejected(self):
+        """Arguments without a cheap stable representation raise instead of sharing a key"""
+        from .utils.cache import memoize
+        
+        @memoize(timeout=60)
+        def echo(value):
+            return value
+        
+        with self.assertRaises(TypeError):
+            echo(object())
+        self.assertEqual(echo(self.first), self.first)
+
+
+class CacheStampedeTests(TestCase):
+    """Test single-flight recomputation of cached values"""
+    
+    def setUp(self):
+        cache.clear()
+    
+    def test_concurrent_misses_compute_once(self):
+        """Only one of many concurrent misses runs the computation"""
+        import threading
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+        from .utils.cache import memoize
+        
+        calls = []
+        lock = threading.Lock()
+        
+        @memoize(timeout=60)
+        def expensive(community_id):
+            with lock:
+                calls.append(community_id)
+            time.sleep(0.3)
+            return community_id * 2
+        
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            results = list(executor.map(lambda _: expensive(21), range(10)))
+        
+        self.assertEqual(results, [42] * 10)
+        self.assertEqual(calls, [21])
+    
+    def test_stale_value_is_served_while_another_process_refreshes(self):
+        """An expired value is returned as is while the recompute lock is taken"""
+        from .utils.cache import CachedValue, get_or_compute
+        from .utils.tiered_cache import tiered_cache
+        
+        cache.set('stampede:key', CachedValue('stale', 0, 0.1), 60)
+        lock = cache.lock('recompute:stampede:key', timeout=10)
+        self.assertTrue(lock.acquire(blocking=False))
+        try:
+            value = get_or_compute('stampede:key', lambda: 'fresh', 60)
+        finally:
+            lock.release()
+        self.assertEqual(value, 'stale')
+        
+        tiered_cache.clear_local()
+        self.assertEqual(get_or_compute('stampede:key', lambda: 'fresh', 60), 'fresh')
+
+
+class MembershipResolverTests(APITestCase):
+    """Test the request-scoped membership resolver"""
+    
+    def setUp(self):
+        cache.clear()
+        
+        self.creator = User.objects.create_user(
+            email='owner@example.com',
+            username='owner',
+            first_name='Own',
+            last_name='Er',
+            password='testpass123'
+        )
+        self.user = User.objects.create_user(
+            email='resolved@example.com',
+            username='resolved',
+            first_name='Re',
+            last_name='Solved',
+            password='testpass123'
+        )
+        self.community = Community.objects.create(name='Resolved', description='Members', creator=self.creator)
+        Membership.objects.create(user=self.user, community=self.community, role='moderator', status='approved')
+        self.post = Post.objects.create(title='Post', content='Content', community=self.community, author=self.creator)
+        self.post = Post.objects.select_related('community').get(pk=self.post.pk)
+    
+    def test_checks_in_one_request_share_one_query(self):
+        """Permissions and services ask the resolver, which loads the membership once"""
+        from .permissions.base_permissions import BaseCommunityPermission
+        from .services.post_service import PostService
+        from .utils.memberships import request_resolvers
+        
+        permission = BaseCommunityPermission()
+        token = request_resolvers.set({})
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                self.assertTrue(permission.is_community_member(self.user, self.community))
+                self.assertTrue(permission.is_community_admin(self.user, self.community))
+                upvoted, message = PostService.toggle_post_upvote(self.post, self.user)
+        finally:
+            request_resolvers.reset(token)
+        
+        self.assertTrue(upvoted)
+        membership_queries = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('SELECT') and 'FROM "communities_membership"' in query['sql']
+        ]
+        self.assertEqual(len(membership_queries), 1)
+    
+    def test_changes_are_seen_by_the_next_check(self):
+        """Joining and leaving within a request or across requests is never answered from a stale row"""
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        status_url = reverse('communities:community-membership-status', kwargs={'slug': self.community.slug})
+        
+        self.assertEqual(client.get(status_url).data['status'], 'approved')
+        
+        client.post(reverse('communities:community-leave', kwargs={'slug': self.community.slug}))
+        self.assertFalse(client.get(status_url).data['is_member'])
+        
+        client.post(reverse('communities:community-join', kwargs={'slug': self.community.slug}))
+        self.assertEqual(client.get(status_url).data['status'], 'approved')
+
+
+class RoleMapTests(APITestCase):
+    """Test the per-user role maps kept in Redis"""
+    
+    def setUp(self):
+        cache.clear()
+        
+        self.creator = User.objects.create_user(
+            email='mapowner@example.com',
+            username='mapowner',
+            first_name='Map',
+            last_name='Owner',
+            password='testpass123'
+        )
+        self.user = User.objects.create_user(
+            email='mapped@example.com',
+            username='mapped',
+            first_name='Map',
+            last_name='Ped',
+            password='testpass123'
+        )
+        self.community = Community.objects.create(name='Mapped', description='Roles', creator=self.creator)
+        # Maps are written once the membership commits
+        with self.captureOnCommitCallbacks(execute=True):
+            self.membership = Membership.objects.create(
+                user=self.user, community=self.community, role='moderator', status='approved'
+            )
+    
+    def test_warm_map_answers_permission_checks_without_queries(self):
+        """Once the role map is stored, membership and admin checks need no database query"""
+        from .permissions.base_permissions import BaseCommunityPermission
+        from .services.role_map_service import RoleMapService
+        
+        RoleMapService.get_role_map(self.user.id)
+        permission = BaseCommunityPermission()
+        with self.assertNumQueries(0):
+            self.assertTrue(permission.is_community_member(self.user, self.community))
+            self.assertTrue(permission.is_community_admin(self.user, self.community))
+    
+    def test_cold_map_is_rebuilt_from_the_database(self):
+        """A missing map is built on its first read and stored"""
+        from .services.role_map_service import RoleMapService
+        
+        with self.assertNumQueries(1):
+            roles = RoleMapService.get_role_map(self.user.id)
+        self.assertEqual(roles, {self.community.id: ('moderator', 'approved')})
+        with self.assertNumQueries(0):
+            self.assertEqual(RoleMapService.get_role_map(self.user.id), roles)
+        
+        # Users without memberships get a stored, empty map
+        RoleMapService.get_role_map(self.creator.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(RoleMapService.get_role_map(self.creator.id), {})
+    
+    def test_membership_changes_are_written_through(self):
+        """Saving and deleting memberships updates a stored map"""
+        from .services.role_map_service import RoleMapService
+        
+        RoleMapService.get_role_map(self.user.id)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.membership.role = 'member'
+            self.membership.save()
+        self.assertEqual(RoleMapService.get_role_map(self.user.id), {self.community.id: ('member', 'approved')})
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.membership.delete()
+        self.assertEqual(RoleMapService.get_role_map(self.user.id), {})
+        
+        other = Community.objects.create(name='Other', description='Roles', creator=self.creator)
+        with self.captureOnCommitCallbacks(execute=True):
+            CommunityService.join_community(self.user, other)
+        self.assertEqual(RoleMapService.get_role_map(self.user.id)[other.id][1], 'approved')
+    
+    def test_rolled_back_changes_never_reach_the_map(self):
+        """Uncommitted changes are answered from the database and dropped with their transaction"""
+        from django.db import transaction
+        from django_redis import get_redis_connection
+        from .services.role_map_service import RoleMapService, role_map_key
+        from .utils.memberships import MembershipResolver
+        
+        RoleMapService.get_role_map(self.user.id)
+        stored = get_redis_connection('default').hgetall(role_map_key(self.user.id))
+        
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.membership.role = 'admin'
+                self.membership.save()
+                self.assertIsNone(RoleMapService.get_role_map(self.user.id))
+                self.assertEqual(MembershipResolver(self.user).role(self.community), 'admin')
+                raise RuntimeError
+        
+        self.assertEqual(get_redis_connection('default').hgetall(role_map_key(self.user.id)), stored)
+        self.assertEqual(MembershipResolver(self.user).role(self.community), 'moderator')
+    
+    def test_rolled_back_changes_leave_nothing_pending(self):
+        """A rolled back savepoint takes its pending writes with it, and the stored map is used again"""
+        from django.db import transaction
+        from .services.role_map_service import RoleMapService, pending_role_maps
+        
+        RoleMapService.get_role_map(self.user.id)
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.membership.role = 'admin'
+                self.membership.save()
+                self.assertIn(self.user.id, pending_role_maps())
+                raise RuntimeError
+        
+        self.assertNotIn(self.user.id, pending_role_maps())
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                RoleMapService.get_role_map(self.user.id), {self.community.id: ('moderator', 'approved')}
+            )
+    
+    def test_redis_errors_do_not_fail_membership_saves(self):
+        """A failing write-through is logged and the save goes through"""
+        from redis.exceptions import ConnectionError as RedisConnectionError
+        
+        redis = mock.Mock()
+        redis.eval.side_effect = RedisConnectionError
+        with mock.patch('communities.services.role_map_service.get_redis_connection', return_value=redis), \
+                self.assertLogs('communities.services.role_map_service', level='ERROR'), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.membership.role = 'member'
+            self.membership.save()
+        
+        self.assertEqual(Membership.objects.get(pk=self.membership.pk).role, 'member')
+    
+    def test_reconcile_rewrites_drifted_maps(self):
+        """Reconciliation fixes maps that differ from the database"""
+        from django_redis import get_redis_connection
+        from .services.role_map_service import RoleMapService, role_map_key
+        
+        RoleMapService.get_role_map(self.user.id)
+        RoleMapService.get_role_map(self.creator.id)
+        get_redis_connection('default').hset(role_map_key(self.user.id), str(self.community.id), 'admin:approved')
+        
+        self.assertEqual(RoleMapService.reconcile(dry_run=True), (2, 1))
+        self.assertEqual(RoleMapService.get_role_map(self.user.id)[self.community.id], ('admin', 'approved'))
+        
+        self.assertEqual(RoleMapService.reconcile(), (2, 1))
+        self.assertEqual(RoleMapService.get_role_map(self.user.id), {self.community.id: ('moderator', 'approved')})
+        self.assertEqual(RoleMapService.reconcile(), (2, 0))
+
+
+class CommunityDailyStatsTests(APITestCase):
+    """Test the daily rollup behind the community analytics"""
+    
+    def setUp(self):
+        cache.clear()
+        
+        self.user = User.objects.create_user(
+            email='rollup@example.com',
+            username='rollup',
+            first_name='Roll',
+            last_name='Up',
+            password='testpass123'
+        )
+        self.member = User.objects.create_user(
+            email='rolled@example.com',
+            username='rolled',
+            first_name='Rol',
+            last_name='Led',
+            password='testpass123'
+        )
+        self.community = Community.objects.create(name='Rolled Up', description='Daily stats', creator=self.user)
+        Membership.objects.create(user=self.user, community=self.community, role='admin', status='approved')
+        Membership.objects.create(user=self.member, community=self.community, role='member', status='approved')
+        self.post = Post.objects.create(title='Daily', content='Content', community=self.community, author=self.user)
+        Comment.objects.create(post=self.post, author=self.member, content='First')
+        Comment.objects.create(post=self.post, author=self.user, content='Second')
+    
+    def get_row(self):
+        from django.utils import timezone
+        from .models import CommunityDailyStats
+        return CommunityDailyStats.objects.get(community=self.community, day=timezone.localdate())
+    
+    def test_rollup_counts_the_days_activity(self):
+        """A refresh recounts joins, posts, comments and distinct active authors"""
+        from .services.stats_service import CommunityStatsService
+        
+        CommunityStatsService.refresh()
+        row = self.get_row()
+        self.assertEqual((row.joins, row.posts, row.comments, row.active_authors), (2, 1, 2, 2))
+        
+        # Deleted activity is zeroed by the next run
+        self.post.delete()
+        CommunityStatsService.refresh()
+        row = self.get_row()
+        self.assertEqual((row.joins, row.posts, row.comments, row.active_authors), (2, 0, 0, 0))
+    
+    def test_upvotes_are_buffered_until_the_rollup(self):
+        """Upvotes are recorded as they are cast and survive recounts"""
+        from .services.post_service import PostService
+        from .services.stats_service import CommunityStatsService
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            PostService.toggle_post_upvote(self.post, self.member)
+            PostService.toggle_post_upvote(self.post, self.user)
+        CommunityStatsService.refresh()
+        self.assertEqual(self.get_row().upvotes, 2)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            PostService.toggle_post_upvote(self.post, self.member)
+        CommunityStatsService.refresh()
+        self.assertEqual(self.get_row().upvotes, 1)
+    
+    def test_upvotes_added_through_the_relation_are_recorded(self):
+        """Votes written with post.upvotes.add() and remove() reach the rollup too"""
+        from .services.stats_service import CommunityStatsService
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.upvotes.add(self.member, self.user)
+            self.post.upvotes.add(self.member)
+        CommunityStatsService.refresh()
+        self.assertEqual(self.get_row().upvotes, 2)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.upvotes.remove(self.member)
+        CommunityStatsService.refresh()
+        self.assertEqual(self.get_row().upvotes, 1)
+    
+    def test_failed_upvote_flush_is_retried_once(self):
+        """A flush that fails keeps its buffer, and an applied buffer is not added again"""
+        from .services.post_service import PostService
+        from .services.stats_service import CommunityStatsService
+        
+        CommunityStatsService.refresh()
+        with self.captureOnCommitCallbacks(execute=True):
+            PostService.toggle_post_upvote(self.post, self.member)
+        
+        def fail_upvote_insert(execute, sql, params, many, context):
+            if many:
+                raise RuntimeError('insert failed')
+            return execute(sql, params, many, context)
+        
+        with connection.execute_wrapper(fail_upvote_insert):
+            with self.assertRaises(RuntimeError):
+                CommunityStatsService.flush_upvotes()
+        
+        CommunityStatsService.flush_upvotes()
+        CommunityStatsService.flush_upvotes()
+        self.assertEqual(self.get_row().upvotes, 1)
+    
+    def test_backfill_seeds_upvotes_from_post_counters(self):
+        """Votes cast before the rollup existed come from the post counters"""
+        from .services.stats_service import CommunityStatsService
+        
+        Post.objects.filter(pk=self.post.pk).update(upvote_count_cache=5)
+        CommunityStatsService.backfill()
+        row = self.get_row()
+        self.assertEqual((row.posts, row.upvotes), (1, 5))
+    
+    def test_deploy_backfill_runs_once(self):
+        """--backfill --if-empty only backfills a rollup without rows"""
+        from io import StringIO
+        from django.core.management import call_command
+        
+        Post.objects.filter(pk=self.post.pk).update(upvote_count_cache=5)
+        call_command('rollup_community_stats', '--backfill', '--if-empty', stdout=StringIO())
+        self.assertEqual(self.get_row().upvotes, 5)
+        
+        Post.objects.filter(pk=self.post.pk).update(upvote_count_cache=7)
+        call_command('rollup_community_stats', '--backfill', '--if-empty', stdout=StringIO())
+        self.assertEqual(self.get_row().upvotes, 5)
+    
+    def test_analytics_read_the_rollup_rows(self):
+        """The analytics endpoint serves the rollup with a fixed number of queries"""
+        import datetime
+        from django.utils import timezone
+        from .services.stats_service import CommunityStatsService
+        
+        CommunityStatsService.refresh()
+        self.community.refresh_from_db()
+        with self.assertNumQueries(2):
+            analytics = CommunityStatsService.get_analytics(self.community)
+        
+        self.assertEqual(analytics['member_growth']['daily'][0]['count'], 2)
+        day = datetime.datetime.fromisoformat(analytics['member_growth']['daily'][0]['day'])
+        self.assertEqual((day.date(), day.time()), (timezone.localdate(), datetime.time.min))
+        self.assertIsNotNone(day.tzinfo)
+        self.assertEqual(analytics['post_activity']['monthly'][0]['count'], 1)
+        self.assertEqual(analytics['engagement_stats']['total_comments'], 2)
+        self.assertEqual(analytics['top_contributors'][0]['username'], 'rollup')
+        
+        client = APIClient()
+        client.force_authenticate(user=self.member)
+        response = client.get(reverse('communities:community-analytics', kwargs={'slug': self.community.slug}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['engagement_stats']['total_posts'], 1)
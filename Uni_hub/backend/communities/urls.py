@@ -3,7 +3,7 @@ from rest_framework.routers import DefaultRouter
 from rest_framework_nested.routers import NestedDefaultRouter
 
 # Import viewsets directly from views top-level package instead of from sub-modules
-from .views import CommunityViewSet, PostViewSet, CommentViewSet, CommunityInvitationViewSet
+from .views import CommunityViewSet, PostViewSet, CommentViewSet, CommunityInvitationViewSet, FeedView, CacheStatsView
 from .views.event_post_views import join_event_post, leave_event_post
 
 # Create a router with trailing slashes matching Django's preference
@@ -37,6 +37,10 @@ event_post_actions = [
 ]
 
 urlpatterns = [
+    # Personalized home feed
+    path('feed/', FeedView.as_view(), name='feed'),
+    # Per-worker cache tier counters, staff only
+    path('cache-stats/', CacheStatsView.as_view(), name='cache-stats'),
     # Community endpoints
     path('', include(router.urls)),
     path('', include(community_router.urls)),
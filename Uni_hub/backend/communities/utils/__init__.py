@@ -3,12 +3,31 @@
 
 # Communities app utilities
 from .exception_handler import custom_exception_handler
-from .cache import cached_property, cached_method, cache_queryset, invalidate_model_cache
+from .cache import (
+    memoize, cached_property, cached_method, cache_queryset, invalidate_model_cache,
+    invalidate_model_class_cache, get_cache_generation, bump_cache_generation,
+    get_cache_version, bump_cache_version, get_or_compute, CachedIdList
+)
+from .tiered_cache import tiered_cache, get_cache_stats
+from .counters import adjust_counter
+from .votes import toggle_vote
 
 __all__ = [
     'custom_exception_handler',
+    'memoize',
     'cached_property',
     'cached_method',
     'cache_queryset',
     'invalidate_model_cache',
+    'invalidate_model_class_cache',
+    'get_cache_generation',
+    'bump_cache_generation',
+    'get_cache_version',
+    'bump_cache_version',
+    'get_or_compute',
+    'CachedIdList',
+    'tiered_cache',
+    'get_cache_stats',
+    'adjust_counter',
+    'toggle_vote',
 ] 
\ No newline at end of file
@@ -1,21 +1,38 @@
+from collections import namedtuple
 from functools import wraps
 from django.core.cache import cache
+import datetime
 import hashlib
+import inspect
 import json
+import math
+import random
+import time
 from django.contrib.auth.models import AnonymousUser
+from django.db import models
+
+from redis.exceptions import LockError
+
+from .tiered_cache import MISSING, tiered_cache
 
 """
 Cache Utilities for Communities App
 
 This module provides caching decorators and utilities for the communities app.
 Key features:
-- Cached property decorator for expensive model properties
-- Cached method decorator for expensive method calls
-- Cached queryset decorator for optimizing database queries
+- memoize, caching functions and static methods per argument values, with
+  per-function key schemas and invalidation hooks
+- Cached property, method and queryset decorators built on it
+- Stampede protection for the values they cache (see get_or_compute)
+- A per-process LRU in front of Redis for the decorated values (see tiered_cache)
+- Version counters and lazily hydrated id lists for cached listings
+- Generation counters per model instance and class, folded into the keys
+  of the decorated values so that invalidating them is a single INCR
 - Cache key generation with support for non-serializable objects (Users, etc.)
 
 Important: When dealing with User objects in caching, the system converts them
 to a string representation with their ID to avoid JSON serialization issues.
+memoize identifies any model instance by its label and pk instead.
 """
 
 def generate_cache_key(prefix, *args, **kwargs):
@@ -62,108 +79,346 @@ def generate_cache_key(prefix, *args, **kwargs):
     return f"{prefix}:{key_suffix}"
 
 
-def cached_property(timeout=300):
+# Seconds an expired value is still served while one process recomputes it
+STALE_WHILE_REVALIDATE = 60
+
+# Lease of the recompute lock; a holder that dies blocks others no longer than this
+RECOMPUTE_LOCK_LEASE = 10
+
+# Seconds between checks for the value while another process computes it
+RECOMPUTE_WAIT_INTERVAL = 0.05
+
+# Weight of the probabilistic early refresh; higher refreshes earlier
+EARLY_REFRESH_BETA = 1.0
+
+# A cached value with the time it goes stale and the seconds it took to compute
+CachedValue = namedtuple('CachedValue', ['value', 'expires', 'delta'])
+
+
+def needs_refresh(entry):
     """
-    Decorator to cache expensive property methods.
-    Similar to @property but with caching.
+    Whether a cached value should be recomputed: once it is stale, and a
+    little before with a probability that grows as its expiry approaches
+    and with the time it takes to compute, so one request refreshes it
+    before the others see it expire.
+    """
+    if entry.expires is None:
+        return False
+    early = entry.delta * EARLY_REFRESH_BETA * -math.log(1.0 - random.random())
+    return time.time() + early >= entry.expires
+
+
+def store_computed(key, compute, timeout, stale_timeout):
+    """Compute a value and cache it, kept stale_timeout seconds past its expiry"""
+    started = time.monotonic()
+    value = compute()
+    delta = time.monotonic() - started
+    if timeout is None:
+        tiered_cache.set(key, CachedValue(value, None, delta), None)
+    else:
+        tiered_cache.set(key, CachedValue(value, time.time() + timeout, delta), timeout + stale_timeout)
+    return value
+
+
+def compute_single_flight(key, compute, timeout, stale_timeout, seen=None):
+    """
+    Recompute a value if no other process is: under a Redis lock with a
+    short lease. Returns MISSING when another process holds the lock.
+    `seen` is the entry the caller read; if the cached entry changed since,
+    another process just refreshed it and its value is returned instead.
+    """
+    lock = cache.lock(f"recompute:{key}", timeout=RECOMPUTE_LOCK_LEASE)
+    if not lock.acquire(blocking=False):
+        return MISSING
+    try:
+        current = cache.get(key)
+        if isinstance(current, CachedValue) and current != seen and not needs_refresh(current):
+            tiered_cache.local.set(key, current, tiered_cache.local_timeout)
+            return current.value
+        return store_computed(key, compute, timeout, stale_timeout)
+    finally:
+        try:
+            lock.release()
+        except LockError:
+            # The lease ran out during the computation
+            pass
+
+
+def get_or_compute(key, compute, timeout, stale_timeout=STALE_WHILE_REVALIDATE):
+    """
+    Get a cached value, computing it with compute() when it is missing.
+    
+    Only one process recomputes a key at a time. While it does, the others
+    serve the previous value up to stale_timeout seconds past its expiry,
+    or, when there is none, wait for the new one up to the lock's lease
+    before computing it themselves. Values are refreshed early at random
+    before they expire (see needs_refresh).
+    """
+    entry = tiered_cache.get(key)
+    if isinstance(entry, CachedValue):
+        if not needs_refresh(entry):
+            return entry.value
+        value = compute_single_flight(key, compute, timeout, stale_timeout, seen=entry)
+        return entry.value if value is MISSING else value
+    
+    deadline = time.monotonic() + RECOMPUTE_LOCK_LEASE
+    while True:
+        value = compute_single_flight(key, compute, timeout, stale_timeout)
+        if value is not MISSING:
+            return value
+        time.sleep(RECOMPUTE_WAIT_INTERVAL)
+        entry = cache.get(key)
+        if isinstance(entry, CachedValue):
+            return entry.value
+        if time.monotonic() >= deadline:
+            return store_computed(key, compute, timeout, stale_timeout)
+
+
+# Longest memoize key kept readable; longer ones are shortened with a hash
+MAX_MEMOIZE_KEY_LENGTH = 200
+
+
+def memoize_key_part(value, generations):
+    """
+    Render one argument of a memoized call as a key part.
+    Model instances and classes are identified by label and pk, and their
+    generation counters are added to `generations`. Raises TypeError for
+    values that have no cheap stable representation.
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return repr(value)
+    if isinstance(value, models.Model):
+        generations.append(model_generation(value))
+        return f"{value._meta.label_lower}:{value.pk}"
+    if isinstance(value, type) and issubclass(value, models.Model):
+        generations.append(model_generation(value))
+        return value._meta.label_lower
+    if isinstance(value, AnonymousUser):
+        return 'anonymous'
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (list, tuple)):
+        return '(' + ','.join(memoize_key_part(item, generations) for item in value) + ')'
+    if isinstance(value, (set, frozenset)):
+        return '{' + ','.join(sorted(memoize_key_part(item, generations) for item in value)) + '}'
+    raise TypeError(f"memoize cannot build a cache key from a {type(value).__name__}")
+
+
+def memoize(timeout=300, key=None, generations=None):
+    """
+    Decorator caching a function's result per argument values.
+    Works on functions, static methods and model methods alike: the key is
+    built from the bound arguments (see memoize_key_part), so no argument
+    is mistaken for `self`.
+    
+    key: names of the parameters the key is built from, when others
+        (flags, requests) do not change the result; defaults to all of them
+    generations: function called with the key arguments that returns the
+        names of extra generation counters the result depends on; bumping
+        one with bump_cache_generation() invalidates every result built
+        from it. Model arguments always depend on their own generation.
+    
+    The decorated function gets `.invalidate(*args, **kwargs)` to drop the
+    result cached for some arguments, and `.cache_key(*args, **kwargs)`.
+    None results are cached too. Results are computed by one process at a
+    time (see get_or_compute).
     
     Usage:
-        @cached_property(timeout=3600)
-        def expensive_property(self):
-            # Expensive calculation
-            return result
+        @staticmethod
+        @memoize(timeout=300, generations=lambda community_id: [f"community:{community_id}"])
+        def get_stats(community_id):
+            ...
     """
     def decorator(func):
-        @property
-        @wraps(func)
-        def wrapper(self, *args, **kwargs):
-            # Generate a unique key for this property on this instance
-            key = generate_cache_key(
-                f"cached_property:{self.__class__.__name__}:{self.pk}:{func.__name__}",
-                *args, **kwargs
-            )
+        signature = inspect.signature(func)
+        names = tuple(key) if key is not None else tuple(signature.parameters)
+        unknown = set(names) - set(signature.parameters)
+        if unknown:
+            raise TypeError(f"memoize key of {func.__qualname__} names unknown parameters {sorted(unknown)}")
+        prefix = f"memo:{func.__module__}.{func.__qualname__}"
+        
+        def cache_key(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            values = {name: bound.arguments[name] for name in names}
             
-            # Try to get from cache
-            result = cache.get(key)
-            if result is None:
-                # If not in cache, compute and store
-                result = func(self, *args, **kwargs)
-                cache.set(key, result, timeout)
+            names_used = []
+            parts = [memoize_key_part(value, names_used) for value in values.values()]
+            if generations is not None:
+                names_used.extend(generations(**values))
+            if names_used:
+                parts.append('g' + '.'.join(str(generation) for generation in get_cache_generations(names_used)))
             
-            return result
+            full_key = f"{prefix}:{':'.join(parts)}"
+            if len(full_key) > MAX_MEMOIZE_KEY_LENGTH:
+                full_key = f"{prefix}:{hashlib.md5(full_key.encode('utf-8')).hexdigest()}"
+            return full_key
+        
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            return get_or_compute(cache_key(*args, **kwargs), lambda: func(*args, **kwargs), timeout)
+        
+        def invalidate(*args, **kwargs):
+            tiered_cache.delete(cache_key(*args, **kwargs))
+        
+        wrapper.cache_key = cache_key
+        wrapper.invalidate = invalidate
         return wrapper
     return decorator
 
 
-def cached_method(timeout=300):
+def cached_property(timeout=300):
     """
-    Decorator to cache results of instance or class methods.
+    Decorator to cache expensive property methods.
+    Similar to @property but with caching, keyed by the instance (see memoize).
     
     Usage:
-        @cached_method(timeout=3600)
-        def expensive_method(self, arg1, arg2):
+        @cached_property(timeout=3600)
+        def expensive_property(self):
             # Expensive calculation
             return result
     """
     def decorator(func):
-        @wraps(func)
-        def wrapper(self, *args, **kwargs):
-            # For instance methods, include the instance's class and id in the key
-            if hasattr(self, '__class__') and hasattr(self, 'pk'):
-                key_prefix = f"cached_method:{self.__class__.__name__}:{self.pk}:{func.__name__}"
-            else:
-                # For class methods or functions
-                key_prefix = f"cached_method:{func.__module__}:{func.__name__}"
-            
-            # Generate a unique key for this method call
-            key = generate_cache_key(key_prefix, *args, **kwargs)
-            
-            # Try to get from cache
-            result = cache.get(key)
-            if result is None:
-                # If not in cache, compute and store
-                result = func(self, *args, **kwargs)
-                cache.set(key, result, timeout)
-            
-            return result
-        return wrapper
+        return property(memoize(timeout)(func))
     return decorator
 
 
+def cached_method(timeout=300):
+    """
+    Decorator to cache results of instance or class methods.
+    Kept for existing callers: it is memoize() keyed by every argument.
+    """
+    return memoize(timeout)
+
+
 def invalidate_model_cache(instance):
     """
     Invalidate all cached properties/methods for a specific model instance.
     Call this when an instance is updated/saved.
+    Stale entries are no longer read and expire on their own.
     """
-    pattern = f"cached_*:{instance.__class__.__name__}:{instance.pk}:*"
-    cache.delete_pattern(pattern)
+    bump_cache_generation(model_generation(instance))
+
+
+def invalidate_model_class_cache(model):
+    """Invalidate the values cached by class-level methods of a model"""
+    bump_cache_generation(model_generation(model))
 
 
 def cache_queryset(timeout=300):
     """
     Decorator to cache results of a queryset-returning method.
+    The queryset is evaluated to a list, which is what gets cached.
     Note: This is only appropriate for read-only operations where
     stale data for a short time is acceptable.
     """
     def decorator(func):
         @wraps(func)
-        def wrapper(*args, **kwargs):
-            # Extract class name if method belongs to a class
-            if args and hasattr(args[0], '__class__'):
-                cls_name = args[0].__class__.__name__
-                key_prefix = f"cache_queryset:{cls_name}:{func.__name__}"
-            else:
-                key_prefix = f"cache_queryset:{func.__module__}:{func.__name__}"
-            
-            key = generate_cache_key(key_prefix, *args, **kwargs)
-            
-            # Try to get from cache
-            result = cache.get(key)
-            if result is None:
-                # If not in cache, compute and store
-                result = list(func(*args, **kwargs))  # Convert queryset to list
-                cache.set(key, result, timeout)
-            
-            return result
-        return wrapper
-    return decorator 
\ No newline at end of file
+        def evaluated(*args, **kwargs):
+            return list(func(*args, **kwargs))
+        return memoize(timeout)(evaluated)
+    return decorator
+
+
+def model_generation(obj):
+    """Name of the generation counter of a model instance, or of a model class"""
+    if isinstance(obj, type):
+        return f"model:{obj._meta.label_lower}"
+    return f"model:{obj._meta.label_lower}:{obj.pk}"
+
+
+def get_cache_generations(names):
+    """
+    Get the current values of several named generation counters in one round trip.
+    Generations are always read from Redis, never from the local tier: a
+    worker could otherwise keep a generation read just before a bump and
+    serve the entries it invalidated until the local copy expires.
+    """
+    keys = [f"cache_generation:{name}" for name in names]
+    generations = cache.get_many(keys)
+    missing = [key for key in keys if key not in generations]
+    if missing:
+        # Start from the clock, like the version counters
+        for key in missing:
+            cache.add(key, int(time.time() * 1000), None)
+        generations.update(cache.get_many(missing))
+    return [generations[key] for key in keys]
+
+
+def get_cache_generation(name):
+    """Get the current value of a named generation counter"""
+    return get_cache_generations([name])[0]
+
+
+def bump_cache_generation(name):
+    """Increment a named generation counter, so keys built with the old value are no longer read"""
+    key = f"cache_generation:{name}"
+    try:
+        generation = cache.incr(key)
+    except ValueError:
+        get_cache_generation(name)
+        generation = cache.incr(key)
+    return generation
+
+
+def get_cache_version(name):
+    """
+    Get the current value of a named version counter.
+    Including it in cache keys lets bump_cache_version() invalidate every
+    key built from the old value without deleting them one by one.
+    """
+    key = f"cache_version:{name}"
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock rather than 1 so that a lost counter
+        # never reuses a version of keys that are still cached
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_cache_version(name):
+    """Increment a named version counter, invalidating keys built with it"""
+    key = f"cache_version:{name}"
+    try:
+        return cache.incr(key)
+    except ValueError:
+        get_cache_version(name)
+        return cache.incr(key)
+
+
+class CachedIdList:
+    """
+    An ordered list of primary keys that loads model instances on demand.
+    
+    Slicing hydrates just the requested ids with a single in_bulk() query on
+    `queryset`, keeping the cached order, so Django's Paginator and DRF's
+    pagination classes only load the rows of the page being served.
+    Ids whose rows no longer exist are skipped.
+    """
+    ordered = True
+    
+    def __init__(self, ids, queryset):
+        self.ids = list(ids)
+        self.queryset = queryset
+    
+    def __len__(self):
+        return len(self.ids)
+    
+    def count(self):
+        return len(self.ids)
+    
+    def __iter__(self):
+        return iter(self.hydrate(self.ids))
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.hydrate(self.ids[index])
+        return self.hydrate([self.ids[index]])[0]
+    
+    def hydrate(self, ids):
+        """Load the instances for ids, in the order of ids"""
+        if not ids:
+            return []
+        instances = self.queryset.in_bulk(ids)
+        return [instances[pk] for pk in ids if pk in instances]
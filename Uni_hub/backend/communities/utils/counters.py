@@ -0,0 +1,157 @@
+"""
+Counter cache updates
+
+Counter columns are adjusted by deltas. By default a delta is applied with
+an UPDATE right away. With the COMMUNITY_COUNTER_BUFFER setting enabled,
+deltas of the hot counters in BUFFERED_COUNTERS are instead added to a
+Redis hash per model once the surrounding transaction commits, and
+flush_counter_buffer() (run by the flush_counter_buffer command) applies
+them in batched UPDATEs. Reads add the pending deltas from
+get_pending_counters(), so users see their own votes right away.
+"""
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Greatest
+from django_redis import get_redis_connection
+from redis.exceptions import ResponseError
+
+
+# Counter columns whose deltas are buffered, by model label
+BUFFERED_COUNTERS = {
+    'communities.post': ('upvote_count_cache', 'comment_count_cache'),
+    'communities.community': ('member_count_cache',),
+}
+
+# Rows updated per UPDATE statement when flushing
+FLUSH_BATCH_SIZE = 500
+
+
+def counter_buffer_enabled():
+    """Whether counter deltas are buffered in Redis"""
+    return getattr(settings, 'COMMUNITY_COUNTER_BUFFER', False)
+
+
+def counter_buffer_key(label):
+    """Redis hash of the pending deltas of a model, keyed by "<pk>:<field>" """
+    return f"counter_buffer:{label}"
+
+
+def counter_buffer_flushing_key(label):
+    """Redis hash of the deltas of a model that a flush is applying"""
+    return f"counter_buffer:{label}:flushing"
+
+
+def adjust_counter(model, pk, field, delta):
+    """
+    Apply a +/- delta to a cached counter column with a single UPDATE.
+    The counter is never taken below zero.
+    Buffered counters are adjusted in Redis once the transaction commits.
+    """
+    if not delta:
+        return
+    label = model._meta.label_lower
+    if counter_buffer_enabled() and field in BUFFERED_COUNTERS.get(label, ()):
+        key = counter_buffer_key(label)
+        transaction.on_commit(
+            lambda: get_redis_connection('default').hincrby(key, f"{pk}:{field}", delta)
+        )
+        return
+    model.objects.filter(pk=pk).update(**{field: Greatest(F(field) + delta, 0)})
+
+
+def get_pending_counters(model, pks):
+    """
+    Get the buffered deltas of a model's rows that are not applied yet.
+    Returns a dict of pk -> {field: delta}; empty when buffering is disabled.
+    """
+    label = model._meta.label_lower
+    fields = BUFFERED_COUNTERS.get(label, ())
+    pks = list(pks)
+    if not counter_buffer_enabled() or not fields or not pks:
+        return {}
+
+    members = [f"{pk}:{field}" for pk in pks for field in fields]
+    redis = get_redis_connection('default')
+    pipe = redis.pipeline(transaction=False)
+    pipe.hmget(counter_buffer_key(label), members)
+    pipe.hmget(counter_buffer_flushing_key(label), members)
+    pending, flushing = pipe.execute()
+
+    counters = {}
+    for member, *values in zip(members, pending, flushing):
+        delta = sum(int(value) for value in values if value is not None)
+        if delta:
+            pk, field = member.rsplit(':', 1)
+            counters.setdefault(int(pk), {})[field] = delta
+    return counters
+
+
+def apply_counter_deltas(model, deltas):
+    """
+    Apply {pk: {field: delta}} to a model's counter columns, one UPDATE per
+    field and batch of FLUSH_BATCH_SIZE rows. Returns the number of rows updated.
+    """
+    by_field = defaultdict(dict)
+    for pk, fields in deltas.items():
+        for field, delta in fields.items():
+            if delta:
+                by_field[field][pk] = delta
+
+    updated = 0
+    with transaction.atomic():
+        for field, field_deltas in by_field.items():
+            pks = sorted(field_deltas)
+            for start in range(0, len(pks), FLUSH_BATCH_SIZE):
+                batch = pks[start:start + FLUSH_BATCH_SIZE]
+                delta = Case(
+                    *[When(pk=pk, then=Value(field_deltas[pk])) for pk in batch],
+                    default=Value(0),
+                    output_field=IntegerField(),
+                )
+                updated += model.objects.filter(pk__in=batch).update(
+                    **{field: Greatest(F(field) + delta, 0)}
+                )
+    return updated
+
+
+def flush_counter_buffer():
+    """
+    Apply the buffered counter deltas to the database.
+
+    The pending hash of each model is renamed before it is read, so deltas
+    buffered during the flush go to a new hash. A flush that was interrupted
+    leaves its hash behind and is completed by the next call. Only one
+    process should flush at a time.
+
+    The hash is deleted inside the transaction that applies it, just before
+    the commit, so a batch is never applied twice: a flush that dies before
+    the delete is rolled back and retried in full. If it dies between the
+    delete and the commit the batch is lost, and the update_cache_counters
+    reconciliation recounts the affected rows.
+    Returns the number of rows updated.
+    """
+    redis = get_redis_connection('default')
+    updated = 0
+    for label in BUFFERED_COUNTERS:
+        key = counter_buffer_key(label)
+        flushing_key = counter_buffer_flushing_key(label)
+        if not redis.exists(flushing_key):
+            try:
+                redis.rename(key, flushing_key)
+            except ResponseError:
+                # Nothing is buffered for this model
+                continue
+
+        deltas = defaultdict(dict)
+        for member, value in redis.hgetall(flushing_key).items():
+            pk, field = member.decode('utf-8').rsplit(':', 1)
+            deltas[int(pk)][field] = int(value)
+
+        with transaction.atomic():
+            updated += apply_counter_deltas(apps.get_model(label), deltas)
+            redis.delete(flushing_key)
+    return updated
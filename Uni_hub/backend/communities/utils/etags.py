@@ -0,0 +1,94 @@
+"""
+Conditional GET support for detail endpoints
+
+A detail response is described by a validator built from cheap values:
+the object's updated_at, its counter caches and version counters that
+signals bump whenever something else the response shows changes (posts
+and memberships of a community, comments and upvotes of a post, ...).
+Clients polling a page send the validator back in If-None-Match and get
+a 304 Not Modified without the serializer running.
+"""
+import hashlib
+
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from .cache import get_cache_version
+
+
+def community_version(community_id):
+    """Version counter of what a community's detail response shows besides its own row"""
+    return f"community:{community_id}"
+
+
+def post_version(post_id):
+    """Version counter of what a post's detail response shows besides its own row"""
+    return f"post:{post_id}"
+
+
+def event_version(event_id):
+    """Version counter of an event's participants"""
+    return f"event:{event_id}"
+
+
+def membership_version(user_id):
+    """Version counter of a user's memberships"""
+    return f"memberships:user:{user_id}"
+
+
+def make_etag(*parts):
+    """Build a weak ETag from the values the response depends on"""
+    digest = hashlib.md5(':'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    return f'W/"{digest}"'
+
+
+class ConditionalRetrieveMixin:
+    """
+    Answers conditional GETs of a retrieve action with 304 Not Modified.
+
+    Views define get_etag_parts(instance), returning values that change
+    whenever the serialized instance would. The requesting user and their
+    membership version are added, so validators are per user. The check runs
+    after get_object(), and therefore after the permission checks, but before
+    the serializer. Views customize the full response in get_retrieve_response().
+    """
+
+    def get_etag_parts(self, instance):
+        raise NotImplementedError('Views using ConditionalRetrieveMixin must define get_etag_parts()')
+
+    def get_etag(self, instance):
+        parts = list(self.get_etag_parts(instance))
+        user = self.request.user
+        if user.is_authenticated:
+            parts += [user.pk, get_cache_version(membership_version(user.pk))]
+        # Query parameters such as a comment window cursor change the response
+        parts += [self.request.accepted_renderer.format, self.request.query_params.urlencode()]
+        return make_etag(*parts)
+
+    def is_not_modified(self, etag):
+        """Whether the request's If-None-Match matches etag (weak comparison)"""
+        header = self.request.headers.get('If-None-Match')
+        if not header:
+            return False
+        etags = parse_etags(header)
+        return '*' in etags or etag.removeprefix('W/') in {value.removeprefix('W/') for value in etags}
+
+    def get_retrieve_response(self, instance):
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag = self.get_etag(instance)
+
+        if self.is_not_modified(etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = self.get_retrieve_response(instance)
+
+        response['ETag'] = etag
+        # Responses depend on the user, and clients should revalidate every time
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
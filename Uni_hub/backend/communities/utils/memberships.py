@@ -0,0 +1,155 @@
+"""
+Request-scoped membership resolver
+
+Permissions, services and serializers all ask the same questions about the
+requesting user and a community: is the user its creator, a member, an
+admin? MembershipResolver answers them from the user's role map in Redis
+(see RoleMapService), read once per request, and loads a membership row
+from the database only when a caller needs the row itself, or when the
+user's memberships changed in the open transaction and the map is not
+updated yet.
+MembershipResolverMiddleware opens a scope per request, and
+get_membership_resolver() returns the same resolver for a user throughout
+it. Outside a request every call gets a new resolver.
+The membership signals drop the cached row when it changes.
+"""
+from contextvars import ContextVar
+
+from ..models import Membership
+from ..services.role_map_service import RoleMapService
+
+
+# Resolvers of the current request by user id, None outside a request
+request_resolvers = ContextVar('membership_resolvers', default=None)
+
+
+# Roles allowed to manage a community
+ADMIN_ROLES = ('admin', 'moderator')
+
+
+def community_id_of(community):
+    """The id of a community given as an instance or an id"""
+    return getattr(community, 'pk', community)
+
+
+class MembershipResolver:
+    """The memberships of one user, loaded once per community"""
+
+    def __init__(self, user):
+        self.user = user
+        self.memberships = {}
+        self.roles = None
+
+    @property
+    def authenticated(self):
+        return self.user is not None and self.user.is_authenticated
+
+    def prefetch(self, community_ids):
+        """Load the memberships of several communities in one query"""
+        missing = {pk for pk in community_ids if pk not in self.memberships}
+        if not self.authenticated or not missing:
+            return
+        for membership in Membership.objects.filter(user_id=self.user.id, community_id__in=missing):
+            self.remember(membership)
+        for pk in missing:
+            self.memberships.setdefault(pk, None)
+
+    def get_membership(self, community):
+        """The user's membership row of a community, or None"""
+        if not self.authenticated:
+            return None
+        community_id = community_id_of(community)
+        if community_id not in self.memberships:
+            membership = Membership.objects.filter(user_id=self.user.id, community_id=community_id).first()
+            if membership is not None:
+                self.remember(membership)
+            else:
+                self.memberships[community_id] = None
+        return self.memberships[community_id]
+
+    def get_membership_map(self, community_ids):
+        """A dict of community_id -> membership for the communities the user has one in"""
+        self.prefetch(community_ids)
+        return {
+            pk: self.memberships[pk] for pk in community_ids
+            if self.memberships.get(pk) is not None
+        }
+
+    def get_entry(self, community):
+        """The user's (role, status) in a community, or None, without a database query when possible"""
+        if not self.authenticated:
+            return None
+        community_id = community_id_of(community)
+        if community_id not in self.memberships:
+            if self.roles is None:
+                self.roles = RoleMapService.get_role_map(self.user.id)
+            if self.roles is not None:
+                return self.roles.get(community_id)
+        # The user's memberships changed in the open transaction
+        membership = self.get_membership(community)
+        return (membership.role, membership.status) if membership else None
+
+    def status(self, community):
+        entry = self.get_entry(community)
+        return entry[1] if entry else None
+
+    def role(self, community):
+        entry = self.get_entry(community)
+        return entry[0] if entry else None
+
+    def is_creator(self, community):
+        """Whether the user created the community; needs the instance, not its id"""
+        return self.authenticated and getattr(community, 'creator_id', None) == self.user.id
+
+    def is_member(self, community):
+        """Creator or approved member"""
+        return self.is_creator(community) or self.status(community) == 'approved'
+
+    def is_admin(self, community):
+        """Creator, or approved admin or moderator"""
+        if self.is_creator(community):
+            return True
+        return self.get_entry(community) in [(role, 'approved') for role in ADMIN_ROLES]
+
+    def remember(self, membership):
+        """Record a membership the caller just created or loaded"""
+        self.memberships[membership.community_id] = membership
+
+    def forget(self, community_id=None):
+        """Drop the cached membership of a community, or all of them"""
+        self.roles = None
+        if community_id is None:
+            self.memberships.clear()
+        else:
+            self.memberships.pop(community_id, None)
+
+
+def get_membership_resolver(user):
+    """The membership resolver of a user for the current request"""
+    resolvers = request_resolvers.get()
+    if resolvers is None or user is None or not user.is_authenticated:
+        return MembershipResolver(user)
+    if user.id not in resolvers:
+        resolvers[user.id] = MembershipResolver(user)
+    return resolvers[user.id]
+
+
+def forget_membership(user_id, community_id):
+    """Drop a changed membership from the current request's resolver of its user"""
+    resolvers = request_resolvers.get()
+    if resolvers and user_id in resolvers:
+        resolvers[user_id].forget(community_id)
+
+
+class MembershipResolverMiddleware:
+    """Give each request its own membership resolvers"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = request_resolvers.set({})
+        try:
+            return self.get_response(request)
+        finally:
+            request_resolvers.reset(token)
@@ -0,0 +1,206 @@
+"""
+Two-tier cache
+
+A bounded in-process LRU sits in front of the Redis cache, so values read
+many times per second (analytics, community id lists) are served without a
+network round trip. Local entries live at most LOCAL_CACHE_TIMEOUT seconds.
+Deletions are broadcast over Redis pub/sub, and a listener thread in every
+process drops the local copies, so gunicorn workers do not serve an entry
+another worker invalidated.
+
+A worker that reads a value from Redis just before another worker deletes
+it may keep the old value until the local timeout; only cache values that
+can be that stale, or whose keys change when they are invalidated.
+Values are shared between the callers of a process and must not be mutated.
+"""
+import fnmatch
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django_redis import get_redis_connection
+
+
+logger = logging.getLogger(__name__)
+
+# Redis channel the invalidations are broadcast on
+INVALIDATION_CHANNEL = 'cache_invalidation'
+
+# Default size and lifetime of the local tier, see the
+# COMMUNITY_LOCAL_CACHE_ENTRIES and COMMUNITY_LOCAL_CACHE_TIMEOUT settings
+LOCAL_CACHE_MAX_ENTRIES = 1000
+LOCAL_CACHE_TIMEOUT = 30
+
+# Seconds to wait before resubscribing after the listener lost its connection
+LISTENER_RETRY_DELAY = 1
+
+MISSING = object()
+
+
+class LocalCache:
+    """A thread-safe LRU of at most max_entries values with per-entry expiry"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """Get a value, or MISSING when it is absent or expired"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return MISSING
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self.entries[key]
+                return MISSING
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        if self.max_entries <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (time.monotonic() + timeout, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def delete_pattern(self, pattern):
+        """Delete the keys matching a glob pattern"""
+        with self.lock:
+            for key in fnmatch.filter(list(self.entries), pattern):
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class TieredCache:
+    """The local LRU in front of the default (Redis) cache, with hit and miss counters per tier"""
+
+    def __init__(self):
+        self.local = LocalCache(getattr(settings, 'COMMUNITY_LOCAL_CACHE_ENTRIES', LOCAL_CACHE_MAX_ENTRIES))
+        self.local_timeout = getattr(settings, 'COMMUNITY_LOCAL_CACHE_TIMEOUT', LOCAL_CACHE_TIMEOUT)
+        self.counters = {
+            'local': {'hits': 0, 'misses': 0},
+            'redis': {'hits': 0, 'misses': 0},
+        }
+        self.listener_pid = None
+        self.listener_lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Get a value from the local tier, then from Redis"""
+        self.ensure_listener()
+        value = self.local.get(key)
+        if value is not MISSING:
+            self.counters['local']['hits'] += 1
+            return value
+        self.counters['local']['misses'] += 1
+
+        value = cache.get(key, MISSING)
+        if value is MISSING:
+            self.counters['redis']['misses'] += 1
+            return default
+        self.counters['redis']['hits'] += 1
+        self.local.set(key, value, self.local_timeout)
+        return value
+
+    def set(self, key, value, timeout):
+        """Store a value in both tiers; the local copy lives at most the local timeout"""
+        cache.set(key, value, timeout)
+        local_timeout = self.local_timeout if timeout is None else min(timeout, self.local_timeout)
+        self.local.set(key, value, local_timeout)
+
+    def delete(self, key):
+        """Delete a key from Redis and from the local tier of every process"""
+        cache.delete(key)
+        self.forget(key)
+
+    def forget(self, key):
+        """Drop a key from the local tier of every process, after it changed in Redis"""
+        self.local.delete(key)
+        self.publish(f'key:{key}')
+
+    def delete_pattern(self, pattern):
+        """Delete the keys matching a glob pattern from Redis and from every local tier"""
+        cache.delete_pattern(pattern)
+        self.local.delete_pattern(pattern)
+        self.publish(f'pattern:{pattern}')
+
+    def clear_local(self):
+        """Drop every entry of this process's local tier"""
+        self.local.clear()
+
+    def stats(self):
+        """Hit and miss counters of both tiers in this process, and the local tier's size"""
+        stats = {tier: dict(counters) for tier, counters in self.counters.items()}
+        stats['local']['size'] = len(self.local)
+        stats['local']['max_entries'] = self.local.max_entries
+        return stats
+
+    def reset_stats(self):
+        for counters in self.counters.values():
+            counters.update(hits=0, misses=0)
+
+    def publish(self, message):
+        try:
+            get_redis_connection('default').publish(INVALIDATION_CHANNEL, message)
+        except Exception:
+            logger.exception('Could not broadcast cache invalidation %s', message)
+
+    def handle_message(self, message):
+        """Apply an invalidation received from another process"""
+        kind, _, target = message.partition(':')
+        if kind == 'key':
+            self.local.delete(target)
+        elif kind == 'pattern':
+            self.local.delete_pattern(target)
+
+    def ensure_listener(self):
+        """Start the invalidation listener thread of this process, again after a fork"""
+        pid = os.getpid()
+        if self.listener_pid == pid:
+            return
+        with self.listener_lock:
+            if self.listener_pid == pid:
+                return
+            # Entries inherited from the parent process missed its invalidations
+            self.local.clear()
+            threading.Thread(target=self.listen, name='cache-invalidation', daemon=True).start()
+            self.listener_pid = pid
+
+    def listen(self):
+        while True:
+            try:
+                pubsub = get_redis_connection('default').pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                for message in pubsub.listen():
+                    data = message['data']
+                    self.handle_message(data.decode('utf-8') if isinstance(data, bytes) else data)
+            except Exception:
+                logger.exception('Cache invalidation listener disconnected')
+            # Invalidations sent while disconnected are lost
+            self.local.clear()
+            time.sleep(LISTENER_RETRY_DELAY)
+
+
+tiered_cache = TieredCache()
+
+
+def get_cache_stats():
+    """Hit and miss counters of the local and Redis tiers in this process"""
+    return tiered_cache.stats()
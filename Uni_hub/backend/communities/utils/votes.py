@@ -0,0 +1,54 @@
+from django.db import connections, transaction
+
+from .counters import adjust_counter
+
+
+def insert_vote(through, owner_column, user_column, owner_id, user_id):
+    """
+    Insert a vote row unless it exists, with INSERT ... ON CONFLICT DO NOTHING.
+    Returns whether a row was inserted.
+    """
+    connection = connections[through.objects.db]
+    quote_name = connection.ops.quote_name
+    sql = (
+        f'INSERT INTO {quote_name(through._meta.db_table)} '
+        f'({quote_name(owner_column)}, {quote_name(user_column)}) VALUES (%s, %s) '
+        f'ON CONFLICT DO NOTHING RETURNING {quote_name(through._meta.pk.column)}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [owner_id, user_id])
+        return cursor.fetchone() is not None
+
+
+def toggle_vote(relation, owner_id, user_id, counter_field='upvote_count_cache'):
+    """
+    Toggle a user's vote in a many-to-many relation such as Post.upvotes.
+
+    The vote row is deleted if it exists and inserted otherwise, and the
+    owner's counter is adjusted by the row that actually changed, with an
+    F() update in the same transaction. Nothing is recounted. Concurrent
+    toggles by the same user cannot double count: the unique constraint of
+    the through table makes a racing insert a no-op.
+    Returns (voted, changed): whether the user has voted after the toggle,
+    and whether this call added or removed the vote row. A toggle that lost
+    such a race reports the vote without a change, and callers should not
+    count it anywhere else either.
+    """
+    field = relation.field
+    through = relation.through
+    owner_field = through._meta.get_field(field.m2m_field_name())
+    user_field = through._meta.get_field(field.m2m_reverse_field_name())
+
+    with transaction.atomic(using=through.objects.db):
+        removed, _ = through.objects.filter(
+            **{owner_field.attname: owner_id, user_field.attname: user_id}
+        ).delete()
+        if removed:
+            adjust_counter(field.model, owner_id, counter_field, -1)
+            return False, True
+
+        if insert_vote(through, owner_field.column, user_field.column, owner_id, user_id):
+            adjust_counter(field.model, owner_id, counter_field, 1)
+            return True, True
+        # A concurrent toggle inserted the same vote
+        return True, False
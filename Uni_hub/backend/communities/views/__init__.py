@@ -4,10 +4,14 @@ from .community_views import CommunityViewSet
 from .post_views import PostViewSet
 from .comment_views import CommentViewSet
 from .invitation_views import CommunityInvitationViewSet
+from .feed_views import FeedView
+from .cache_views import CacheStatsView
 
 __all__ = [
     'CommunityViewSet', 
     'PostViewSet', 
     'CommentViewSet',
-    'CommunityInvitationViewSet'
+    'CommunityInvitationViewSet',
+    'FeedView',
+    'CacheStatsView'
 ] 
\ No newline at end of file
@@ -0,0 +1,23 @@
+from rest_framework import views
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from drf_spectacular.utils import extend_schema
+
+from ..utils.tiered_cache import get_cache_stats
+
+
+class CacheStatsView(views.APIView):
+    """
+    API endpoint for the hit and miss counters of the two cache tiers.
+
+    Counters are per process, so each request reports the worker that served it.
+    """
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(
+        summary="Get cache statistics",
+        description="Hit and miss counters of the local and Redis cache tiers of the worker serving "
+                    "the request, and the size of its local tier. Staff only.",
+    )
+    def get(self, request, *args, **kwargs):
+        return Response(get_cache_stats())
@@ -3,13 +3,39 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter, OpenApiExample
 from drf_spectacular.types import OpenApiTypes
 
 from ..models import Post, Comment
-from ..serializers import CommentSerializer
+from ..serializers import CommentSerializer, CommentTreeSerializer
 from ..permissions import IsCommentAuthorOrCommunityAdminOrReadOnly
+from ..pagination import OptionalCursorPagination
 from ..services.comment_service import CommentService
+from ..services.post_service import PostService
+
+
+THREAD_PARAMETERS = [
+    OpenApiParameter(
+        name="community_slug",
+        description="The unique slug of the community the post belongs to",
+        required=True,
+        type=OpenApiTypes.STR,
+        location=OpenApiParameter.PATH
+    ),
+    OpenApiParameter(
+        name="post_pk",
+        description="The ID of the post the comments belong to",
+        required=True,
+        type=OpenApiTypes.INT,
+        location=OpenApiParameter.PATH
+    ),
+    OpenApiParameter(
+        name="depth",
+        description="Number of reply levels to load. If not provided, all levels are loaded.",
+        type=OpenApiTypes.INT
+    ),
+]
 
 
 @extend_schema_view(
@@ -187,6 +213,7 @@ class CommentViewSet(viewsets.ModelViewSet):
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
     permission_classes = [IsAuthenticatedOrReadOnly, IsCommentAuthorOrCommunityAdminOrReadOnly]
+    pagination_class = OptionalCursorPagination
     
     def get_queryset(self):
         """Get filtered queryset using the service layer"""
@@ -196,6 +223,67 @@ class CommentViewSet(viewsets.ModelViewSet):
             parent_id=self.request.query_params.get('parent')
         )
     
+    def get_thread_post(self):
+        """Get the post of the URL, if the user has access to it"""
+        posts = PostService.get_post_queryset(
+            user=self.request.user,
+            community_slug=self.kwargs.get('community_slug')
+        )
+        return get_object_or_404(posts, pk=self.kwargs.get('post_pk'))
+    
+    def get_thread_depth(self):
+        """Get the `depth` query parameter, or None to load every level"""
+        depth = self.request.query_params.get('depth')
+        if depth is None:
+            return None
+        try:
+            depth = int(depth)
+        except ValueError:
+            depth = -1
+        if depth < 0:
+            raise ValidationError({'depth': 'Must be a non-negative integer.'})
+        return depth
+    
+    def get_tree_response(self, post, root=None):
+        roots, state = CommentService.get_comment_tree(
+            self.request.user, post, root=root, max_depth=self.get_thread_depth()
+        )
+        context = self.get_serializer_context()
+        context.update(state)
+        return Response(CommentTreeSerializer(roots, many=True, context=context).data)
+    
+    @extend_schema(
+        summary="Get comment thread",
+        description="Retrieves all comments of a post as a nested tree, loaded in a single query.",
+        parameters=THREAD_PARAMETERS,
+        responses={200: CommentTreeSerializer(many=True)}
+    )
+    @action(detail=False, methods=['get'])
+    def thread(self, request, post_pk=None, community_slug=None):
+        """Get the whole comment thread of a post"""
+        return self.get_tree_response(self.get_thread_post())
+    
+    @extend_schema(
+        summary="Get comment subtree",
+        description="Retrieves a comment and its replies as a nested tree, loaded in a single query.",
+        parameters=THREAD_PARAMETERS + [
+            OpenApiParameter(
+                name="id",
+                description="The ID of the comment at the root of the subtree",
+                required=True,
+                type=OpenApiTypes.INT,
+                location=OpenApiParameter.PATH
+            ),
+        ],
+        responses={200: CommentTreeSerializer(many=True)}
+    )
+    @action(detail=True, methods=['get'])
+    def tree(self, request, pk=None, post_pk=None, community_slug=None):
+        """Get a comment with its replies"""
+        post = self.get_thread_post()
+        root = get_object_or_404(Comment, pk=pk, post=post)
+        return self.get_tree_response(post, root=root)
+    
     def perform_create(self, serializer):
         """Use service layer to validate and create a comment"""
         post_id = self.kwargs.get('post_pk')
@@ -18,7 +18,13 @@ from ..serializers import (
     MembershipSerializer, CommunityInvitationSerializer, UserMembershipStatusSerializer
 )
 from ..permissions import IsCommunityAdminOrReadOnly, IsCommunityMember
+from ..pagination import OptionalCursorPagination
+from ..utils.cache import get_cache_version
+from ..utils.counters import get_pending_counters
+from ..utils.etags import ConditionalRetrieveMixin, community_version
+from ..utils.memberships import get_membership_resolver
 from ..services.community_service import CommunityService
+from ..services.tag_service import TagService
 
 # Import views from separate modules
 from .membership_views import MembershipViews # Keep for reference if needed, but remove inheritance
@@ -32,15 +38,16 @@ from .invitation_views import InvitationViews
         description="Retrieves a list of available communities.",
         parameters=[
             OpenApiParameter(name="category", description="Filter by category", required=False, type=str),
-            OpenApiParameter(name="search", description="Search term in name, description, and tags", required=False, type=str),
-            OpenApiParameter(name="tag", description="Filter by specific tag", required=False, type=str),
+            OpenApiParameter(name="search", description="Full-text search in name, tags and description (prefix matching, results ordered by relevance)", required=False, type=str),
+            OpenApiParameter(name="tag", description="Filter by exact tag. Repeat the parameter or separate tags with commas to filter by several tags", required=False, type=str),
+            OpenApiParameter(name="tag_match", description="Whether communities must have all of the given tags or any of them", required=False, type=str, enum=["all", "any"]),
             OpenApiParameter(name="member_of", description="If true, shows communities user is a member of", required=False, type=bool),
-            OpenApiParameter(name="order_by", description="Order results by field", required=False, type=str, enum=["created_at", "name", "member_count"]),
+            OpenApiParameter(name="order_by", description="Order results by field", required=False, type=str, enum=["created_at", "name", "member_count", "post_count", "relevance"]),
         ],
     ),
     retrieve=extend_schema(
         summary="Get Community Details",
-        description="Retrieves detailed information about a specific community.",
+        description="Retrieves detailed information about a specific community. Send the ETag of a previous response in If-None-Match to get 304 Not Modified when nothing changed.",
     ),
     create=extend_schema(
         summary="Create Community",
@@ -81,9 +88,18 @@ from .invitation_views import InvitationViews
         description="Retrieves the current user's membership status for this community.",
         responses={200: UserMembershipStatusSerializer}
     ),
+    facets=extend_schema(
+        summary="Get Community Facets",
+        description="Retrieves per-tag and per-category counts of public communities.",
+        responses={200: {'type': 'object', 'properties': {
+            'tags': {'type': 'array', 'description': 'Tags with their community counts'},
+            'categories': {'type': 'array', 'description': 'Categories with their community counts'},
+        }}},
+    ),
 )
 @method_decorator(csrf_exempt, name='dispatch')
 class CommunityViewSet(
+    ConditionalRetrieveMixin,
     viewsets.ModelViewSet,
     # MembershipViews, # Remove inheritance
     AnalyticsViews,
@@ -95,6 +111,7 @@ class CommunityViewSet(
     permission_classes = [IsAuthenticatedOrReadOnly, IsCommunityAdminOrReadOnly]
     lookup_field = 'slug'  # Use slug in URL instead of primary key
     parser_classes = [MultiPartParser, FormParser, JSONParser]
+    pagination_class = OptionalCursorPagination
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -103,6 +120,47 @@ class CommunityViewSet(
             return CommunityDetailSerializer
         return CommunitySerializer
     
+    def get_community_serializer_context(self, communities):
+        """
+        Serializer context with the requesting user's memberships
+        for every community on the page, loaded in one query,
+        and the member count deltas that are not flushed yet.
+        """
+        community_ids = [community.id for community in communities]
+        context = self.get_serializer_context()
+        context['membership_map'] = CommunityService.get_membership_map(self.request.user, community_ids)
+        context['pending_community_counters'] = get_pending_counters(Community, community_ids)
+        return context
+    
+    def list(self, request, *args, **kwargs):
+        """List communities, resolving per-user fields for the whole page at once"""
+        queryset = self.filter_queryset(self.get_queryset())
+        
+        page = self.paginate_queryset(queryset)
+        communities = list(page if page is not None else queryset)
+        
+        serializer = self.get_serializer(
+            communities, many=True, context=self.get_community_serializer_context(communities)
+        )
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
+    
+    def get_etag_parts(self, instance):
+        return [
+            'community', instance.pk, instance.updated_at.isoformat(),
+            instance.member_count_cache, instance.post_count_cache,
+            get_cache_version(community_version(instance.pk)),
+        ]
+    
+    def get_retrieve_response(self, instance):
+        """Serialize a community, resolving per-user fields in bulk"""
+        CommunityService.prefetch_community_details([instance])
+        serializer = self.get_serializer(
+            instance, context=self.get_community_serializer_context([instance])
+        )
+        return Response(serializer.data)
+    
     def create(self, request, *args, **kwargs):
         """Override create to add detailed debugging and error handling"""
         try:
@@ -175,17 +233,32 @@ class CommunityViewSet(
            self.action == 'leave' or self.action == 'members' or \
            self.action == 'invite' or self.action == 'analytics':
             print(f"DETAIL ACTION ({self.action}) - Getting community with slug: {self.kwargs.get('slug')}")
+            if self.action == 'retrieve':
+                return CommunityService.get_community_detail_queryset()
             return Community.objects.all()
         
-        # For list and other actions, use the service layer with filters
-        return CommunityService.get_community_queryset(
+        # For list and other actions, use the service layer with filters.
+        # Only page-number listings use the cached id list: cursor pagination needs
+        # a real queryset to seek on, and other actions look up a single object.
+        if self.action == 'list' and not self.paginator.use_cursor(self.request):
+            get_communities = CommunityService.get_community_queryset
+        else:
+            get_communities = CommunityService.build_community_queryset
+        
+        return get_communities(
             user=self.request.user,
             category=self.request.query_params.get('category'),
             search=self.request.query_params.get('search'),
-            tag=self.request.query_params.get('tag'),
+            tag=self.request.query_params.getlist('tag'),
             member_of=self.request.query_params.get('member_of'),
-            order_by=self.request.query_params.get('order_by', 'created_at')
+            order_by=self.request.query_params.get('order_by'),
+            tag_match=self.request.query_params.get('tag_match', 'all')
         )
+    
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """Get tag and category counts for community discovery"""
+        return Response(TagService.get_facets())
         
     @extend_schema(
         summary="Invite User",
@@ -269,19 +342,17 @@ class CommunityViewSet(
         community = self.get_object()
         user = request.user
         
-        try:
-            membership = Membership.objects.get(community=community, user=user)
-            serializer = UserMembershipStatusSerializer(membership) # Use a dedicated serializer
-            return Response(serializer.data)
-        except Membership.DoesNotExist:
+        membership = get_membership_resolver(user).get_membership(community)
+        if membership is None:
             # If no membership exists, return a specific status
             return Response({
                 'is_member': False,
                 'status': None, 
                 'role': None 
             }, status=status.HTTP_200_OK) # Return 200 OK even if not a member
-        except Exception as e:
-            return Response({"detail": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        
+        serializer = UserMembershipStatusSerializer(membership) # Use a dedicated serializer
+        return Response(serializer.data)
     
     # --- End Membership Status Action ---
 
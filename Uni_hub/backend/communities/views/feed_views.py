@@ -0,0 +1,36 @@
+from rest_framework import generics
+from rest_framework.permissions import IsAuthenticated
+from drf_spectacular.utils import extend_schema
+
+from ..models import Post
+from ..serializers import PostSerializer
+from ..pagination import FeedPagination
+from ..services.feed_service import FeedService
+from ..services.post_service import PostService
+
+
+class FeedView(generics.GenericAPIView):
+    """
+    API endpoint for the personalized home feed.
+
+    Lists the posts of every community the user has joined, newest first,
+    with the pinned posts of those communities above the first page.
+    """
+    queryset = Post.objects.none()
+    serializer_class = PostSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = FeedPagination
+
+    @extend_schema(
+        summary="Get home feed",
+        description="Retrieves the posts of all communities the user has joined, newest first. "
+                    "The first page starts with pinned posts. Follow the `next` link to load more.",
+        responses={200: PostSerializer(many=True)},
+    )
+    def get(self, request, *args, **kwargs):
+        feed = FeedService.get_feed(request.user)
+        page = self.paginate_queryset(feed)
+        context = self.get_serializer_context()
+        context.update(PostService.get_post_state_map(request.user, page))
+        serializer = self.get_serializer(page, many=True, context=context)
+        return self.get_paginated_response(serializer.data)
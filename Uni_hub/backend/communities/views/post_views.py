@@ -12,7 +12,11 @@ import traceback
 from ..models import Community, Post
 from ..serializers import PostSerializer, PostDetailSerializer
 from ..permissions import IsCommunityAdminOrReadOnly, IsPostAuthorOrCommunityAdminOrReadOnly
+from ..pagination import OptionalCursorPagination, CommentWindowPagination
 from ..services.post_service import PostService
+from ..services.comment_service import CommentService
+from ..utils.cache import get_cache_version
+from ..utils.etags import ConditionalRetrieveMixin, post_version
 
 
 @extend_schema_view(
@@ -34,7 +38,7 @@ from ..services.post_service import PostService
     ),
     retrieve=extend_schema(
         summary="Get post details",
-        description="Retrieves detailed information about a specific post.",
+        description="Retrieves detailed information about a specific post. Send the ETag of a previous response in If-None-Match to get 304 Not Modified when nothing changed.",
         parameters=[
             OpenApiParameter(
                 name="community_slug",
@@ -134,7 +138,7 @@ from ..services.post_service import PostService
         responses={204: None}
     ),
 )
-class PostViewSet(viewsets.ModelViewSet):
+class PostViewSet(ConditionalRetrieveMixin, viewsets.ModelViewSet):
     """
     API endpoint for managing community posts.
     
@@ -144,6 +148,7 @@ class PostViewSet(viewsets.ModelViewSet):
     queryset = Post.objects.all()
     serializer_class = PostSerializer
     permission_classes = [IsAuthenticatedOrReadOnly, IsPostAuthorOrCommunityAdminOrReadOnly]
+    pagination_class = OptionalCursorPagination
     
     def get_serializer_class(self):
         if self.action == 'retrieve':
@@ -159,6 +164,50 @@ class PostViewSet(viewsets.ModelViewSet):
             search=self.request.query_params.get('search')
         )
     
+    def get_post_serializer_context(self, posts):
+        """
+        Serializer context with the requesting user's upvotes and event
+        participation, and the participant counts, for every post on the page.
+        """
+        context = self.get_serializer_context()
+        context.update(PostService.get_post_state_map(self.request.user, posts))
+        return context
+    
+    def list(self, request, *args, **kwargs):
+        """List posts, resolving per-user fields for the whole page at once"""
+        queryset = self.filter_queryset(self.get_queryset())
+        
+        page = self.paginate_queryset(queryset)
+        posts = list(page if page is not None else queryset)
+        
+        serializer = self.get_serializer(
+            posts, many=True, context=self.get_post_serializer_context(posts)
+        )
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
+    
+    def get_retrieve_response(self, instance):
+        """Serialize a post with one page of its top-level comments, resolving per-user fields in bulk"""
+        context = self.get_post_serializer_context([instance])
+        
+        window = CommentWindowPagination()
+        context['comment_window'] = window.paginate_queryset(
+            PostService.get_comment_window_queryset(instance), self.request, self
+        )
+        context['comments_next'] = window.get_next_link()
+        context.update(CommentService.get_comment_state_map(self.request.user, context['comment_window']))
+        
+        serializer = self.get_serializer(instance, context=context)
+        return Response(serializer.data)
+    
+    def get_etag_parts(self, instance):
+        return [
+            'post', instance.pk, instance.updated_at.isoformat(),
+            instance.upvote_count_cache, instance.comment_count_cache,
+            get_cache_version(post_version(instance.pk)),
+        ]
+    
     def create(self, request, *args, **kwargs):
         """Override create to add detailed debugging and error handling"""
         try:
@@ -25,6 +25,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     
     
     # Third-party apps
@@ -48,6 +49,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'communities.utils.memberships.MembershipResolverMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -108,7 +110,7 @@ AUTH_USER_MODEL = 'users.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ),
     'EXCEPTION_HANDLER': 'communities.utils.exception_handler.custom_exception_handler',
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
@@ -168,6 +170,15 @@ CACHES = {
     }
 }
 
+# Buffer hot counter updates (upvotes, comments, members) in Redis and apply
+# them with the flush_counter_buffer worker instead of updating rows per event
+COMMUNITY_COUNTER_BUFFER = os.environ.get('COMMUNITY_COUNTER_BUFFER', 'False') == 'True'
+
+# Per-process LRU in front of Redis for cached analytics and community lists:
+# maximum entries per worker (0 disables it) and seconds an entry is kept
+COMMUNITY_LOCAL_CACHE_ENTRIES = int(os.environ.get('COMMUNITY_LOCAL_CACHE_ENTRIES', 1000))
+COMMUNITY_LOCAL_CACHE_TIMEOUT = int(os.environ.get('COMMUNITY_LOCAL_CACHE_TIMEOUT', 30))
+
 CHANNEL_LAYERS = {
     'default': {
         'BACKEND': 'channels_redis.core.RedisChannelLayer',
@@ -1,6 +1,8 @@
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from .models import EventParticipant, Event
+from communities.utils.cache import bump_cache_version
+from communities.utils.etags import event_version
 import logging
 
 logger = logging.getLogger(__name__)
@@ -33,3 +35,14 @@ def log_event_created(sender, instance, created, **kwargs):
     """
     if created:
         logger.info(f"Event '{instance.title}' was created by {instance.created_by.email}")
+
+
+@receiver(post_save, sender=EventParticipant)
+@receiver(post_delete, sender=EventParticipant)
+def bump_event_version(sender, instance, raw=False, **kwargs):
+    """
+    Invalidates the event's ETag when its participants change.
+    """
+    if raw:
+        return
+    bump_cache_version(event_version(instance.event_id))
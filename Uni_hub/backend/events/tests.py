@@ -179,3 +179,26 @@ class EventTestCase(TestCase):
         self.authenticate(self.member.email, 'memberpass')
         response = self.client.post(reverse('events:leave', args=[event.id]))
         self.assertEqual(response.status_code, 400)
+
+    def test_event_detail_conditional_get(self):
+        """Event detail answers 304 until its participants change"""
+        event = Event.objects.create(
+            title="Polled Event",
+            description="Checked often",
+            date_time=timezone.now() + timedelta(days=1),
+            location="Atrium",
+            is_private=False,
+            created_by=self.admin
+        )
+        url = reverse('events:detail', args=[event.id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        EventParticipant.objects.create(user=self.member, event=event)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['participant_count'], 1)
@@ -14,6 +14,8 @@ from .serializers import (
 )
 from .permissions import IsEventCreator, IsCommunityMember
 from communities.models import Membership
+from communities.utils.cache import get_cache_version
+from communities.utils.etags import ConditionalRetrieveMixin, event_version
 
 
 class EventListCreateView(generics.ListCreateAPIView):
@@ -52,14 +54,21 @@ class EventListCreateView(generics.ListCreateAPIView):
         serializer.save(created_by=user)
 
 
-class EventDetailView(generics.RetrieveUpdateDestroyAPIView):
+class EventDetailView(ConditionalRetrieveMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     GET: Any authenticated user can view public events.
+         Answers 304 Not Modified when If-None-Match has the current ETag.
     PUT/PATCH/DELETE: Only the creator can modify/delete.
     """
     queryset = Event.objects.select_related('community', 'created_by')
     serializer_class = EventSerializer
 
+    def get_etag_parts(self, instance):
+        return [
+            'event', instance.pk, instance.updated_at.isoformat(),
+            get_cache_version(event_version(instance.pk)),
+        ]
+
     def get_permissions(self):
         if self.request.method in permissions.SAFE_METHODS:
             return [permissions.IsAuthenticated()]  # Allow all authenticated users to view
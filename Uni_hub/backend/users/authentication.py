@@ -0,0 +1,116 @@
+"""
+JWT authentication with cached users
+
+simplejwt's JWTAuthentication loads the user row on every request, and the
+WebSocket JWTAuthMiddleware did the same on every connect. Here the row is
+kept in the cache for USER_CACHE_TIMEOUT seconds, keyed by the token's user
+id, so most authenticated requests only query the database for business
+data. The user signals delete the entry once a save or delete of the user
+commits, which covers deactivation and password changes; rows changed by
+QuerySet.update() are picked up when the entry expires.
+
+The password hash is never cached. Cached users are built with the password
+deferred, so it is loaded if a view reads it and left alone when they are
+saved. Only its MD5, the value simplejwt puts in tokens when
+CHECK_REVOKE_TOKEN is enabled, is kept for the revocation check.
+"""
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+# How long a user row is served from the cache without being saved
+USER_CACHE_TIMEOUT = 60 * 5
+
+
+def user_cache_key(user_id):
+    return f"auth:user:{user_id}"
+
+
+def cached_user_fields():
+    """Attribute names of the user columns kept in the cache: all but the password"""
+    return [field.attname for field in get_user_model()._meta.concrete_fields if field.attname != 'password']
+
+
+def to_cache_entry(row):
+    """The cached form of a user row read with its password: (values without the password, password MD5)"""
+    password = row.pop('password')
+    return row, get_md5_hash_password(password)
+
+
+def from_cache_entry(entry):
+    """A user instance with a deferred password, and the password MD5"""
+    values, password_hash = entry
+    User = get_user_model()
+    user = User.from_db(router.db_for_read(User), list(values), list(values.values()))
+    return user, password_hash
+
+
+def load_cached_user(user_id):
+    """(user, password MD5) of a user, from the cache or the database, or None"""
+    key = user_cache_key(user_id)
+    entry = cache.get(key)
+    if entry is None:
+        row = get_user_model().objects.filter(pk=user_id).values('password', *cached_user_fields()).first()
+        if row is None:
+            return None
+        entry = to_cache_entry(row)
+        cache.set(key, entry, USER_CACHE_TIMEOUT)
+    return from_cache_entry(entry)
+
+
+async def aload_cached_user(user_id):
+    """Async version of load_cached_user, for the WebSocket middleware"""
+    key = user_cache_key(user_id)
+    entry = await cache.aget(key)
+    if entry is None:
+        row = await get_user_model().objects.filter(pk=user_id).values('password', *cached_user_fields()).afirst()
+        if row is None:
+            return None
+        entry = to_cache_entry(row)
+        await cache.aset(key, entry, USER_CACHE_TIMEOUT)
+    return from_cache_entry(entry)
+
+
+def forget_cached_user(user_id):
+    cache.delete(user_cache_key(user_id))
+
+
+def token_user_id(validated_token):
+    try:
+        return validated_token[api_settings.USER_ID_CLAIM]
+    except KeyError:
+        raise InvalidToken(_("Token contained no recognizable user identification"))
+
+
+def check_token_user(loaded, validated_token):
+    """
+    The user of a token given load_cached_user()'s result, with the checks of
+    simplejwt's JWTAuthentication.get_user. Raises AuthenticationFailed.
+    """
+    if loaded is None:
+        raise AuthenticationFailed(_("User not found"), code="user_not_found")
+    user, password_hash = loaded
+    if not user.is_active:
+        raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+    if api_settings.CHECK_REVOKE_TOKEN:
+        if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != password_hash:
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+    return user
+
+
+async def aget_token_user(validated_token):
+    """The active user of a validated token, read through the cache. Raises AuthenticationFailed."""
+    return check_token_user(await aload_cached_user(token_user_id(validated_token)), validated_token)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that reads the token's user through the user cache"""
+
+    def get_user(self, validated_token):
+        return check_token_user(load_cached_user(token_user_id(validated_token)), validated_token)
@@ -0,0 +1,14 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .authentication import forget_cached_user
+from .models import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_authenticated_user(sender, instance, **kwargs):
+    """Drop a changed or deleted user from the authentication cache once the change commits"""
+    user_id = instance.pk
+    transaction.on_commit(lambda: forget_cached_user(user_id))
@@ -0,0 +1,106 @@
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.middleware import JWTAuthMiddleware
+from .authentication import CachedJWTAuthentication, user_cache_key
+from .models import User
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    """Test that authenticated users are read through the cache and dropped from it on changes"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='cached@example.com',
+            username='cacheduser',
+            first_name='Cached',
+            last_name='User',
+            password='testpass123'
+        )
+        self.token = str(AccessToken.for_user(self.user))
+
+    def authenticate(self):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        result = CachedJWTAuthentication().authenticate(request)
+        return result[0] if result else None
+
+    def connect(self):
+        """The scope user the WebSocket middleware passes on for a connection with the token"""
+        seen = {}
+
+        async def app(scope, receive, send):
+            seen['user'] = scope['user']
+
+        scope = {'type': 'websocket', 'query_string': f'token={self.token}'.encode()}
+        async_to_sync(JWTAuthMiddleware(app))(scope, None, None)
+        return seen['user']
+
+    def test_cached_user_needs_no_query(self):
+        self.assertEqual(self.authenticate().pk, self.user.pk)
+        with self.assertNumQueries(0):
+            user = self.authenticate()
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(user.email, self.user.email)
+
+    def test_password_hash_is_not_cached(self):
+        self.authenticate()
+        values, password_hash = cache.get(user_cache_key(self.user.pk))
+        self.assertNotIn('password', values)
+        self.assertNotIn(self.user.password, (password_hash, *values.values()))
+
+    def test_saving_a_cached_user_keeps_the_password(self):
+        user = self.authenticate()
+        user.first_name = 'Renamed'
+        user.save()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, 'Renamed')
+        self.assertTrue(self.user.check_password('testpass123'))
+
+    def test_save_drops_the_cache_entry_on_commit(self):
+        self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+            self.assertIsNotNone(cache.get(user_cache_key(self.user.pk)))
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+
+    def test_deactivated_user_is_rejected_on_the_next_request(self):
+        self.assertEqual(self.authenticate().pk, self.user.pk)
+        self.assertEqual(self.connect().pk, self.user.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+        self.assertFalse(self.connect().is_authenticated)
+
+    def test_deleted_user_is_rejected(self):
+        self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+        self.assertFalse(self.connect().is_authenticated)
+
+    def test_changed_password_revokes_tokens_when_enabled(self):
+        with mock.patch.object(api_settings, 'CHECK_REVOKE_TOKEN', True):
+            self.token = str(AccessToken.for_user(self.user))
+            self.assertEqual(self.authenticate().pk, self.user.pk)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                self.user.set_password('newpass456')
+                self.user.save()
+
+            with self.assertRaises(AuthenticationFailed):
+                self.authenticate()
+            self.assertFalse(self.connect().is_authenticated)